@@ -1,10 +1,16 @@
+import importlib
 import json
 import locale
+import os
 
 import torch
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# custom_tool下的文件不是作为包导入的，通过插件的包名拿到与其他节点共享的词嵌入模型注册表
+package_name = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+embedding_registry = importlib.import_module(package_name + ".tools.ebd_registry").embedding_registry
+EmbeddingEngine = importlib.import_module(package_name + ".tools.ebd_engine").EmbeddingEngine
+split_chunks = importlib.import_module(package_name + ".tools.text_stream").split_chunks
 
 file_list={}
 def data_base_advance(question,file_name, k=5):
@@ -16,6 +22,9 @@ def data_base_advance(question,file_name, k=5):
     return "文件中的相关信息如下：\n" + combined_content
 
 class advance_ebd_tool:
+    def __init__(self):
+        self.acquired = None
+
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -55,22 +64,19 @@ class advance_ebd_tool:
         if device == "auto":
             device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
         if ebd_model is None:
-            model_kwargs = {"device": device}
-            encode_kwargs = {"normalize_embeddings": True}  # 设置为 True 以计算余弦相似度
-            bge_embeddings = HuggingFaceBgeEmbeddings(
-                model_name=path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
-            )
+            bge_embeddings = embedding_registry.acquire(path, device)
+            embedding_registry.release(self.acquired)
+            self.acquired = bge_embeddings
         else:
+            # 只释放自己acquire的模型，ebd_model由加载它的节点管理
+            embedding_registry.release(self.acquired)
+            self.acquired = None
             bge_embeddings = ebd_model
         if base_path != "":
             knowledge_base = FAISS.load_local(base_path, bge_embeddings, allow_dangerous_deserialization=True)
         else:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-            )
-            chunks = text_splitter.split_text(file_content)
-            knowledge_base = FAISS.from_texts(chunks, bge_embeddings)
+            chunks = split_chunks(file_content, chunk_size, chunk_overlap)
+            knowledge_base = FAISS.from_texts(chunks, EmbeddingEngine(bge_embeddings))
         file_list[file_name] = knowledge_base
         output = [
             {
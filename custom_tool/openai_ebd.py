@@ -1,4 +1,5 @@
 import configparser
+import importlib
 import json
 import locale
 import os
@@ -16,6 +17,9 @@ from openai import OpenAI
 # 当前脚本目录的上级目录
 current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 config_path = os.path.join(current_dir, "config.ini")
+package_name = os.path.basename(current_dir)
+# 批量并发请求词嵌入接口，并复用磁盘上已经缓存的向量
+EmbeddingEngine = importlib.import_module(package_name + ".tools.ebd_engine").EmbeddingEngine
 
 
 def load_api_keys(config_file):
@@ -116,7 +120,9 @@ class load_openai_ebd:
         if not openai.api_key:
             return ("请输入API_KEY",)
 
-        embeddings = OpenAIEmbeddings(model=model_name, api_key=openai.api_key, base_url=openai.base_url)
+        embeddings = EmbeddingEngine(
+            OpenAIEmbeddings(model=model_name, api_key=openai.api_key, base_url=openai.base_url)
+        )
 
         if not base_path:
             # 将文件内容按段落分割
@@ -212,7 +218,9 @@ class openai_ebd_tool:
         if not openai.api_key:
             return ("请输入API_KEY",)
 
-        embeddings = OpenAIEmbeddings(model=model_name, api_key=openai.api_key, base_url=openai.base_url)
+        embeddings = EmbeddingEngine(
+            OpenAIEmbeddings(model=model_name, api_key=openai.api_key, base_url=openai.base_url)
+        )
 
         if not base_path:
             # 将文件内容按段落分割
@@ -326,7 +334,9 @@ class save_openai_ebd:
         if not openai.api_key:
             return ("请输入API_KEY",)
 
-        embeddings = OpenAIEmbeddings(model=model_name, api_key=openai.api_key, base_url=openai.base_url)
+        embeddings = EmbeddingEngine(
+            OpenAIEmbeddings(model=model_name, api_key=openai.api_key, base_url=openai.base_url)
+        )
 
         # 将文件内容按段落分割
         paragraphs = file_content.split("\n")
@@ -357,6 +367,9 @@ import os
 import sys
 current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 config_path = os.path.join(current_dir, "config.ini")
+package_name = os.path.basename(current_dir)
+# 批量并发请求词嵌入接口，并复用磁盘上已经缓存的向量
+EmbeddingEngine = importlib.import_module(package_name + ".tools.ebd_engine").EmbeddingEngine
 import configparser
 config = configparser.ConfigParser()
 config.read(config_path)
@@ -17,6 +17,7 @@ import requests
 import torch
 import websocket  # NOTE: websocket-client (https://github.com/websocket-client/websocket-client)
 from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from PIL import Image, ImageOps
 from pydantic import BaseModel
 
@@ -50,8 +51,6 @@ def get_history(prompt_id):
 
 def get_all(ws, prompt):
     prompt_id = queue_prompt(prompt)["prompt_id"]
-    output_images = {}
-    output_text = ""
     while True:
         out = ws.recv()
         if isinstance(out, str):
@@ -63,6 +62,29 @@ def get_all(ws, prompt):
         else:
             continue  # previews are binary data
 
+    return get_outputs(prompt_id)
+
+
+def stream_all(ws, prompt_id, stream_node):
+    # 在工作流执行期间转发stream_node推送的增量文本，工作流执行完毕后结束
+    while True:
+        out = ws.recv()
+        if isinstance(out, str):
+            message = json.loads(out)
+            data = message["data"]
+            if message["type"] == "party_stream":
+                if str(data["node"]) == stream_node and data.get("prompt_id") in (None, prompt_id):
+                    yield data["delta"]
+            elif message["type"] == "executing":
+                if data["node"] is None and data["prompt_id"] == prompt_id:
+                    break  # Execution is done
+        else:
+            continue  # previews are binary data
+
+
+def get_outputs(prompt_id):
+    output_images = {}
+    output_text = ""
     history = get_history(prompt_id)[prompt_id]
     for o in history["outputs"]:
         for node_id in history["outputs"]:
@@ -90,6 +112,48 @@ def api(
     negative_prompt="",
     model_name="",
     workflow_path="测试画画api.json",
+):
+    prompt = load_prompt(
+        file_content,
+        image_input,
+        file_path,
+        img_path,
+        system_prompt,
+        user_prompt,
+        positive_prompt,
+        negative_prompt,
+        model_name,
+        workflow_path,
+    )
+    ws = websocket.WebSocket()
+    ws.connect("ws://{}/ws?clientId={}".format(server_address, client_id))
+    images, res = get_all(ws, prompt)
+    return images, res
+
+
+def find_stream_node(prompt):
+    # 找到输出直接连到end_workflow文本输入的LLM节点，只有它的增量文本会被转发给客户端
+    for p in prompt:
+        if prompt[p]["class_type"] == "end_workflow":
+            text = prompt[p]["inputs"].get("text")
+            if isinstance(text, list) and text[1] == 0:
+                node_id = str(text[0])
+                if node_id in prompt and prompt[node_id]["class_type"] == "LLM":
+                    return node_id
+    return None
+
+
+def load_prompt(
+    file_content="",
+    image_input=None,
+    file_path="",
+    img_path="",
+    system_prompt="你是一个强大的智能助手",
+    user_prompt="",
+    positive_prompt="",
+    negative_prompt="",
+    model_name="",
+    workflow_path="测试画画api.json",
 ):
     global current_dir_path
     workflow_path = workflow_path
@@ -116,11 +180,7 @@ def api(
             prompt[p]["inputs"]["positive_prompt"] = positive_prompt
             prompt[p]["inputs"]["negative_prompt"] = negative_prompt
             prompt[p]["inputs"]["model_name"] = model_name
-
-    ws = websocket.WebSocket()
-    ws.connect("ws://{}/ws?clientId={}".format(server_address, client_id))
-    images, res = get_all(ws, prompt)
-    return images, res
+    return prompt
 
 
 app = FastAPI()
@@ -137,6 +197,7 @@ class CompletionRequest(BaseModel):
     model: str
     messages: List[Message]
     max_tokens: int = 150  # 添加了默认值
+    stream: bool = False
 
 
 VALID_API_KEY = fastapi_api_key
@@ -188,6 +249,9 @@ async def get_models():
 @app.post("/v1/chat/completions")
 async def create_completion(request_data: CompletionRequest, dependency=Depends(verify_api_key)):
     try:
+        if request_data.stream:
+            # 以SSE的形式返回chat.completion.chunk
+            return StreamingResponse(await process_stream_request(request_data), media_type="text/event-stream")
         # 处理请求并生成响应
         response = await process_request(request_data)
     except Exception as e:
@@ -196,10 +260,8 @@ async def create_completion(request_data: CompletionRequest, dependency=Depends(
     return response
 
 
-# 异步函数来处理请求并生成响应
-async def process_request(request_data: CompletionRequest):
-    model_name = request_data.model
-    print(model_name)
+# 解析请求中的消息，返回系统提示词、用户提示词和图片张量列表
+async def parse_messages(request_data: CompletionRequest):
     base64_encoded_list = []
     system_prompt = ""
     # 遍历消息
@@ -256,7 +318,95 @@ async def process_request(request_data: CompletionRequest):
 
         # 添加到输出列表
         img_out.append(image_tensor)
+    return system_prompt, user_prompt, img_out
+
+
+def upload_imgbb(image_data):
+    # 上传图片到imgbb，返回(图片URL, 错误信息)
+    img_base64 = base64.b64encode(image_data).decode("utf-8")
+    # 构建config.ini的绝对路径
+    config_path = os.path.join(current_dir_path, "config.ini")
+    # 从config.ini找到imgbb_key
+    config = configparser.ConfigParser()
+    config.read(config_path, encoding="utf-8")
+    api_keys = {}
+    if "API_KEYS" in config:
+        api_keys = config["API_KEYS"]
+
+    imgbb_key = api_keys.get("imgbb_api")
+    if imgbb_key is None or imgbb_key == "":
+        # 返回imgbb_key缺失，需要在config.ini填入的报错
+        return None, {"error": "imgbb_api key is missing in config.ini"}
+
+    url = "https://api.imgbb.com/1/upload"
+    payload = {"key": imgbb_key, "image": img_base64}
+    # 向API发送POST请求
+    response0 = requests.post(url, data=payload)
+    # 检查请求是否成功
+    if response0.status_code == 200:
+        # 解析响应以获取图片URL
+        result = response0.json()
+        return result["data"]["url"], None
+    return None, "Error: " + response0.text
+
+
+def completion_chunk(chunk_id, model_name, delta, finish_reason=None):
+    chunk = {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model_name,
+        "system_fingerprint": "fp_0",
+        "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+    }
+    return "data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n"
+
+
+# 异步函数来处理流式请求，返回SSE事件的生成器
+async def process_stream_request(request_data: CompletionRequest):
+    model_name = request_data.model
+    system_prompt, user_prompt, img_out = await parse_messages(request_data)
+    prompt = load_prompt("", img_out, "", "", system_prompt, user_prompt, "", "", "", model_name + ".json")
+    stream_node = find_stream_node(prompt)
+    if stream_node is not None:
+        prompt[stream_node]["inputs"]["stream"] = True
+    ws = websocket.WebSocket()
+    ws.connect("ws://{}/ws?clientId={}".format(server_address, client_id))
+    prompt_id = queue_prompt(prompt)["prompt_id"]
+    chunk_id = "chatcmpl-" + prompt_id
+
+    # 同步生成器，StreamingResponse会在线程池中迭代它，不会阻塞事件循环
+    def events():
+        try:
+            yield completion_chunk(chunk_id, model_name, {"role": "assistant", "content": ""})
+            streamed = False
+            for delta in stream_all(ws, prompt_id, stream_node):
+                streamed = True
+                yield completion_chunk(chunk_id, model_name, {"content": delta})
+            images, response = get_outputs(prompt_id)
+            if not streamed and response:
+                # 工作流中没有可流式输出的LLM节点，一次性返回最终文本
+                yield completion_chunk(chunk_id, model_name, {"content": response})
+            for node_id in images:
+                for image_data in images[node_id]:
+                    img_url, error = upload_imgbb(image_data)
+                    if error is not None:
+                        yield completion_chunk(chunk_id, model_name, {"content": "\n" + str(error) + "\n"})
+                    else:
+                        yield completion_chunk(chunk_id, model_name, {"content": f"\n![image]({img_url})\n"})
+            yield completion_chunk(chunk_id, model_name, {}, "stop")
+            yield "data: [DONE]\n\n"
+        finally:
+            ws.close()
+
+    return events()
 
+
+# 异步函数来处理请求并生成响应
+async def process_request(request_data: CompletionRequest):
+    model_name = request_data.model
+    print(model_name)
+    system_prompt, user_prompt, img_out = await parse_messages(request_data)
     workflow_path = model_name + ".json"
     # 调用API函数
     images, response = api(
@@ -294,41 +444,11 @@ async def process_request(request_data: CompletionRequest):
 
         for node_id in images:
             for image_data in images[node_id]:
-                # 获得image的base64编码
-                img_base64 = base64.b64encode(image_data).decode("utf-8")
-
-            global current_dir_path
-            # 构建config.ini的绝对路径
-            config_path = os.path.join(current_dir_path, "config.ini")
-            print(config_path)
-            # 从config.ini找到imgbb_key
-            config = configparser.ConfigParser()
-            config.read(config_path, encoding="utf-8")
-            api_keys = {}
-            if "API_KEYS" in config:
-                api_keys = config["API_KEYS"]
-
-            imgbb_key = api_keys.get("imgbb_api")
-            print(imgbb_key)
-
-            if imgbb_key is None or imgbb_key == "":
-                # 返回imgbb_key缺失，需要在config.ini填入的报错
-                return {"error": "imgbb_api key is missing in config.ini"}
-
-            url = "https://api.imgbb.com/1/upload"
-            payload = {"key": imgbb_key, "image": img_base64}
-            # 向API发送POST请求
-            response0 = requests.post(url, data=payload)
-            # 检查请求是否成功
-            if response0.status_code == 200:
-                # 解析响应以获取图片URL
-                result = response0.json()
-                img_url = result["data"]["url"]
-            else:
-                return "Error: " + response0.text
-            print(img_url)
-            base64_images.append(img_url)
-            print("1" + img_url)
+                img_url, error = upload_imgbb(image_data)
+                if error is not None:
+                    return error
+                print(img_url)
+                base64_images.append(img_url)
         if response is None:
             response == ""
         for img in base64_images:
@@ -11,9 +11,12 @@ import os
 import random
 import re
 import sys
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
+import httpx
 import numpy as np
 import openai
 import requests
@@ -29,10 +32,14 @@ import PIL.Image
 if torch.cuda.is_available():
     from transformers import BitsAndBytesConfig
 from google.protobuf.struct_pb2 import Struct
+from server import PromptServer
 from torchvision.transforms import ToPILImage
 
 from .config import config_key, config_path, current_dir_path, load_api_keys
 from .tools.lorebook import Lorebook
+from .tools.conversation_store import conversation_store, list_records
+from .tools.response_cache import cached_call, image_digest
+from .tools.kv_cache import kv_cache_store
 from .tools.api_tool import (
     api_function,
     api_tool,
@@ -46,7 +53,7 @@ from .tools.api_tool import (
     parameter_function,
     use_api_tool,
 )
-from .tools.check_web import check_web, check_web_tool
+from .tools.check_web import check_web, check_web_tool, check_webs
 from .tools.classify_function import classify_function, classify_function_plus
 from .tools.classify_persona import classify_persona, classify_persona_plus
 from .tools.clear_file import clear_file
@@ -101,9 +108,12 @@ from .tools.KG_neo4j import (
     KG_neo_toolkit_user,
     Modify_entities_neo4j,
     Modify_relationships_neo4j,
+    New_entities_batch_neo4j,
     New_entities_neo4j,
+    New_relationships_batch_neo4j,
     New_relationships_neo4j,
 )
+from .tools.graph_rag import graph_rag, graph_rag_tool
 from .tools.load_ebd import data_base, ebd_tool, embeddings_function, save_ebd_database,load_ebd
 from .tools.load_file import (
     load_file,
@@ -127,6 +137,8 @@ from .tools.search_web import (
     duckduckgo_tool,
     duckduckgo_loader,
     search_duckduckgo,
+    meta_search_tool,
+    search_web_all,
 )
 from .tools.show_text import About_us, show_text_party
 from .tools.smalltool import bool_logic, load_int, none2false,str2float
@@ -146,8 +158,10 @@ _TOOL_HOOKS = [
     "search_web",
     "search_web_bing",
     "check_web",
+    "check_webs",
     "interpreter",
     "data_base",
+    "graph_rag",
     "another_llm",
     "new_interpreter",
     "use_api_tool",
@@ -183,7 +197,10 @@ _TOOL_HOOKS = [
     "Delete_relationships_neo4j",
     "Inquire_entity_relationships_neo4j",
     "Inquire_entity_list_neo4j",
+    "New_entities_batch_neo4j",
+    "New_relationships_batch_neo4j",
     "search_duckduckgo",
+    "search_web_all",
 ]
 instances = []
 image_buffer = []
@@ -338,6 +355,37 @@ def dispatch_tool(tool_name: str, tool_params: dict) -> str:
     except:
         ret = traceback.format_exc()
     return str(ret)
+
+
+# 同一轮中并行执行工具调用的最大线程数
+MAX_TOOL_WORKERS = 8
+
+
+def dispatch_tools(tool_calls) -> list:
+    # 并行执行模型在同一轮返回的多个工具调用，tool_calls为(工具名, 参数JSON字符串)的列表，结果按顺序返回
+    def run(tool_call):
+        tool_name, arguments = tool_call
+        try:
+            tool_params = json.loads(arguments)
+        except Exception:
+            return traceback.format_exc()
+        return dispatch_tool(tool_name, tool_params)
+
+    if len(tool_calls) == 1:
+        return [run(tool_calls[0])]
+    with ThreadPoolExecutor(max_workers=min(len(tool_calls), MAX_TOOL_WORKERS)) as executor:
+        return list(executor.map(run, tool_calls))
+
+
+def send_stream_message(unique_id, delta):
+    # 将流式生成的增量文本作为进度消息推送给前端和监听websocket的客户端（如fast_api.py）
+    server = PromptServer.instance
+    server.send_sync(
+        "party_stream",
+        {"node": unique_id, "prompt_id": getattr(server, "last_prompt_id", None), "delta": delta},
+    )
+
+
 def convert_to_gemini(openai_history):
     for entry in openai_history:
         role = entry["role"]
@@ -381,8 +429,28 @@ class genChat:
         is_tools_in_sys_prompt="disable",
         images=None,
         imgbb_api_key="",
+        response_cache="disable",
         **extra_parameters,
     ):
+        if response_cache != "disable":
+            return cached_call(
+                response_cache,
+                temperature,
+                {
+                    "model": self.model_name,
+                    "history": history,
+                    "user_prompt": user_prompt,
+                    "temperature": temperature,
+                    "max_length": max_length,
+                    "tools": tools,
+                    "images": image_digest(images),
+                    "extra_parameters": extra_parameters,
+                },
+                history,
+                lambda: self.send(
+                    user_prompt, temperature, max_length, history, tools, is_tools_in_sys_prompt, images, imgbb_api_key, **extra_parameters
+                ),
+            )
         try:
             if tools is None:
                 tools = []
@@ -464,11 +532,46 @@ class genChat:
         return text, history
 
 
+# 按(base_url, api_key, 连接池参数)缓存的OpenAI客户端，同一个端点、同样设置的所有Chat共享HTTP连接池
+openai_clients = {}
+openai_clients_lock = threading.Lock()
+
+
+def get_openai_clients(base_url, api_key, max_connections=20, timeout=60.0, http2=False):
+    """返回(OpenAI, AsyncOpenAI)客户端，两者使用相同的连接池参数。
+
+    连接池参数也是键的一部分，设置不同的加载器各自使用自己的客户端；客户端可能还被其他Chat持有，
+    所以从不主动关闭，随进程一起结束。
+    """
+    key = (base_url, api_key, max_connections, timeout, http2)
+    with openai_clients_lock:
+        cached = openai_clients.get(key)
+        if cached is not None:
+            return cached
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            http_client=httpx.Client(limits=limits, timeout=timeout, http2=http2),
+        )
+        async_client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2),
+        )
+        openai_clients[key] = (client, async_client)
+        return client, async_client
+
+
 class Chat:
-    def __init__(self, model_name, apikey, baseurl) -> None:
+    def __init__(self, model_name, apikey, baseurl, max_connections=20, timeout=60.0, http2=False) -> None:
         self.model_name = model_name
         self.apikey = apikey
         self.baseurl = baseurl
+        # 每个Chat使用自己端点的客户端，不再修改openai模块的全局api_key/base_url
+        self.client, self.async_client = get_openai_clients(baseurl, apikey, max_connections, timeout, http2)
 
     def send(
         self,
@@ -480,8 +583,31 @@ class Chat:
         is_tools_in_sys_prompt="disable",
         images=None,
         imgbb_api_key="",
+        stream=False,
+        response_cache="disable",
         **extra_parameters,
     ):
+        if response_cache != "disable" and not stream:
+            return cached_call(
+                response_cache,
+                temperature,
+                {
+                    "model": self.model_name,
+                    "base_url": self.baseurl,
+                    "history": history,
+                    "user_prompt": user_prompt,
+                    "temperature": temperature,
+                    "max_length": max_length,
+                    "tools": tools,
+                    "is_tools_in_sys_prompt": is_tools_in_sys_prompt,
+                    "images": image_digest(images),
+                    "extra_parameters": extra_parameters,
+                },
+                history,
+                lambda: self.send(
+                    user_prompt, temperature, max_length, history, tools, is_tools_in_sys_prompt, images, imgbb_api_key, **extra_parameters
+                ),
+            )
         try:
             if images is not None:
                 if imgbb_api_key == "" or imgbb_api_key is None:
@@ -531,13 +657,14 @@ class Chat:
                         },
                     ]
                     user_prompt = img_json
-            openai.api_key = self.apikey
-            openai.base_url = self.baseurl
             new_message = {"role": "user", "content": user_prompt}
             history.append(new_message)
             print(history)
+            if stream:
+                # 流式模式下返回增量文本的生成器，生成结束后回复会追加到history中
+                return self.send_stream(history, temperature, max_length, tools, **extra_parameters)
             if tools is not None:
-                response = openai.chat.completions.create(
+                response = self.client.chat.completions.create(
                     model=self.model_name,
                     messages=history,
                     temperature=temperature,
@@ -547,37 +674,42 @@ class Chat:
                 )
                 while response.choices[0].message.tool_calls:
                     assistant_message = response.choices[0].message
-                    response_content = assistant_message.tool_calls[0].function
-                    print("正在调用" + response_content.name + "工具")
-                    print(response_content.arguments)
-                    results = dispatch_tool(response_content.name, json.loads(response_content.arguments))
-                    print(results)
+                    tool_calls = assistant_message.tool_calls
+                    for tool_call in tool_calls:
+                        print("正在调用" + tool_call.function.name + "工具")
+                        print(tool_call.function.arguments)
+                    results_list = dispatch_tools(
+                        [(tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+                    )
+                    print(results_list)
                     history.append(
                         {
                             "tool_calls": [
                                 {
-                                    "id": assistant_message.tool_calls[0].id,
+                                    "id": tool_call.id,
                                     "function": {
-                                        "arguments": response_content.arguments,
-                                        "name": response_content.name,
+                                        "arguments": tool_call.function.arguments,
+                                        "name": tool_call.function.name,
                                     },
-                                    "type": assistant_message.tool_calls[0].type,
+                                    "type": tool_call.type,
                                 }
+                                for tool_call in tool_calls
                             ],
                             "role": "assistant",
-                            "content": str(response_content),
-                        }
-                    )
-                    history.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": assistant_message.tool_calls[0].id,
-                            "name": response_content.name,
-                            "content": results,
+                            "content": str(assistant_message.content or ""),
                         }
                     )
+                    for tool_call, results in zip(tool_calls, results_list):
+                        history.append(
+                            {
+                                "role": "tool",
+                                "tool_call_id": tool_call.id,
+                                "name": tool_call.function.name,
+                                "content": results,
+                            }
+                        )
                     try:
-                        response = openai.chat.completions.create(
+                        response = self.client.chat.completions.create(
                             model=self.model_name,
                             messages=history,
                             tools=tools,
@@ -588,21 +720,21 @@ class Chat:
                         print(response)
                     except Exception as e:
                         print("tools calling失败，尝试使用function calling" + str(e))
-                        # 删除history最后两个元素
-                        history.pop()
-                        history.pop()
-                        history.append(
-                            {
-                                "role": "assistant",
-                                "content": str(response_content),
-                                "function_call": {
-                                    "name": response_content.name,
-                                    "arguments": response_content.arguments,
-                                },
-                            }
-                        )
-                        history.append({"role": "function", "name": response_content.name, "content": results})
-                        response = openai.chat.completions.create(
+                        # 删除本轮追加的assistant消息和所有tool消息
+                        del history[-(len(tool_calls) + 1) :]
+                        for tool_call, results in zip(tool_calls, results_list):
+                            history.append(
+                                {
+                                    "role": "assistant",
+                                    "content": str(tool_call.function),
+                                    "function_call": {
+                                        "name": tool_call.function.name,
+                                        "arguments": tool_call.function.arguments,
+                                    },
+                                }
+                            )
+                            history.append({"role": "function", "name": tool_call.function.name, "content": results})
+                        response = self.client.chat.completions.create(
                             model=self.model_name,
                             messages=history,
                             tools=tools,
@@ -627,7 +759,7 @@ class Chat:
                         }
                     )
                     history.append({"role": "function", "name": function_name, "content": results})
-                    response = openai.chat.completions.create(
+                    response = self.client.chat.completions.create(
                         model=self.model_name,
                         messages=history,
                         tools=tools,
@@ -638,7 +770,7 @@ class Chat:
                 response_content = response.choices[0].message.content
                 print(response)
             elif is_tools_in_sys_prompt == "enable":
-                response = openai.chat.completions.create(
+                response = self.client.chat.completions.create(
                     model=self.model_name,
                     messages=history,
                     temperature=temperature,
@@ -668,7 +800,7 @@ class Chat:
                             + "。请根据工具返回的结果继续回答我之前提出的问题。",
                         }
                     )
-                    response = openai.chat.completions.create(
+                    response = self.client.chat.completions.create(
                         model=self.model_name,
                         messages=history,
                         temperature=temperature,
@@ -677,7 +809,7 @@ class Chat:
                     )
                     response_content = response.choices[0].message.content
             else:
-                response = openai.chat.completions.create(
+                response = self.client.chat.completions.create(
                     model=self.model_name,
                     messages=history,
                     temperature=temperature,
@@ -690,6 +822,71 @@ class Chat:
             response_content = str(ex)
         return response_content, history
 
+    def send_stream(self, history, temperature, max_length, tools=None, **extra_parameters):
+        # 以流式方式请求模型，逐块yield回复文本；遇到工具调用时先并行执行工具，再继续流式请求
+        content = []
+        try:
+            while True:
+                if tools is not None:
+                    extra_parameters["tools"] = tools
+                response = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=history,
+                    temperature=temperature,
+                    max_tokens=max_length,
+                    stream=True,
+                    **extra_parameters,
+                )
+                content = []
+                tool_calls = {}
+                for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        content.append(delta.content)
+                        yield delta.content
+                    if delta.tool_calls:
+                        # 工具调用的名称和参数是分块返回的，按index拼接
+                        for tool_call in delta.tool_calls:
+                            call = tool_calls.setdefault(
+                                tool_call.index,
+                                {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+                            )
+                            if tool_call.id:
+                                call["id"] = tool_call.id
+                            if tool_call.function is not None:
+                                if tool_call.function.name:
+                                    call["function"]["name"] += tool_call.function.name
+                                if tool_call.function.arguments:
+                                    call["function"]["arguments"] += tool_call.function.arguments
+                if tool_calls == {}:
+                    history.append({"role": "assistant", "content": "".join(content)})
+                    return
+                tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+                for tool_call in tool_calls:
+                    print("正在调用" + tool_call["function"]["name"] + "工具")
+                    print(tool_call["function"]["arguments"])
+                results_list = dispatch_tools(
+                    [(tool_call["function"]["name"], tool_call["function"]["arguments"]) for tool_call in tool_calls]
+                )
+                print(results_list)
+                history.append({"tool_calls": tool_calls, "role": "assistant", "content": "".join(content)})
+                for tool_call, results in zip(tool_calls, results_list):
+                    history.append(
+                        {
+                            "role": "tool",
+                            "tool_call_id": tool_call["id"],
+                            "name": tool_call["function"]["name"],
+                            "content": results,
+                        }
+                    )
+
+        except Exception as ex:
+            # 与非流式请求一样把异常信息作为回复，已经输出的部分回复写入历史
+            if content:
+                history.append({"role": "assistant", "content": "".join(content)})
+            yield ("\n" if content else "") + str(ex)
 
 class LLM_api_loader:
     def __init__(self):
@@ -715,6 +912,9 @@ class LLM_api_loader:
                     },
                 ),
                 "is_ollama": ("BOOLEAN", {"default": False}),
+                "max_connections": ("INT", {"default": 20, "min": 1, "max": 1000}),
+                "timeout": ("FLOAT", {"default": 60.0, "min": 1.0, "max": 3600.0, "step": 1.0}),
+                "http2": ("BOOLEAN", {"default": False}),
             },
         }
 
@@ -727,33 +927,33 @@ class LLM_api_loader:
 
     CATEGORY = "大模型派对（llm_party）/加载器（loader）"
 
-    def chatbot(self, model_name, base_url=None, api_key=None, is_ollama=False):
+    def chatbot(
+        self, model_name, base_url=None, api_key=None, is_ollama=False, max_connections=20, timeout=60.0, http2=False
+    ):
         if is_ollama:
-            openai.api_key = "ollama"
-            openai.base_url = "http://127.0.0.1:11434/v1/"
+            api_key = "ollama"
+            base_url = "http://127.0.0.1:11434/v1/"
         else:
             api_keys = load_api_keys(config_path)
-            if api_key != "":
-                openai.api_key = api_key
-            elif model_name in config_key:
-                api_keys = config_key[model_name]
-                openai.api_key = api_keys.get("api_key")
-            elif api_keys.get("openai_api_key") != "":
-                openai.api_key = api_keys.get("openai_api_key")
-            if base_url != "":
-                openai.base_url = base_url
-            elif model_name in config_key:
-                api_keys = config_key[model_name]
-                openai.base_url = api_keys.get("base_url")
-            elif api_keys.get("base_url") != "":
-                openai.base_url = api_keys.get("base_url")
-            if openai.api_key == "":
+            if api_key is None or api_key == "":
+                if model_name in config_key:
+                    api_key = config_key[model_name].get("api_key")
+                elif api_keys.get("openai_api_key") != "":
+                    api_key = api_keys.get("openai_api_key")
+            if base_url is None or base_url == "":
+                if model_name in config_key:
+                    base_url = config_key[model_name].get("base_url")
+                elif api_keys.get("base_url") != "":
+                    base_url = api_keys.get("base_url")
+            if api_key is None or api_key == "":
                 return ("请输入API_KEY",)
-            if openai.base_url != "":
-                if openai.base_url[-1] != "/":
-                    openai.base_url = openai.base_url + "/"
+            if base_url is not None and base_url != "":
+                if base_url[-1] != "/":
+                    base_url = base_url + "/"
+            else:
+                base_url = None
 
-        chat = Chat(model_name, openai.api_key, openai.base_url)
+        chat = Chat(model_name, api_key, base_url, max_connections, timeout, http2)
         return (chat,)
 
 
@@ -816,10 +1016,7 @@ class LLM:
         self.prompt_path = os.path.join(current_dir_path, "temp", str(self.id) + ".json")
         # 如果文件不存在，创建prompt.json文件，存在就覆盖文件
         if not os.path.exists(self.prompt_path):
-            with open(self.prompt_path, "w", encoding="utf-8") as f:
-                json.dump(
-                    [{"role": "system", "content": "你是一个强大的人工智能助手。"}], f, indent=4, ensure_ascii=False
-                )
+            conversation_store.reset(self.prompt_path, [{"role": "system", "content": "你是一个强大的人工智能助手。"}])
         self.tool_data = {"id": self.id, "system_prompt": "", "type": "api"}
         self.list = []
         self.added_to_list = False
@@ -828,9 +1025,7 @@ class LLM:
     @classmethod
     def INPUT_TYPES(s):
         temp_path = os.path.join(current_dir_path, "temp")
-        full_paths = [os.path.join(temp_path, f) for f in os.listdir(temp_path)]
-        full_paths.sort(key=os.path.getmtime, reverse=True)
-        paths = [os.path.basename(f) for f in full_paths]
+        paths = list_records(temp_path)
         paths.insert(0, "")
         return {
             "required": {
@@ -866,6 +1061,11 @@ class LLM:
                 "historical_record": (paths, {"default": ""}),
                 "is_enable": ("BOOLEAN", {"default": True}),
                 "extra_parameters": ("DICT", {"forceInput": True}),
+                "stream": ("BOOLEAN", {"default": False}),
+                "response_cache": (["disable", "enable", "force"], {"default": "disable"}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             },
         }
 
@@ -909,6 +1109,9 @@ class LLM:
         historical_record="",
         is_enable=True,
         extra_parameters=None,
+        stream=False,
+        response_cache="disable",
+        unique_id=None,
     ):
         if not is_enable:
             return (
@@ -986,8 +1189,7 @@ class LLM:
 
         llm_tools_json = json.dumps(llm_tools, ensure_ascii=False, indent=4)
         if (user_prompt is None or user_prompt.strip() == "") and (images is None or images == []):
-            with open(self.prompt_path, "r", encoding="utf-8") as f:
-                history = json.load(f)
+            history = conversation_store.load(self.prompt_path)
             return (
                 "",
                 str(history),
@@ -997,12 +1199,10 @@ class LLM:
         else:
             try:
                 if is_memory == "disable":
-                    with open(self.prompt_path, "w", encoding="utf-8") as f:
-                        json.dump([{"role": "system", "content": system_prompt}], f, indent=4, ensure_ascii=False)
+                    conversation_store.reset(self.prompt_path, [{"role": "system", "content": system_prompt}])
                 api_keys = load_api_keys(config_path)
 
-                with open(self.prompt_path, "r", encoding="utf-8") as f:
-                    history = json.load(f)
+                history = conversation_store.load(self.prompt_path)
                 history_temp = [history[0]]
                 elements_to_keep = 2 * conversation_rounds
                 if elements_to_keep < len(history) - 1:
@@ -1089,13 +1289,28 @@ class LLM:
                         + "请根据文件内容回答用户问题。\n"
                         + "如果无法从文件内容中找到答案，请回答“抱歉，我无法从文件内容中找到答案。”"
                     )
-                if extra_parameters is not None and extra_parameters != {}:
+                if stream and isinstance(model, Chat) and is_tools_in_sys_prompt == "disable":
+                    if extra_parameters is None:
+                        extra_parameters = {}
+                    result = model.send(
+                        user_prompt, temperature, max_length, history, tools, is_tools_in_sys_prompt,images,imgbb_api_key, stream=True, **extra_parameters
+                    )
+                    if isinstance(result, tuple):
+                        # 请求还未开始流式输出就失败了
+                        response, history = result
+                    else:
+                        deltas = []
+                        for delta in result:
+                            deltas.append(delta)
+                            send_stream_message(unique_id, delta)
+                        response = "".join(deltas)
+                elif extra_parameters is not None and extra_parameters != {}:
                     response, history = model.send(
-                        user_prompt, temperature, max_length, history, tools, is_tools_in_sys_prompt,images,imgbb_api_key, **extra_parameters
+                        user_prompt, temperature, max_length, history, tools, is_tools_in_sys_prompt,images,imgbb_api_key, response_cache=response_cache, **extra_parameters
                     )
                 else:
                     response, history = model.send(
-                        user_prompt, temperature, max_length, history, tools, is_tools_in_sys_prompt,images,imgbb_api_key
+                        user_prompt, temperature, max_length, history, tools, is_tools_in_sys_prompt,images,imgbb_api_key, response_cache=response_cache
                     )
                 print(response)
                 # 修改prompt.json文件
@@ -1103,8 +1318,7 @@ class LLM:
                 history_get.extend(history_copy)
                 history_get.extend(history[1:])
                 history = history_get
-                with open(self.prompt_path, "w", encoding="utf-8") as f:
-                    json.dump(history, f, indent=4, ensure_ascii=False)
+                conversation_store.save(self.prompt_path, history)
                 history = json.dumps(history, ensure_ascii=False,indent=4)
                 global image_buffer
                 image_out = image_buffer.copy()
@@ -1134,19 +1348,68 @@ class LLM:
 
 
 def llm_chat(
-    model, tokenizer, user_prompt, history, device, max_length, role="user", temperature=0.7, **extra_parameters
+    model,
+    tokenizer,
+    user_prompt,
+    history,
+    device,
+    max_length,
+    role="user",
+    temperature=0.7,
+    response_cache="disable",
+    session_id=None,
+    **extra_parameters,
 ):
+    if response_cache != "disable":
+        return cached_call(
+            response_cache,
+            temperature,
+            {
+                "model": model.config._name_or_path,
+                "history": history,
+                "user_prompt": user_prompt,
+                "role": role,
+                "temperature": temperature,
+                "max_length": max_length,
+                "extra_parameters": extra_parameters,
+            },
+            history,
+            lambda: llm_chat(
+                model,
+                tokenizer,
+                user_prompt,
+                history,
+                device,
+                max_length,
+                role,
+                temperature,
+                session_id=session_id,
+                **extra_parameters,
+            ),
+        )
     history.append({"role": role, "content": user_prompt.strip()})
     text = tokenizer.apply_chat_template(history, tokenize=False, add_generation_prompt=True)
     model_inputs = tokenizer([text], return_tensors="pt").to(device)
+    generate_kwargs = {}
+    if session_id is not None:
+        # 复用同一对话上一轮的KV缓存，只对新增的token做prefill
+        past_key_values = kv_cache_store.get(session_id, model, model_inputs.input_ids[0].tolist())
+        if past_key_values is not None:
+            generate_kwargs["past_key_values"] = past_key_values
+        generate_kwargs["return_dict_in_generate"] = True
     generated_ids = model.generate(
         model_inputs.input_ids,
         max_new_tokens=max_length,
         do_sample=True,
         temperature=temperature,
         eos_token_id=tokenizer.eos_token_id,
+        **generate_kwargs,
         **extra_parameters,  # Add the eos_token_id parameter
     )
+    if session_id is not None:
+        if getattr(generated_ids, "past_key_values", None) is not None:
+            kv_cache_store.put(session_id, model, generated_ids.sequences[0].tolist(), generated_ids.past_key_values)
+        generated_ids = generated_ids.sequences
     generated_ids = [
         output_ids[len(input_ids) :] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
     ]
@@ -1155,6 +1418,84 @@ def llm_chat(
     return response, history
 
 
+def parse_batch_prompts(text):
+    # 批量模式的输入是JSON列表，例如迭代器一次输出的多行数据；不是字符串的元素（表格的一行、JSON对象）转成JSON文本
+    if text is None:
+        return None
+    try:
+        prompts = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(prompts, list) or prompts == []:
+        return None
+    return [prompt if isinstance(prompt, str) else json.dumps(prompt, ensure_ascii=False, indent=4) for prompt in prompts]
+
+
+def llm_chat_batch(
+    model,
+    tokenizer,
+    user_prompts,
+    history,
+    device,
+    max_length,
+    temperature=0.7,
+    batch_size=8,
+    token_budget=16384,
+    **extra_parameters,
+):
+    # 每个user_prompt各自接在history后面作为一个独立的单轮对话，左填充后成批调用generate，按输入顺序返回回复
+    texts = [
+        tokenizer.apply_chat_template(
+            history + [{"role": "user", "content": user_prompt.strip()}], tokenize=False, add_generation_prompt=True
+        )
+        for user_prompt in user_prompts
+    ]
+    input_ids = tokenizer(texts).input_ids
+    # 按长度排序，让同一批的输入长度接近，减少填充
+    order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]))
+    batches = []
+    batch = []
+    for i in order:
+        # 一批的token数（最长输入加上生成长度，乘以行数）不超过token_budget
+        longest = max(len(input_ids[j]) for j in batch + [i])
+        if batch != [] and (len(batch) >= batch_size or (len(batch) + 1) * (longest + max_length) > token_budget):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch != []:
+        batches.append(batch)
+
+    # tokenizer是共享的，临时修改的填充设置在结束后恢复
+    padding_side = tokenizer.padding_side
+    pad_token = tokenizer.pad_token
+    responses = [None] * len(texts)
+    try:
+        tokenizer.padding_side = "left"
+        if pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        for batch in batches:
+            model_inputs = tokenizer.pad({"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt").to(device)
+            generated_ids = model.generate(
+                model_inputs.input_ids,
+                attention_mask=model_inputs.attention_mask,
+                max_new_tokens=max_length,
+                do_sample=True,
+                temperature=temperature,
+                eos_token_id=tokenizer.eos_token_id,
+                pad_token_id=tokenizer.pad_token_id,
+                **extra_parameters,
+            )
+            # 左填充后所有输入长度相同，生成的内容都从同一个位置开始
+            generated_ids = generated_ids[:, model_inputs.input_ids.shape[1] :]
+            for i, response in zip(batch, tokenizer.batch_decode(generated_ids, skip_special_tokens=True)):
+                responses[i] = response
+    finally:
+        tokenizer.padding_side = padding_side
+        if pad_token is None:
+            tokenizer.pad_token = None
+    return responses
+
+
 class LLM_local_loader:
     original_IS_CHANGED = None
 
@@ -1388,10 +1729,7 @@ class LLM_local:
         self.prompt_path = os.path.join(current_dir_path, "temp", str(self.id) + ".json")
         # 如果文件不存在，创建prompt.json文件，存在就覆盖文件
         if not os.path.exists(self.prompt_path):
-            with open(self.prompt_path, "w", encoding="utf-8") as f:
-                json.dump(
-                    [{"role": "system", "content": "你是一个强大的人工智能助手。"}], f, indent=4, ensure_ascii=False
-                )
+            conversation_store.reset(self.prompt_path, [{"role": "system", "content": "你是一个强大的人工智能助手。"}])
         self.tool_data = {"id": self.id, "system_prompt": "", "type": "local"}
         self.list = []
         self.added_to_list = False
@@ -1400,9 +1738,7 @@ class LLM_local:
     @classmethod
     def INPUT_TYPES(s):
         temp_path = os.path.join(current_dir_path, "temp")
-        full_paths = [os.path.join(temp_path, f) for f in os.listdir(temp_path)]
-        full_paths.sort(key=os.path.getmtime, reverse=True)
-        paths = [os.path.basename(f) for f in full_paths]
+        paths = list_records(temp_path)
         paths.insert(0, "")
         return {
             "required": {
@@ -1438,6 +1774,9 @@ class LLM_local:
                 "historical_record": (paths, {"default": ""}),
                 "is_enable": ("BOOLEAN", {"default": True}),
                 "extra_parameters": ("DICT", {"forceInput": True}),
+                "response_cache": (["disable", "enable", "force"], {"default": "disable"}),
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": 256}),
+                "batch_token_budget": ("INT", {"default": 16384, "min": 256, "max": 1048576}),
             },
         }
 
@@ -1481,6 +1820,9 @@ class LLM_local:
         historical_record=None,
         is_enable=True,
         extra_parameters=None,
+        response_cache="disable",
+        batch_size=1,
+        batch_token_budget=16384,
     ):
         if not is_enable:
             return (
@@ -1509,6 +1851,14 @@ class LLM_local:
             is_enable,
             extra_parameters,
         ]
+        batch_prompts = None
+        if batch_size > 1 and model_type in ["llama", "Qwen"]:
+            # 批量模式：输入为JSON字符串列表时，每一行与user_prompt拼接后作为一个独立的请求
+            batch_prompts = parse_batch_prompts(user_prompt_input)
+            if batch_prompts is not None:
+                batch_prompts = [(user_prompt or "") + prompt for prompt in batch_prompts]
+            else:
+                batch_prompts = parse_batch_prompts(user_prompt)
         if user_prompt is None:
             user_prompt = user_prompt_input
         elif user_prompt_input is not None:
@@ -1557,8 +1907,7 @@ class LLM_local:
         ]
         llm_tools_json = json.dumps(llm_tools, ensure_ascii=False, indent=4)
         if (user_prompt is None or user_prompt.strip() == "") and (image is None or image == []):
-            with open(self.prompt_path, "r", encoding="utf-8") as f:
-                history = json.load(f)
+            history = conversation_store.load(self.prompt_path)
             return (
                 "",
                 str(history),
@@ -1567,10 +1916,8 @@ class LLM_local:
         else:
             try:
                 if is_memory == "disable":
-                    with open(self.prompt_path, "w", encoding="utf-8") as f:
-                        json.dump([{"role": "system", "content": system_prompt}], f, indent=4, ensure_ascii=False)
-                with open(self.prompt_path, "r", encoding="utf-8") as f:
-                    history = json.load(f)
+                    conversation_store.reset(self.prompt_path, [{"role": "system", "content": system_prompt}])
+                history = conversation_store.load(self.prompt_path)
                 history_temp = [history[0]]
                 elements_to_keep = 2 * conversation_rounds
                 if elements_to_keep < len(history) - 1:
@@ -1668,6 +2015,18 @@ class LLM_local:
                         + "请根据文件内容回答用户问题。\n"
                         + "如果无法从文件内容中找到答案，请回答“抱歉，我无法从文件内容中找到答案。”"
                     )
+                    if batch_prompts is not None:
+                        batch_prompts = [
+                            "文件中相关内容："
+                            + file_content
+                            + "\n"
+                            + "用户提问："
+                            + prompt
+                            + "\n"
+                            + "请根据文件内容回答用户问题。\n"
+                            + "如果无法从文件内容中找到答案，请回答“抱歉，我无法从文件内容中找到答案。”"
+                            for prompt in batch_prompts
+                        ]
 
                 # 获得model存放的设备
                 if model_type not in ["llaVa", "llama-guff"]:
@@ -1731,6 +2090,23 @@ class LLM_local:
                                     max_length=max_length,
                                     role="observation",
                                 )
+                elif model_type in ["llama", "Qwen"] and batch_prompts is not None:
+                    # 批量模式下各行互不相关，不写入对话历史，回复以JSON列表返回
+                    if extra_parameters is None:
+                        extra_parameters = {}
+                    responses = llm_chat_batch(
+                        model,
+                        tokenizer,
+                        batch_prompts,
+                        history,
+                        device,
+                        max_length,
+                        temperature=temperature,
+                        batch_size=batch_size,
+                        token_budget=batch_token_budget,
+                        **extra_parameters,
+                    )
+                    response = json.dumps(responses, ensure_ascii=False)
                 elif model_type in ["llama", "Qwen"]:
                     if extra_parameters is not None and extra_parameters != {}:
                         response, history = llm_chat(
@@ -1741,11 +2117,21 @@ class LLM_local:
                             device,
                             max_length,
                             temperature=temperature,
+                            response_cache=response_cache,
+                            session_id=self.prompt_path,
                             **extra_parameters,
                         )
                     else:
                         response, history = llm_chat(
-                            model, tokenizer, user_prompt, history, device, max_length, temperature=temperature
+                            model,
+                            tokenizer,
+                            user_prompt,
+                            history,
+                            device,
+                            max_length,
+                            temperature=temperature,
+                            response_cache=response_cache,
+                            session_id=self.prompt_path,
                         )
                     # 正则表达式匹配
                     pattern = r'\{\s*"tool":\s*"(.*?)",\s*"parameters":\s*\{(.*?)\}\s*\}'
@@ -1768,6 +2154,8 @@ class LLM_local:
                                 device,
                                 max_length,
                                 temperature=temperature,
+                                response_cache=response_cache,
+                                session_id=self.prompt_path,
                                 **extra_parameters,
                             )
                         else:
@@ -1780,6 +2168,8 @@ class LLM_local:
                                 max_length,
                                 role="observation",
                                 temperature=temperature,
+                                response_cache=response_cache,
+                                session_id=self.prompt_path,
                             )
                 elif model_type == "llaVa":
                     if image is not None:
@@ -1844,21 +2234,20 @@ class LLM_local:
                 history_get.extend(history_copy)
                 history_get.extend(history[1:])
                 history = history_get
-                with open(self.prompt_path, "w", encoding="utf-8") as f:
-                    json.dump(history, f, indent=4, ensure_ascii=False)
+                conversation_store.save(self.prompt_path, history)
+                historys = ""
+                # 将history中的消息转换成便于用户阅读的markdown格式
                 for his in history:
                     if his["role"] == "user":
+                        content = his["content"]
                         # 如果his["content"]是个列表，则只保留"type" : "text"时的"text"属性内容
-                        if isinstance(his["content"], list):
-                            for item in his["content"]:
+                        # 这里不能原地修改his，它与对话存储的缓存共享
+                        if isinstance(content, list):
+                            for item in content:
                                 if item.get("type") == "text" and item.get("text"):
-                                    his["content"] = item["text"]
+                                    content = item["text"]
                                     break
-                historys = ""
-                # 将history中的消息转换成便于用户阅读的markdown格式
-                for his in history:
-                    if his["role"] == "user":
-                        historys += f"**User:** {his['content']}\n\n"
+                        historys += f"**User:** {content}\n\n"
                     elif his["role"] == "assistant":
                         historys += f"**Assistant:** {his['content']}\n\n"
                     elif his["role"] == "system":
@@ -1967,6 +2356,7 @@ NODE_CLASS_MAPPINGS = {
     "replace_string": replace_string,
     "KG_neo_toolkit_developer": KG_neo_toolkit_developer,
     "KG_neo_toolkit_user": KG_neo_toolkit_user,
+    "graph_rag_tool": graph_rag_tool,
     "translate_persona": translate_persona,
     "load_excel": load_excel,
     "text_iterator": text_iterator,
@@ -1993,6 +2383,7 @@ NODE_CLASS_MAPPINGS = {
     "bool_logic": bool_logic,
     "duckduckgo_tool":duckduckgo_tool,
     "duckduckgo_loader":duckduckgo_loader,
+    "meta_search_tool": meta_search_tool,
     "flux_persona":flux_persona,
     "clear_file":clear_file,
     "workflow_transfer_v2":workflow_transfer_v2,
@@ -2076,6 +2467,7 @@ if lang == "zh_CN":
         "replace_string": "替换字符串",
         "KG_neo_toolkit_developer": "知识图谱Neo4j工具包开发者版",
         "KG_neo_toolkit_user": "知识图谱Neo4j工具包用户版",
+        "graph_rag_tool": "图谱增强检索工具",
         "translate_persona": "翻译面具",
         "load_excel": "Excel迭代器",
         "text_iterator": "文本迭代器",
@@ -2102,6 +2494,7 @@ if lang == "zh_CN":
         "bool_logic": "布尔逻辑",
         "duckduckgo_tool": "DuckDuckGo工具",
         "duckduckgo_loader": "DuckDuckGo加载器",
+        "meta_search_tool": "多引擎搜索工具",
         "flux_persona":"flux提示词生成器面具",
         "clear_file":"清理文件",
         "workflow_transfer_v2":"工作流中转器V2",
@@ -2179,6 +2572,7 @@ else:
         "replace_string": "Replace String",
         "KG_neo_toolkit_developer": "KG Neo4j Toolkit Developer",
         "KG_neo_toolkit_user": "KG Neo4j Toolkit User",
+        "graph_rag_tool": "GraphRAG Tool",
         "translate_persona": "Translate Persona",
         "load_excel": "Excel Iterator",
         "text_iterator": "Text Iterator",
@@ -2205,6 +2599,7 @@ else:
         "bool_logic": "Boolean Logic",
         "duckduckgo_tool": "DuckDuckGo Tool",
         "duckduckgo_loader":"DuckDuckGo Loader",
+        "meta_search_tool": "Meta Search Tool",
         "flux_persona":"flux prompt word generator",
         "clear_file":"clear file",
         "workflow_transfer_v2": "Workflow Transfer V2",
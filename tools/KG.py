@@ -1,8 +1,10 @@
 import json
 import os
-from collections import deque
+import time
 
 from ..config import current_dir_path
+from .graph_algorithms import PATH_MAX_DEPTH, PATH_TIME_BUDGET, shortest_path
+from .kg_graph import get_graph
 
 file_path = os.path.join(current_dir_path, "KG")
 
@@ -360,199 +362,119 @@ class KG_json_toolkit_user:
 
 
 def Inquire_entities(name):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    out = []
-    for i in data["entities"]:
-        if i["name"] == name:
-            out.append(i)
+    graph = get_graph(KG_path)
+    with graph.lock:
+        out = list(graph.get_entities(name))
     if len(out) == 0:
         out = "该实体节点不存在"
     return str(out)
 
 
 def New_entities(name, attributes=None):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    # 检查实体节点是否已存在
-    for i in data["entities"]:
-        if i["name"] == name:
+    graph = get_graph(KG_path)
+    with graph.lock:
+        # 检查实体节点是否已存在
+        for i in graph.get_entities(name):
             return "该实体节点已存在" + "\n" + "实体节点信息：" + "\n" + str(i)
-    # 添加实体节点
-    if attributes is None:
-        attributes = "{}"
-    data["entities"].append({"name": name, "attributes": json.loads(attributes)})
-    with open(KG_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+        # 添加实体节点
+        if attributes is None:
+            attributes = "{}"
+        graph.add_entity({"name": name, "attributes": json.loads(attributes)})
     return "添加成功"
 
 
 def Modify_entities(name, attributes=None):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    is_exist = False
+    graph = get_graph(KG_path)
     if attributes is None:
         attributes = "{}"
-    # 检查实体节点是否存在
-    for i in data["entities"]:
-        if i["name"] == name:
-            i["attributes"] = json.loads(attributes)
-            is_exist = True
-    if is_exist:
-        with open(KG_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        return "修改成功"
-    else:
-        return "该实体节点不存在"
+    with graph.lock:
+        # 检查实体节点是否存在
+        if graph.get_entities(name) == []:
+            return "该实体节点不存在"
+        graph.set_entity_attributes(name, json.loads(attributes))
+    return "修改成功"
 
 
 def Delete_entities(name):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    is_exist = False
-    # 检查实体节点是否存在
-    for i in data["entities"]:
-        if i["name"] == name:
-            data["entities"].remove(i)
-            is_exist = True
-    if is_exist:
-        with open(KG_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        return "删除成功"
-    else:
-        return "该实体节点不存在"
-
-
-def build_graph(data):
-    graph = {}
-    for rel in data["relationships"]:
-        source, target = rel["source"], rel["target"]
-        if source not in graph:
-            graph[source] = []
-        if target not in graph:
-            graph[target] = []
-        graph[source].append((target, rel))
-        graph[target].append((source, rel))  # 如果关系是双向的
-    return graph
-
-
-def bfs_shortest_path(graph, start, target):
-    visited = set()
-    queue = deque([(start, [])])
-
-    while queue:
-        current, path = queue.popleft()
-        if current == target:
-            return path
-        visited.add(current)
-        for neighbor, relationship in graph.get(current, []):
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.append((neighbor, path + [relationship]))
-    return []
+    graph = get_graph(KG_path)
+    with graph.lock:
+        # 检查实体节点是否存在
+        if graph.get_entities(name) == []:
+            return "该实体节点不存在"
+        graph.remove_entity(name)
+    return "删除成功"
 
 
 def Inquire_relationships(entitie_A, entitie_B):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # 直接关系查询
-    direct_relationships = [
-        rel for rel in data["relationships"] if rel["source"] == entitie_A and rel["target"] == entitie_B
-    ]
-    if direct_relationships:
-        return "两者之间的直接关系为：" + json.dumps(direct_relationships, ensure_ascii=False, indent=4)
-    # 反向查询
-    reverse_relationships = [
-        rel for rel in data["relationships"] if rel["source"] == entitie_B and rel["target"] == entitie_A
-    ]
-    if reverse_relationships:
-        return "两者之间的反向直接关系为：" + json.dumps(reverse_relationships, ensure_ascii=False, indent=4)
-
-    # 构建图并查询最短关系链
-    graph = build_graph(data)
-    shortest_path = bfs_shortest_path(graph, entitie_A, entitie_B)
-    if shortest_path:
-        return "两者之间不存在直接关系，最短关系链为：" + json.dumps(shortest_path, ensure_ascii=False, indent=4)
+    graph = get_graph(KG_path)
+    with graph.lock:
+        # 直接关系查询
+        direct_relationships = graph.get_relationships(entitie_A, entitie_B)
+        if direct_relationships:
+            return "两者之间的直接关系为：" + json.dumps(direct_relationships, ensure_ascii=False, indent=4)
+        # 反向查询
+        reverse_relationships = graph.get_relationships(entitie_B, entitie_A)
+        if reverse_relationships:
+            return "两者之间的反向直接关系为：" + json.dumps(reverse_relationships, ensure_ascii=False, indent=4)
+
+        # 在常驻的邻接表上双向搜索最短关系链
+        deadline = time.monotonic() + PATH_TIME_BUDGET
+        path = shortest_path(graph.neighbors, entitie_A, entitie_B, PATH_MAX_DEPTH, deadline)
+    if path is not None and path[1]:
+        return "两者之间不存在直接关系，最短关系链为：" + json.dumps(path[1], ensure_ascii=False, indent=4)
 
     return "两者之间不存在任何直接或间接关系"
 
 
 def New_relationships(source, target, type, attributes=None):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    # 检查关系边是否已存在
-    for i in data["relationships"]:
-        if i["source"] == source and i["target"] == target:
-            if i["type"] == type:
-                return "该关系边已存在" + "\n" + "关系边信息：" + "\n" + str(i)
-    # 添加关系边
-    if attributes is None:
-        attributes = "{}"
-    data["relationships"].append(
-        {"type": type, "source": source, "target": target, "attributes": json.loads(attributes)}
-    )
-    with open(KG_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    graph = get_graph(KG_path)
+    with graph.lock:
+        # 检查关系边是否已存在
+        for i in graph.get_relationships(source, target, type):
+            return "该关系边已存在" + "\n" + "关系边信息：" + "\n" + str(i)
+        # 添加关系边
+        if attributes is None:
+            attributes = "{}"
+        graph.add_relationship({"type": type, "source": source, "target": target, "attributes": json.loads(attributes)})
     return "添加成功"
 
 
 def Modify_relationships(source, target, type, attributes=None):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    is_exist = False
+    graph = get_graph(KG_path)
     if attributes is None:
         attributes = "{}"
-    # 检查关系边是否存在
-    for i in data["relationships"]:
-        if i["source"] == source and i["target"] == target:
-            if i["type"] == type:
-                i["attributes"] = json.loads(attributes)
-                is_exist = True
-    if is_exist:
-        with open(KG_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-            return "修改成功"
-    else:
-        return "该关系边不存在"
+    with graph.lock:
+        # 检查关系边是否存在
+        if graph.get_relationships(source, target, type) == []:
+            return "该关系边不存在"
+        graph.set_relationship_attributes(source, target, type, json.loads(attributes))
+    return "修改成功"
 
 
 def Delete_relationships(source, target, type):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    # 检查关系边是否存在
-    for i in data["relationships"]:
-        if i["source"] == source and i["target"] == target:
-            if i["type"] == type:
-                data["relationships"].remove(i)
-                with open(KG_path, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
-                    return "删除成功"
-    return "该关系边不存在"
+    graph = get_graph(KG_path)
+    with graph.lock:
+        # 检查关系边是否存在
+        if graph.get_relationships(source, target, type) == []:
+            return "该关系边不存在"
+        graph.remove_relationship(source, target, type)
+    return "删除成功"
 
 
 def Inquire_entity_relationships(name):
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    is_exist = False
-    # 检查实体是否存在
-    for i in data["entities"]:
-        if i["name"] == name:
-            is_exist = True
-            break
-    if is_exist:
+    graph = get_graph(KG_path)
+    with graph.lock:
+        # 检查实体是否存在
+        if graph.get_entities(name) == []:
+            return "实体" + name + "不存在"
         # 查询实体关系
-        relationships = [i for i in data["relationships"] if i["source"] == name or i["target"] == name]
-        return "实体" + name + "的关系边为：" + "\n" + str(relationships)
-    else:
-        return "实体" + name + "不存在"
+        relationships = graph.entity_relationships(name)
+    return "实体" + name + "的关系边为：" + "\n" + str(relationships)
 
 
 def Inquire_entity_list():
-    with open(KG_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    name_list = []
-    # 返回所有实体的name
-    for i in data["entities"]:
-        name_list.append(i["name"])
+    graph = get_graph(KG_path)
+    with graph.lock:
+        # 返回所有实体的name
+        name_list = graph.entity_names()
     return "实体列表为：" + "\n" + str(name_list)
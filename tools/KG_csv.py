@@ -1,11 +1,11 @@
-import csv
 import json
 import os
-from collections import deque
 
 import pandas as pd
 
 from ..config import current_dir_path
+from .graph_algorithms import k_shortest_paths
+from .triple_store import get_store
 
 file_path = os.path.join(current_dir_path, "KG")
 
@@ -187,16 +187,9 @@ class KG_csv_toolkit_user:
 
 
 def generate_graph(entitie_A=None, relationship=None, entitie_B=None):
-    with open(KG_path, "r", encoding="utf8") as fin:
-        reader = csv.reader(fin)
-        for row in reader:
-            if entitie_A and row[0] != entitie_A:
-                continue
-            if relationship and row[1] != relationship:
-                continue
-            if entitie_B and row[2] != entitie_B:
-                continue
-            yield row
+    # 在三元组存储的索引上查找，不再逐行扫描CSV
+    for row in get_store(KG_path).match(entitie_A or None, relationship or None, entitie_B or None):
+        yield list(row)
 
 
 def Inquire_triple(entitie_A, relationship=None, entitie_B=None):
@@ -207,29 +200,23 @@ def Inquire_triple(entitie_A, relationship=None, entitie_B=None):
     :param entitie_B: 实体B
     :return: 返回三元组信息
     """
-    graph = {}
-    for s, p, o in generate_graph(entitie_A, relationship, entitie_B):
-        if s not in graph:
-            graph[s] = []
-        if o not in graph:
-            graph[o] = []
-        graph[s].append((p, o))
-        graph[o].append((p, s))
-
+    store = get_store(KG_path)
     out_list = []
     if relationship is None and entitie_B is None:
-        out_list.extend(graph.get(entitie_A, []))
+        out_list.extend((p, o) for _, p, o in store.match(entitie_A))
     elif relationship is not None and entitie_B is None:
-        out_list.extend([(rel, ent) for rel, ent in graph.get(entitie_A, []) if rel == relationship])
+        out_list.extend((p, o) for _, p, o in store.match(entitie_A, relationship))
     elif relationship is None and entitie_B is not None:
-        if entitie_B in graph.get(entitie_A, []):
-            out_list.extend([(rel, entitie_B) for rel, ent in graph.get(entitie_A, []) if ent == entitie_B])
+        direct = [(p, entitie_B) for _, p, _ in store.match(entitie_A, None, entitie_B)]
+        direct.extend((p, entitie_B) for _, p, _ in store.match(entitie_B, None, entitie_A))
+        if direct:
+            out_list.extend(direct)
         else:
-            paths = find_paths_BFS(graph, entitie_A, entitie_B)
-            for path in paths:
-                out_list.append(path)
+            paths = k_shortest_paths(store.neighbors, entitie_A, entitie_B)
+            for nodes, _ in paths:
+                out_list.append(nodes)
     else:
-        if entitie_B in graph.get(entitie_A, []) and (relationship, entitie_B) in graph.get(entitie_A, []):
+        if store.match(entitie_A, relationship, entitie_B):
             out_list.append((relationship, entitie_B))
 
     if out_list:
@@ -240,29 +227,6 @@ def Inquire_triple(entitie_A, relationship=None, entitie_B=None):
         return "查询不到任何相关的三元组"
 
 
-def find_paths_BFS(graph, start, goal):
-    """
-    使用广度优先搜索找到所有从start到goal的路径
-    :param graph: 知识图谱的图表示
-    :param start: 起始实体
-    :param goal: 目标实体
-    :return: 所有可能的路径列表
-    """
-    queue = deque([[start]])
-    paths = []
-    while queue:
-        path = queue.popleft()
-        node = path[-1]
-        if node == goal:
-            paths.append(path)
-            continue
-        for _, neighbour in graph.get(node, []):
-            new_path = list(path)
-            new_path.append(neighbour)
-            queue.append(new_path)
-    return paths
-
-
 def New_triple(entitie_A, relationship, entitie_B):
     """
     用于添加一个不存在的三元组，返回添加后的知识图谱
@@ -271,10 +235,8 @@ def New_triple(entitie_A, relationship, entitie_B):
     :param entitie_B: 实体B
     :return: 返回添加是否成功
     """
-    with open(KG_path, "a", encoding="utf8") as fin:
-        writer = csv.writer(fin)
-        writer.writerow([entitie_A, relationship, entitie_B])
-        return "添加成功"
+    get_store(KG_path).append_csv(entitie_A, relationship, entitie_B)
+    return "添加成功"
 
 
 def Delete_triple(entitie_A, relationship, entitie_B):
@@ -283,17 +245,8 @@ def Delete_triple(entitie_A, relationship, entitie_B):
     :param entitie_A: 实体A
     :param relationship: 关系
     :param entitie_B: 实体B
-    :param chunk_size: 每次读取的行数
     :return: 返回删除是否成功
     """
-    temp_path = KG_path + ".tmp"
-    with open(KG_path, "r", encoding="utf8") as fin, open(temp_path, "w", encoding="utf8", newline="") as fout:
-        reader = csv.reader(fin)
-        writer = csv.writer(fout)
-        for row in reader:
-            if row[0] != entitie_A or row[1] != relationship or row[2] != entitie_B:
-                writer.writerow(row)
-
-    # 替换原文件
-    os.replace(temp_path, KG_path)
+    # 只在存储中标记删除，CSV稍后整体导出一次
+    get_store(KG_path).remove(entitie_A, relationship, entitie_B)
     return "删除成功"
@@ -1,11 +1,168 @@
+import atexit
+import collections
 import json
+import threading
+import time
 
 from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError
 
 database_url_hold = "bolt://localhost:7687"
 database_name_hold = "neo4j"
 password_hold = "12345678"
 
+# 连接池的参数，同一个(url, 用户名)在进程内只创建一个driver
+NEO4J_MAX_POOL_SIZE = 50
+NEO4J_CONNECTION_TIMEOUT = 15
+NEO4J_ACQUISITION_TIMEOUT = 60
+NEO4J_MAX_CONNECTION_LIFETIME = 3600
+# 读查询结果的缓存时间（秒）和最多缓存的条数，工具包自己的写操作会清空缓存
+NEO4J_CACHE_TTL = 60
+NEO4J_CACHE_SIZE = 1024
+# 实体列表每页的条数，以及每次从服务器拉取的记录数
+NEO4J_PAGE_SIZE = 200
+NEO4J_FETCH_SIZE = 1000
+
+drivers = {}
+drivers_lock = threading.Lock()
+
+
+def get_driver(url=None, user=None, password=None):
+    """获取共享的driver，密码变化时重新创建。"""
+    url = url or database_url_hold
+    user = user or database_name_hold
+    password = password or password_hold
+    with drivers_lock:
+        entry = drivers.get((url, user))
+        if entry is not None and entry[1] == password:
+            return entry[0]
+        if entry is not None:
+            entry[0].close()
+        driver = GraphDatabase.driver(
+            url,
+            auth=(user, password),
+            max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+            connection_timeout=NEO4J_CONNECTION_TIMEOUT,
+            connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+            max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+        )
+        drivers[(url, user)] = (driver, password)
+        return driver
+
+
+@atexit.register
+def close_drivers():
+    with drivers_lock:
+        for driver, _ in drivers.values():
+            driver.close()
+        drivers.clear()
+
+
+def read_transaction(work):
+    # 在一个托管的读事务中执行work(tx)，连接断开等临时错误由driver自动重试
+    with get_driver().session(fetch_size=NEO4J_FETCH_SIZE) as session:
+        return session.execute_read(work)
+
+
+def write_transaction(work):
+    try:
+        with get_driver().session() as session:
+            return session.execute_write(work)
+    finally:
+        read_cache.clear()
+
+
+class ReadCache:
+    """读查询结果的TTL缓存，按最久未使用的顺序淘汰。"""
+
+    def __init__(self, ttl=NEO4J_CACHE_TTL, max_size=NEO4J_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() > entry[0]:
+                self.entries.pop(key, None)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+read_cache = ReadCache()
+
+
+def cached_read(key, work):
+    # 相同数据库上相同的读查询在TTL内直接返回缓存的结果
+    key = (database_url_hold, database_name_hold) + key
+    value = read_cache.get(key)
+    if value is None:
+        value = read_transaction(work)
+        read_cache.set(key, value)
+    return value
+
+
+bootstrapped = set()
+
+
+def label_entities(session):
+    # 给已有的实体补上Entity标签，分批提交，避免一个巨大的事务
+    try:
+        session.run(
+            "MATCH (n) WHERE n.name IS NOT NULL AND NOT n:Entity "
+            "CALL { WITH n SET n:Entity } IN TRANSACTIONS OF 10000 ROWS"
+        ).consume()
+        return
+    except Neo4jError:
+        pass
+    # 不支持CALL {} IN TRANSACTIONS的服务器，每个自动提交的查询标记一批，直到没有未标记的实体
+    while True:
+        count = session.run(
+            "MATCH (n) WHERE n.name IS NOT NULL AND NOT n:Entity "
+            "WITH n LIMIT 10000 SET n:Entity RETURN count(n) AS count"
+        ).single()["count"]
+        if count == 0:
+            return
+
+
+def ensure_schema():
+    """给实体节点加上Entity标签，并在Entity.name上建立唯一约束或索引，每个数据库只执行一次。
+
+    所有查询都只匹配Entity标签的节点，标签补不上时已有的实体会查不到，所以这一步失败时抛出异常，
+    让节点报错；约束和索引只影响速度，建立失败时只打印提示。
+    """
+    key = (database_url_hold, database_name_hold)
+    if key in bootstrapped:
+        return
+    with get_driver().session() as session:
+        try:
+            label_entities(session)
+        except Neo4jError as e:
+            raise RuntimeError(f"无法给已有的实体节点加上Entity标签，这些节点将无法被查询和修改：{e}") from e
+        try:
+            try:
+                session.run("CREATE CONSTRAINT entity_name IF NOT EXISTS FOR (n:Entity) REQUIRE n.name IS UNIQUE").consume()
+            except Neo4jError:
+                # 已有重名的实体时无法建立唯一约束，退而建立普通索引
+                session.run("CREATE INDEX entity_name_index IF NOT EXISTS FOR (n:Entity) ON (n.name)").consume()
+        except Neo4jError as e:
+            print(f"Neo4j索引初始化失败，查询会变慢：{e}")
+    bootstrapped.add(key)
+    read_cache.clear()
+
 
 class KG_neo_toolkit_developer:
     @classmethod
@@ -36,6 +193,7 @@ class KG_neo_toolkit_developer:
         database_url_hold = database_url
         database_name_hold = database_name
         password_hold = password
+        ensure_schema()
         output = [
             {
                 "type": "function",
@@ -238,14 +396,71 @@ class KG_neo_toolkit_developer:
                 "type": "function",
                 "function": {
                     "name": "Inquire_entity_list_neo4j",
-                    "description": "用于查询所有实体节点name",
+                    "description": "用于分页查询所有实体节点name，返回结果中包含总页数",
                     "parameters": {
                         "type": "object",
-                        "properties": {},
+                        "properties": {
+                            "page": {
+                                "type": "integer",
+                                "description": "页码，从1开始，缺省时为1",
+                            }
+                        },
                         "required": [],
                     },
                 },
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "New_entities_batch_neo4j",
+                    "description": "用于一次新增或更新多个实体节点，已存在的实体会合并attributes，需要新增很多实体时请使用这个工具而不是多次调用New_entities_neo4j",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "entities": {
+                                "type": "array",
+                                "description": "实体列表，例如：[{'name': '张三', 'attributes': {'age': 20}}]",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "name": {"type": "string"},
+                                        "attributes": {"type": "object"},
+                                    },
+                                    "required": ["name"],
+                                },
+                            }
+                        },
+                        "required": ["entities"],
+                    },
+                },
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "New_relationships_batch_neo4j",
+                    "description": "用于一次新增或更新多个关系边，已存在的关系边会合并attributes，需要新增很多关系边时请使用这个工具而不是多次调用New_relationships_neo4j",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "relationships": {
+                                "type": "array",
+                                "description": "关系边列表，例如：[{'label': '朋友', 'source': '张三', 'target': '李四', 'attributes': {'起始于': '2010年'}}]",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "label": {"type": "string"},
+                                        "source": {"type": "string"},
+                                        "target": {"type": "string"},
+                                        "attributes": {"type": "object"},
+                                    },
+                                    "required": ["label", "source", "target"],
+                                },
+                            }
+                        },
+                        "required": ["relationships"],
+                    },
+                },
+            },
         ]
         out = json.dumps(output, ensure_ascii=False)
         return (out,)
@@ -278,6 +493,7 @@ class KG_neo_toolkit_user:
         global database_name_hold, password_hold
         database_name_hold = database_name
         password_hold = password
+        ensure_schema()
         output = [
             {
                 "type": "function",
@@ -338,10 +554,15 @@ class KG_neo_toolkit_user:
                 "type": "function",
                 "function": {
                     "name": "Inquire_entity_list_neo4j",
-                    "description": "用于查询所有实体节点name",
+                    "description": "用于分页查询所有实体节点name，返回结果中包含总页数",
                     "parameters": {
                         "type": "object",
-                        "properties": {},
+                        "properties": {
+                            "page": {
+                                "type": "integer",
+                                "description": "页码，从1开始，缺省时为1",
+                            }
+                        },
                         "required": [],
                     },
                 },
@@ -351,140 +572,111 @@ class KG_neo_toolkit_user:
         return (out,)
 
 
+def _label(name):
+    # 实体名或关系名作为标签/类型使用时的转义
+    return "`" + name.replace(" ", "_").replace("`", "``") + "`"
+
+
+def _attributes(attributes):
+    # 模型可能传入JSON字符串，也可能直接传入对象
+    if attributes is None or attributes == "":
+        return {}
+    if isinstance(attributes, str):
+        return json.loads(attributes)
+    return dict(attributes)
+
+
 def Inquire_entities_neo4j(name):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    with driver.session() as session:
-        result = session.run("MATCH (n {name: $name}) RETURN n", name=name)
-        entities = [record["n"] for record in result]
-    driver.close()
+    def work(tx):
+        return [record["n"] for record in tx.run("MATCH (n:Entity {name: $name}) RETURN n", name=name)]
+
+    entities = cached_read(("entities", name), work)
     if not entities:
         return "该实体节点不存在"
     return str(entities)
 
 
 def New_entities_neo4j(name, attributes=None):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    if attributes is None:
-        attributes = {}
-    else:
-        attributes = json.loads(attributes)
-
-    with driver.session() as session:
-        result = session.run("MATCH (n {name: $name}) RETURN n", name=name)
-        if result.single():
-            return "该实体节点已存在"
-
-        # Create the query string with dynamic attributes
-        attr_str = ", ".join([f"{key}: ${key}" for key in attributes.keys()])
-        if attr_str:
-            query = f"CREATE (n:{name.replace(' ', '_')} {{name: $name, {attr_str}}})"
-        else:
-            query = f"CREATE (n:{name.replace(' ', '_')} {{name: $name}})"
-
-        # Run the query with the attributes
-        session.run(query, name=name, **attributes)
-
-    driver.close()
+    attributes = _attributes(attributes)
+
+    def work(tx):
+        # 存在性检查和创建在同一条查询中完成
+        query = """
+            OPTIONAL MATCH (m:Entity {name: $name})
+            WITH count(m) AS existing
+            FOREACH (_ IN CASE WHEN existing = 0 THEN [1] ELSE [] END |
+                CREATE (n:Entity {name: $name}) SET n += $attributes)
+            RETURN existing
+        """
+        return tx.run(query, name=name, attributes=attributes).single()["existing"]
+
+    if write_transaction(work) > 0:
+        return "该实体节点已存在"
     return "添加成功"
 
 
 def Modify_entities_neo4j(name, attributes=None):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-
-    if attributes is None:
-        attributes = {}
-    else:
-        attributes = json.loads(attributes)
-
-    with driver.session() as session:
-        # 创建包含动态属性的查询字符串
-        set_attr_str = ", ".join([f"n.{key} = ${key}" for key in attributes.keys()])
-
-        # 查询所有属性并删除未包含在 attributes 中的属性
-        query = (
-            f"MATCH (n:{name.replace(' ', '_')} {{name: $name}}) SET {set_attr_str} "
-            + " ".join([f"REMOVE n.{key}" for key in attributes.keys() if key not in attributes])
-            + ""
-        )  # 添加闭合的引号
-
-        # 运行查询
-        result = session.run(query, name=name, **attributes)
-        if not result.single():
-            return "该实体节点不存在"
-
-    driver.close()
+    attributes = _attributes(attributes)
+
+    def work(tx):
+        # 用attributes覆盖已有的属性，保留name
+        query = """
+            MATCH (n:Entity {name: $name})
+            SET n = $attributes, n.name = $name
+            RETURN count(n) AS matched
+        """
+        return tx.run(query, name=name, attributes=attributes).single()["matched"]
+
+    if write_transaction(work) == 0:
+        return "该实体节点不存在"
     return "修改成功"
 
 
 def Delete_entities_neo4j(name):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    with driver.session() as session:
-        query = f"MATCH (n:{name.replace(' ', '_')} {{name: $name}}) DETACH DELETE n RETURN n"
-        result = session.run(query, name=name)
-        if not result.single():
-            return "该实体节点不存在"
-    driver.close()
+    def work(tx):
+        query = """
+            MATCH (n:Entity {name: $name})
+            WITH collect(n) AS nodes
+            FOREACH (n IN nodes | DETACH DELETE n)
+            RETURN size(nodes) AS deleted
+        """
+        return tx.run(query, name=name).single()["deleted"]
+
+    if write_transaction(work) == 0:
+        return "该实体节点不存在"
     return "删除成功"
 
 
 def Inquire_relationships_neo4j(entitie_A, entitie_B):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    with driver.session() as session:
-        # Check if entities exist
-        result = session.run(
+    def work(tx):
+        # 两个实体是否存在、正向和反向的直接关系在一次查询中返回
+        record = tx.run(
             """
-            MATCH (a {name: $entitie_A})
-            RETURN a
+            OPTIONAL MATCH (a:Entity {name: $entitie_A})
+            WITH count(a) AS a_count
+            OPTIONAL MATCH (b:Entity {name: $entitie_B})
+            WITH a_count, count(b) AS b_count
+            OPTIONAL MATCH (:Entity {name: $entitie_A})-[r]->(:Entity {name: $entitie_B})
+            WITH a_count, b_count, collect(r) AS direct
+            OPTIONAL MATCH (:Entity {name: $entitie_B})-[r]->(:Entity {name: $entitie_A})
+            RETURN a_count, b_count, direct, collect(r) AS reverse
             """,
             entitie_A=entitie_A,
-        )
-        if not result.single():
-            return f"实体 {entitie_A} 不存在"
-
-        result = session.run(
-            """
-            MATCH (b {name: $entitie_B})
-            RETURN b
-            """,
             entitie_B=entitie_B,
-        )
-        if not result.single():
+        ).single()
+        if record["a_count"] == 0:
+            return f"实体 {entitie_A} 不存在"
+        if record["b_count"] == 0:
             return f"实体 {entitie_B} 不存在"
-
-        # Check direct relationships
-        result = session.run(
-            """
-            MATCH (a {name: $entitie_A})-[r]->(b {name: $entitie_B})
-            RETURN r
-            """,
-            entitie_A=entitie_A,
-            entitie_B=entitie_B,
-        )
-        relationships = [record["r"] for record in result]
-        if relationships:
-            return "两者之间的直接关系为：" + str(relationships)
-
-        result = session.run(
-            """
-            MATCH (b {name: $entitie_B})-[r]->(a {name: $entitie_A})
-            RETURN r
-            """,
-            entitie_A=entitie_A,
-            entitie_B=entitie_B,
-        )
-        reverse_relationships = [record["r"] for record in result]
-        if reverse_relationships:
-            return "两者之间的反向直接关系为：" + str(reverse_relationships)
+        if record["direct"]:
+            return "两者之间的直接关系为：" + str(record["direct"])
+        if record["reverse"]:
+            return "两者之间的反向直接关系为：" + str(record["reverse"])
 
         # Check shortest path
-        result = session.run(
+        result = tx.run(
             """
-            MATCH path = shortestPath((a {name: $entitie_A})-[*]-(b {name: $entitie_B}))
+            MATCH path = shortestPath((a:Entity {name: $entitie_A})-[*]-(b:Entity {name: $entitie_B}))
             RETURN path
             """,
             entitie_A=entitie_A,
@@ -503,174 +695,170 @@ def Inquire_relationships_neo4j(entitie_A, entitie_B):
                     relationships.append(f"{start_node}-[{rel_type}]->{end_node}")
                 path_details.append({"nodes": nodes, "relationships": relationships})
             return "两者之间不存在直接关系，最短关系链为：" + str(path_details)
+        return "两者之间不存在任何直接或间接关系"
 
-    driver.close()
-    return "两者之间不存在任何直接或间接关系"
+    return cached_read(("relationships", entitie_A, entitie_B), work)
 
 
 def New_relationships_neo4j(source, target, label, attributes=None):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    if attributes is None:
-        attributes = {}
-    else:
-        attributes = json.loads(attributes)
-
-    with driver.session() as session:
-        # Check if entities exist
-        result = session.run(
-            """
-            MATCH (a {name: $source})
-            RETURN a
-            """,
-            source=source,
-        )
-        if not result.single():
-            return f"实体 {source} 不存在"
-
-        result = session.run(
-            """
-            MATCH (b {name: $target})
-            RETURN b
-            """,
-            target=target,
-        )
-        if not result.single():
-            return f"实体 {target} 不存在"
-
-        # Check if relationship already exists
-        result = session.run(
-            """
-            MATCH (a {name: $source})-[r:`"""
-            + label.replace(" ", "_")
-            + """`]->(b {name: $target})
-            RETURN r
-            """,
-            source=source,
-            target=target,
-        )
-        if result.single():
-            return "该关系边已存在"
-
-        # Create the query string with dynamic attributes
-        attr_str = ", ".join([f"{key}: ${key}" for key in attributes.keys()])
-        if attr_str:
-            query = f"""
-                MATCH (a {{name: $source}}), (b {{name: $target}})
-                CREATE (a)-[r:`{label.replace(' ', '_')}` {{ {attr_str} }}]->(b)
-            """
-        else:
-            query = f"""
-                MATCH (a {{name: $source}}), (b {{name: $target}})
-                CREATE (a)-[r:`{label.replace(' ', '_')}`]->(b)
-            """
-
-        # Run the query with the attributes
-        session.run(query, source=source, target=target, **attributes)
-
-    driver.close()
+    attributes = _attributes(attributes)
+
+    def work(tx):
+        # 检查两端实体和已有关系边，并在条件满足时创建关系边，只需要一次往返
+        query = f"""
+            OPTIONAL MATCH (a:Entity {{name: $source}})
+            WITH collect(a) AS sources
+            OPTIONAL MATCH (b:Entity {{name: $target}})
+            WITH sources, collect(b) AS targets
+            OPTIONAL MATCH (:Entity {{name: $source}})-[r:{_label(label)}]->(:Entity {{name: $target}})
+            WITH sources, targets, count(r) AS existing
+            FOREACH (_ IN CASE WHEN existing = 0 THEN [1] ELSE [] END |
+                FOREACH (a IN sources |
+                    FOREACH (b IN targets |
+                        CREATE (a)-[r:{_label(label)}]->(b) SET r += $attributes)))
+            RETURN size(sources) AS sources, size(targets) AS targets, existing
+        """
+        return tx.run(query, source=source, target=target, attributes=attributes).single()
+
+    record = write_transaction(work)
+    if record["sources"] == 0:
+        return f"实体 {source} 不存在"
+    if record["targets"] == 0:
+        return f"实体 {target} 不存在"
+    if record["existing"] > 0:
+        return "该关系边已存在"
     return "添加成功"
 
 
 def Modify_relationships_neo4j(source, target, label, attributes=None):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    if attributes is None:
-        attributes = {}
-    else:
-        attributes = json.loads(attributes)
-
-    with driver.session() as session:
-        # Check if entities exist
-        result = session.run(
-            """
-            MATCH (a {name: $source})
-            RETURN a
-            """,
-            source=source,
-        )
-        if not result.single():
-            return f"实体 {source} 不存在"
-
-        result = session.run(
-            """
-            MATCH (b {name: $target})
-            RETURN b
-            """,
-            target=target,
-        )
-        if not result.single():
-            return f"实体 {target} 不存在"
-
-        # Create the query string with dynamic attributes
-        attr_str = ", ".join([f"r.{key} = ${key}" for key in attributes.keys()])
-        if attr_str:
-            query = f"""
-                MATCH (a {{name: $source}})-[r:`{label.replace(' ', '_')}`]->(b {{name: $target}})
-                SET {attr_str}
-                RETURN r
-            """
-        else:
-            query = f"""
-                MATCH (a {{name: $source}})-[r:`{label.replace(' ', '_')}`]->(b {{name: $target}})
-                RETURN r
-            """
-
-        # Run the query with the attributes
-        result = session.run(query, source=source, target=target, **attributes)
-        if not result.single():
-            return "该关系边不存在"
-
-    driver.close()
+    attributes = _attributes(attributes)
+
+    def work(tx):
+        query = f"""
+            OPTIONAL MATCH (a:Entity {{name: $source}})
+            WITH count(a) AS sources
+            OPTIONAL MATCH (b:Entity {{name: $target}})
+            WITH sources, count(b) AS targets
+            OPTIONAL MATCH (:Entity {{name: $source}})-[r:{_label(label)}]->(:Entity {{name: $target}})
+            SET r += $attributes
+            RETURN sources, targets, count(r) AS matched
+        """
+        return tx.run(query, source=source, target=target, attributes=attributes).single()
+
+    record = write_transaction(work)
+    if record["sources"] == 0:
+        return f"实体 {source} 不存在"
+    if record["targets"] == 0:
+        return f"实体 {target} 不存在"
+    if record["matched"] == 0:
+        return "该关系边不存在"
     return "修改成功"
 
 
 def Delete_relationships_neo4j(source, target, label):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    with driver.session() as session:
-        result = session.run(
-            """
-            MATCH (a {name: $source})-[r:`"""
-            + label.replace(" ", "_")
-            + """` {name: $label}]->(b {name: $target})
-            DELETE r
-            RETURN r
-        """,
-            source=source,
-            target=target,
-            label=label,
-        )
-        if not result.single():
-            return "该关系边不存在"
-    driver.close()
+    def work(tx):
+        query = f"""
+            MATCH (:Entity {{name: $source}})-[r:{_label(label)}]->(:Entity {{name: $target}})
+            WITH collect(r) AS rels
+            FOREACH (r IN rels | DELETE r)
+            RETURN size(rels) AS deleted
+        """
+        return tx.run(query, source=source, target=target).single()["deleted"]
+
+    if write_transaction(work) == 0:
+        return "该关系边不存在"
     return "删除成功"
 
 
 def Inquire_entity_relationships_neo4j(name):
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    with driver.session() as session:
-        result = session.run("MATCH (n {name: $name}) RETURN n", name=name)
-        if not result.single():
-            return "实体" + name + "不存在"
-        result = session.run(
+    def work(tx):
+        record = tx.run(
             """
-            MATCH (n {name: $name})-[r]-(m)
-            RETURN r
-        """,
+            OPTIONAL MATCH (n:Entity {name: $name})
+            WITH count(n) AS existing
+            OPTIONAL MATCH (:Entity {name: $name})-[r]-()
+            RETURN existing, collect(r) AS relationships
+            """,
             name=name,
-        )
-        relationships = [record["r"] for record in result]
-    driver.close()
+        ).single()
+        return record["existing"], record["relationships"]
+
+    existing, relationships = cached_read(("entity_relationships", name), work)
+    if existing == 0:
+        return "实体" + name + "不存在"
     return "实体" + name + "的关系边为：" + str(relationships)
 
 
-def Inquire_entity_list_neo4j():
-    global database_url_hold, database_name_hold, password_hold
-    driver = GraphDatabase.driver(database_url_hold, auth=(database_name_hold, password_hold))
-    with driver.session() as session:
-        result = session.run("MATCH (n) RETURN n.name")
-        name_list = [record["n.name"] for record in result]
-    driver.close()
-    return "实体列表为：" + str(name_list)
+def Inquire_entity_list_neo4j(page=1):
+    page = max(int(page), 1)
+
+    def work(tx):
+        # 按name索引的顺序分页，Entity标签的节点总数由计数存储直接给出
+        total = tx.run("MATCH (n:Entity) RETURN count(n) AS total").single()["total"]
+        result = tx.run(
+            "MATCH (n:Entity) WHERE n.name IS NOT NULL RETURN n.name AS name ORDER BY name SKIP $skip LIMIT $limit",
+            skip=(page - 1) * NEO4J_PAGE_SIZE,
+            limit=NEO4J_PAGE_SIZE,
+        )
+        return total, [record["name"] for record in result]
+
+    total, name_list = cached_read(("entity_list", page), work)
+    pages = max((total + NEO4J_PAGE_SIZE - 1) // NEO4J_PAGE_SIZE, 1)
+    return f"实体列表为（第{page}页，共{pages}页）：" + str(name_list)
+
+
+def New_entities_batch_neo4j(entities):
+    """批量新增或更新实体，entities为[{"name": ..., "attributes": {...}}, ...]。"""
+    if isinstance(entities, str):
+        entities = json.loads(entities)
+    rows = [{"name": e["name"], "attributes": _attributes(e.get("attributes"))} for e in entities]
+
+    def work(tx):
+        query = """
+            UNWIND $rows AS row
+            MERGE (n:Entity {name: row.name})
+            SET n += row.attributes
+            RETURN count(n) AS count
+        """
+        return tx.run(query, rows=rows).single()["count"]
+
+    return f"已新增或更新{write_transaction(work)}个实体节点"
+
+
+def _group_by_label(rows, key):
+    # 关系类型不能作为参数传入，按类型分组后每组执行一次UNWIND
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[key], []).append(row)
+    return groups
+
+
+def New_relationships_batch_neo4j(relationships):
+    """批量新增或更新关系边，relationships为[{"label": ..., "source": ..., "target": ..., "attributes": {...}}, ...]。"""
+    if isinstance(relationships, str):
+        relationships = json.loads(relationships)
+    rows = [
+        {
+            "label": r["label"],
+            "source": r["source"],
+            "target": r["target"],
+            "attributes": _attributes(r.get("attributes")),
+        }
+        for r in relationships
+    ]
+
+    def work(tx):
+        count = 0
+        for label, group in _group_by_label(rows, "label").items():
+            query = f"""
+                UNWIND $rows AS row
+                MATCH (a:Entity {{name: row.source}})
+                MATCH (b:Entity {{name: row.target}})
+                MERGE (a)-[r:{_label(label)}]->(b)
+                SET r += row.attributes
+                RETURN count(r) AS count
+            """
+            count += tx.run(query, rows=group).single()["count"]
+        return count
+
+    return f"已新增或更新{write_transaction(work)}条关系边"
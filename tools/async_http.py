@@ -0,0 +1,77 @@
+import asyncio
+import atexit
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+# 共享连接池的参数
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE = 20
+HTTP_TIMEOUT = 10.0
+# 对同一个网站同时进行的请求数和两次请求之间的最短间隔（秒）
+HOST_CONCURRENCY = 2
+HOST_INTERVAL = 0.5
+
+loop = None
+loop_lock = threading.Lock()
+client = None
+
+
+def get_loop():
+    """后台事件循环，所有异步请求都在这个线程中执行，节点和工具线程通过run提交协程。"""
+    global loop
+    with loop_lock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm_party_http", daemon=True).start()
+        return loop
+
+
+def get_client():
+    # 只在后台事件循环中调用，所以不需要加锁
+    global client
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+        )
+    return client
+
+
+class HostLimiter:
+    """按主机名限流，同一个网站最多concurrency个请求同时进行，相邻两次请求至少间隔interval秒。"""
+
+    def __init__(self, concurrency=HOST_CONCURRENCY, interval=HOST_INTERVAL):
+        self.concurrency = concurrency
+        self.interval = interval
+        self.semaphores = {}
+        self.next_start = {}
+
+    async def fetch(self, url, work):
+        # work是返回协程的函数，在拿到该主机的配额之后才调用
+        host = urlsplit(url).netloc.lower()
+        semaphore = self.semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+        async with semaphore:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            return await work()
+
+
+def run(coro):
+    """在后台事件循环中执行协程并等待结果，可以在任意线程中调用。"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+@atexit.register
+def close_client():
+    if client is not None and loop is not None and loop.is_running():
+        try:
+            run(client.aclose())
+        except Exception:
+            pass
@@ -1,24 +1,36 @@
+import asyncio
 import json
 import os
+import re
 
 from bs4 import BeautifulSoup
 import openai
-import requests
 import torch
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from openai import OpenAI
 
 from ..config import config_path, current_dir_path, load_api_keys
+from .async_http import HostLimiter, run
+from .ebd_engine import EmbeddingEngine
+from .ebd_index import chunk_hash, get_index
+from .ebd_registry import embedding_registry
+from .http_cache import cached_get, fetch, log_http_cache_stats
+from .worker_pool import POOL_WORKERS, ordered_map, tasks
 
 bge_embeddings = ""
+# 从注册表中acquire得到的模型，外部传入的ebd_model不由这个节点释放
+acquired_embeddings = None
 files_load = ""
 c_size = 200
 c_overlap = 50
 knowledge_base = ""
 is_jina = True
+# 批量读取网页时本次会话中已经读取的网页和它们的文本块，所有网页共用一个索引
+web_pages = {}
+web_workers = POOL_WORKERS
+openai_embeddings = {}
 
 
 def check_web(url, keyword=None):
@@ -37,18 +49,11 @@ def check_web(url, keyword=None):
         if is_jina:
             url = jina + url
 
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # 确保请求成功
-
-            # 设置响应内容的编码，确保文本不会出现编码问题
-            response.encoding = response.apparent_encoding
+            # 带缓存的请求，非200时抛出异常，编码自动检测
+            response = fetch("jina", url)
             res=response.text
         else:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # 确保请求成功
-
-            # 设置响应内容的编码，确保文本不会出现编码问题
-            response.encoding = response.apparent_encoding
+            response = fetch("web", url)
             # 假设response.text包含你的HTML内容
             soup = BeautifulSoup(response.text, 'html.parser')
 
@@ -72,7 +77,7 @@ def check_web(url, keyword=None):
                 chunk_overlap=c_overlap,
             )
             chunks = text_splitter.split_text(str(response.text))
-            url_base = FAISS.from_texts(chunks, embeddings)
+            url_base = FAISS.from_texts(chunks, EmbeddingEngine(embeddings))
             docs = url_base.similarity_search(keyword, k=5)
             combined_content = "".join(doc.page_content + "\n" for doc in docs)
             return "该网页的相关信息为：" + str(combined_content)
@@ -82,12 +87,90 @@ def check_web(url, keyword=None):
                 chunk_overlap=c_overlap,
             )
             chunks = text_splitter.split_text(str(response.text))
-            url_base = FAISS.from_texts(chunks, bge_embeddings)
+            url_base = FAISS.from_texts(chunks, EmbeddingEngine(bge_embeddings))
             docs = url_base.similarity_search(keyword, k=5)
             combined_content = "".join(doc.page_content + "\n" for doc in docs)
             return "该网页的相关信息为：" + str(combined_content)
-    except requests.RequestException as e:
+    except Exception as e:
         return f"Error: {e}"
+
+
+def split_urls(urls):
+    if isinstance(urls, str):
+        urls = re.split(r"[\s,，]+", urls)
+    return [url.strip() for url in urls if url.strip() != ""]
+
+
+async def fetch_pages(urls, with_jina):
+    # 并发获取所有网页，同一个网站的请求受HostLimiter限制，单个网页失败不影响其他网页
+    limiter = HostLimiter()
+
+    async def fetch_one(url):
+        target = "https://r.jina.ai/" + url if with_jina else url
+        response = await limiter.fetch(url, lambda: cached_get("jina" if with_jina else "web", target))
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code} Error for url: {url}")
+        return response.text
+
+    return await asyncio.gather(*(fetch_one(url) for url in urls), return_exceptions=True)
+
+
+def session_embeddings():
+    # 没有本地词嵌入模型时使用OpenAI的词嵌入，同一组API设置只创建一次，索引才能复用
+    if bge_embeddings != "":
+        return bge_embeddings
+    key = (openai.api_key, str(openai.base_url))
+    if key not in openai_embeddings:
+        openai_embeddings[key] = OpenAIEmbeddings(
+            model="text-embedding-3-small", api_key=openai.api_key, base_url=openai.base_url
+        )
+    return openai_embeddings[key]
+
+
+def check_webs(urls, keyword=None):
+    """
+    批量获取多个网站页面上与关键词相关的文字信息。
+
+    :param urls: 网站的URL列表，也可以是用逗号或换行分隔的字符串。
+    :param keyword: 搜索的关键词。
+    :return: 与关键词相关的文本内容和来源网址。
+    """
+    try:
+        urls = [url for url in split_urls(urls) if url not in web_pages]
+        errors = []
+        if urls != []:
+            pages = run(fetch_pages(urls, is_jina))
+            log_http_cache_stats()
+            fetched = [(url, page) for url, page in zip(urls, pages) if not isinstance(page, BaseException)]
+            errors = [f"{url}: {page}" for url, page in zip(urls, pages) if isinstance(page, BaseException)]
+            if is_jina:
+                texts = [page for _, page in fetched]
+            else:
+                # 解析HTML比较耗CPU，放到进程池中并行执行，解析失败的网页按空文本处理
+                results = ordered_map(tasks.html_to_text, [page for _, page in fetched], web_workers)
+                texts = [text if error is None else "" for _, text, error in results]
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=c_size,
+                chunk_overlap=c_overlap,
+            )
+            for (url, _), text in zip(fetched, texts):
+                web_pages[url] = text_splitter.split_text(text)
+        if keyword is None or keyword == "":
+            return "已读取的网页：" + "、".join(web_pages) + "".join("\n读取失败：" + error for error in errors)
+        sources = {}
+        for url, chunks in web_pages.items():
+            for chunk in chunks:
+                sources.setdefault(chunk_hash(chunk), url)
+        all_chunks = [chunk for chunks in web_pages.values() for chunk in chunks]
+        if all_chunks == []:
+            return "没有读取到网页内容" + "".join("\n读取失败：" + error for error in errors)
+        # 本次会话中的所有网页共用一个增量索引，每个文本块只编码一次
+        index = get_index(session_embeddings(), "check_web_session", c_size, c_overlap)
+        docs = index.update(all_chunks).similarity_search(keyword, k=5)
+        combined_content = "".join(
+            "来源：" + sources.get(chunk_hash(doc.page_content), "") + "\n" + doc.page_content + "\n" for doc in docs
+        )
+        return "这些网页的相关信息为：" + combined_content + "".join("\n读取失败：" + error for error in errors)
     except Exception as e:
         return f"Error: {e}"
 
@@ -122,6 +205,7 @@ class check_web_tool:
                     },
                 ),
                 "ebd_model": ("EBD_MODEL", {"default": None}),
+                "workers": ("INT", {"default": POOL_WORKERS, "min": 1, "max": 64}),
             },
         }
 
@@ -146,23 +230,28 @@ class check_web_tool:
         api_key="sk-XXXXX",
         base_url="https://api.openai.com/v1/",
         ebd_model=None,
+        workers=POOL_WORKERS,
     ):
         if is_enable == False:
             return (None,)
-        global  files_load, bge_embeddings, c_size, c_overlap, knowledge_base, is_jina
+        global  files_load, bge_embeddings, acquired_embeddings, c_size, c_overlap, knowledge_base, is_jina, web_workers
         is_jina = with_jina
+        web_workers = workers
+        # 每次运行节点开始一个新的批量读取会话
+        web_pages.clear()
         c_size = chunk_size
         c_overlap = chunk_overlap
         if device == "auto":
             device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
         if ebd_model is None:
-            model_kwargs = {"device": device}
-            encode_kwargs = {"normalize_embeddings": True}  # 设置为 True 以计算余弦相似度
-            if bge_embeddings == "" and embedding_path is not None and embedding_path != "":
-                bge_embeddings = HuggingFaceBgeEmbeddings(
-                    model_name=embedding_path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
-                )
+            if embedding_path is not None and embedding_path != "":
+                # 与其他词嵌入节点共享同一个模型
+                embeddings = embedding_registry.acquire(embedding_path, device)
+                embedding_registry.release(acquired_embeddings)
+                acquired_embeddings = bge_embeddings = embeddings
         else:
+            embedding_registry.release(acquired_embeddings)
+            acquired_embeddings = None
             bge_embeddings = ebd_model
         if (embedding_path is None or embedding_path == "") and ebd_model is None:
             os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
@@ -228,5 +317,29 @@ class check_web_tool:
                 }
             ]
 
+        output.append(
+            {
+                "type": "function",
+                "function": {
+                    "name": "check_webs",
+                    "description": "同时读取多个网页（例如搜索结果中的多个链接），并在所有已读取的网页中搜索与关键词相关的信息，结果附带来源网址。",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "urls": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "要被读取的网页的URL列表",
+                            },
+                            "keyword": {
+                                "type": "string",
+                                "description": "需要搜索的关键词，如果没有关键词，则只读取网页",
+                            },
+                        },
+                        "required": ["urls"],
+                    },
+                },
+            }
+        )
         out = json.dumps(output, ensure_ascii=False)
         return (out,)
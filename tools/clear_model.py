@@ -4,6 +4,8 @@ import sys
 import requests
 import torch
 
+from .kv_cache import kv_cache_store
+
 
 class AnyType(str):
     """A special class that is always equal in not equal comparisons. Credit to pythongosssss"""
@@ -104,6 +106,8 @@ class clear_model:
             references = find_references(tokenizer)
             print(f"Found {len(references)} references.")
             tokenizer = None
+        # 对话的KV缓存属于被清理的模型，一并释放
+        kv_cache_store.clear()
         # 显式调用垃圾回收
         gc.collect()
         # 回收显存
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+
+# 追加日志的后缀，日志与快照放在同一个temp文件夹中
+LOG_SUFFIX = ".log"
+# 日志累计到这么多行时合并进快照
+COMPACT_THRESHOLD = 200
+
+
+class ConversationStore:
+    """对话历史存储。
+
+    进程内按prompt_path缓存完整的对话历史，每轮对话只把新增的消息以JSONL追加到
+    ``<prompt_path>.log``，日志达到一定长度后再合并进 ``<prompt_path>`` 的JSON快照。
+    快照或日志在外部被删除、修改（mtime或大小变化）时，缓存失效并重新读取。
+    快照的格式与原来的历史记录文件相同，historical_record下拉框仍然可以直接选择它们。
+    """
+
+    def __init__(self, compact_threshold=COMPACT_THRESHOLD):
+        self.compact_threshold = compact_threshold
+        self.cache = {}
+        self.log_lines = {}
+        self.stamps = {}
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        # 返回的列表可以随意增删，但除了第一条system消息外，其余消息对象与缓存共享，调用方不要原地修改
+        with self.lock:
+            history = self._get(path)
+            out = list(history)
+            if out:
+                out[0] = dict(out[0])
+            return out
+
+    def save(self, path, history):
+        with self.lock:
+            cached = self._get(path)
+            records = []
+            if len(history) >= len(cached) and cached[1:] == history[1 : len(cached)]:
+                if history[:1] != cached[:1]:
+                    records.append({"op": "system", "message": history[0]})
+                for message in history[len(cached) :]:
+                    records.append({"op": "append", "message": message})
+            else:
+                # 历史被截断或重置，整个重写
+                records.append({"op": "reset", "messages": history})
+            if not records:
+                return
+            lines = [json.dumps(record, ensure_ascii=False) for record in records]
+            # 缓存中保存一份独立的副本，避免调用方之后修改消息影响缓存
+            for line in lines:
+                self._apply(cached, json.loads(line))
+            if records[-1]["op"] == "reset" or self.log_lines.get(path, 0) + len(lines) >= self.compact_threshold:
+                self._compact(path)
+            else:
+                with open(path + LOG_SUFFIX, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                self.log_lines[path] = self.log_lines.get(path, 0) + len(lines)
+                self.stamps[path] = self._stamp(path)
+
+    def reset(self, path, history):
+        with self.lock:
+            self.cache[path] = json.loads(json.dumps(history, ensure_ascii=False))
+            self._compact(path)
+
+    def _stamp(self, path):
+        # 快照和日志的(mtime, 大小)，文件不存在时为None
+        stamp = []
+        for file in [path, path + LOG_SUFFIX]:
+            try:
+                stat = os.stat(file)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return stamp
+
+    def _get(self, path):
+        if path in self.cache and self.stamps.get(path) == self._stamp(path):
+            return self.cache[path]
+        history = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        lines = 0
+        if os.path.exists(path + LOG_SUFFIX):
+            with open(path + LOG_SUFFIX, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line == "":
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程在写日志时中断，丢弃不完整的最后一行
+                        break
+                    self._apply(history, record)
+                    lines += 1
+        self.cache[path] = history
+        self.log_lines[path] = lines
+        self.stamps[path] = self._stamp(path)
+        if lines >= self.compact_threshold:
+            self._compact(path)
+        return history
+
+    def _apply(self, history, record):
+        if record["op"] == "append":
+            history.append(record["message"])
+        elif record["op"] == "system":
+            if history:
+                history[0] = record["message"]
+            else:
+                history.append(record["message"])
+        elif record["op"] == "reset":
+            history[:] = record["messages"]
+
+    def _compact(self, path):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.cache[path], f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, path)
+        if os.path.exists(path + LOG_SUFFIX):
+            os.remove(path + LOG_SUFFIX)
+        self.log_lines[path] = 0
+        self.stamps[path] = self._stamp(path)
+
+
+def list_records(temp_path):
+    # historical_record下拉框的选项，按最近一次写入（快照或日志）的时间排序，不列出日志文件本身
+    records = []
+    for f in os.listdir(temp_path):
+        if f.endswith(LOG_SUFFIX) or f.endswith(".tmp"):
+            continue
+        full_path = os.path.join(temp_path, f)
+        mtime = os.path.getmtime(full_path)
+        if os.path.exists(full_path + LOG_SUFFIX):
+            mtime = max(mtime, os.path.getmtime(full_path + LOG_SUFFIX))
+        records.append((mtime, f))
+    records.sort(reverse=True)
+    return [f for _, f in records]
+
+
+conversation_store = ConversationStore()
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+current_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+doc_cache_path = os.path.join(current_dir_path, "cache", "documents", "documents.db")
+
+# 压缩后的文本总共最多占用多少字节，超过时按最近使用时间淘汰
+DOC_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+class DocCache:
+    """文件解析结果的持久化缓存。
+
+    键由(绝对路径, mtime, 文件大小, 解析器版本)决定，文件被修改或者解析逻辑变化后自然失效。
+    文本用zlib压缩后保存在SQLite中，总大小超过max_bytes时淘汰最久没有被读取的条目。
+    多个ComfyUI进程可能同时读写同一个缓存，所以使用WAL模式并设置忙等待超时。
+    """
+
+    def __init__(self, path, max_bytes=DOC_CACHE_MAX_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, path TEXT, body BLOB, size INTEGER, used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS docs_used ON docs (used)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT body FROM docs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE docs SET used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key, path, text):
+        body = zlib.compress(text.encode("utf-8"))
+        with self.lock:
+            # 同一个文件的旧版本不会再被命中，直接删除
+            self.conn.execute("DELETE FROM docs WHERE path = ?", (path,))
+            self.conn.execute("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?)", (key, path, body, len(body), time.time()))
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM docs").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in self.conn.execute("SELECT key, size FROM docs ORDER BY used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM docs WHERE key = ?", (old_key,))
+                    total -= size
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM docs")
+            self.conn.commit()
+
+
+doc_cache = None
+doc_cache_pid = None
+doc_cache_lock = threading.Lock()
+
+
+def get_doc_cache():
+    # 每个进程使用自己的SQLite连接
+    global doc_cache, doc_cache_pid
+    with doc_cache_lock:
+        if doc_cache is None or doc_cache_pid != os.getpid():
+            doc_cache = DocCache(doc_cache_path)
+            doc_cache_pid = os.getpid()
+        return doc_cache
+
+
+def document_key(path, version):
+    """文件的缓存键，文件不存在时返回None。"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = json.dumps([os.path.abspath(path), stat.st_mtime_ns, stat.st_size, version])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def cached_text(path, version):
+    """读取path上次的解析结果，没有缓存或缓存不可用时返回None。"""
+    key = document_key(path, version)
+    if key is None:
+        return None
+    try:
+        return get_doc_cache().get(key)
+    except sqlite3.Error as e:
+        print(f"文件缓存不可用：{e}")
+        return None
+
+
+def store_text(path, version, text):
+    key = document_key(path, version)
+    if key is None:
+        return
+    try:
+        get_doc_cache().put(key, os.path.abspath(path), text)
+    except sqlite3.Error as e:
+        print(f"写入文件缓存失败：{e}")
+
+
+def cached_parse(path, version, parse):
+    """读取path的解析结果，没有缓存时调用parse(path)并写入缓存。"""
+    text = cached_text(path, version)
+    if text is not None:
+        return text
+    text = parse(path)
+    store_text(path, version, text)
+    return text
@@ -0,0 +1,190 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+current_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+vector_cache_dir = os.path.join(current_dir_path, "cache", "embeddings")
+
+
+def model_key(embeddings):
+    # 词嵌入模型的标识，模型名称和编码参数不同，得到的向量也不同
+    name = ""
+    for attr in ["model_name", "model"]:
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value != "":
+            name = value
+            break
+    return "|".join(
+        [
+            type(embeddings).__name__,
+            name,
+            str(getattr(embeddings, "encode_kwargs", "")),
+            str(getattr(embeddings, "dimensions", "")),
+        ]
+    )
+
+
+class VectorCache:
+    """某个词嵌入模型的向量缓存。
+
+    向量以float32追加写入vectors.f32，读取时通过np.memmap映射，不需要整体载入内存；
+    文本哈希到行号的对应关系保存在同目录的SQLite中。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.conn = sqlite3.connect(os.path.join(path, "keys.db"), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS keys (hash TEXT PRIMARY KEY, row INTEGER)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = row[0] if row is not None else None
+        # 行号从0开始连续分配，用最大行号而不是条目数，重复的键被覆盖时也不会和文件长度错位
+        self.rows = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM keys").fetchone()[0]
+        self.mmap = None
+        self.lock = threading.Lock()
+
+    def _vectors(self):
+        if self.mmap is None or self.mmap.shape[0] < self.rows:
+            self.mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+        return self.mmap
+
+    def get_many(self, hashes):
+        with self.lock:
+            if self.rows == 0 or hashes == []:
+                return {}
+            found = {}
+            for start in range(0, len(hashes), 500):
+                part = hashes[start : start + 500]
+                query = "SELECT hash, row FROM keys WHERE hash IN (" + ",".join("?" * len(part)) + ")"
+                found.update(self.conn.execute(query, part).fetchall())
+            vectors = self._vectors()
+            return {h: np.array(vectors[row]) for h, row in found.items()}
+
+    def put_many(self, hashes, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self.dim,))
+            elif vectors.shape[1] != self.dim:
+                return
+            # 其他线程可能已经写入了相同的文本，只追加还没有的，同一批中重复的哈希只保留一个
+            existing = set()
+            for start in range(0, len(hashes), 500):
+                part = hashes[start : start + 500]
+                query = "SELECT hash FROM keys WHERE hash IN (" + ",".join("?" * len(part)) + ")"
+                existing.update(h for (h,) in self.conn.execute(query, part).fetchall())
+            keep = {}
+            for i, h in enumerate(hashes):
+                if h not in existing and h not in keep:
+                    keep[h] = i
+            if keep == {}:
+                return
+            hashes = list(keep)
+            vectors = vectors[list(keep.values())]
+            # 截掉上次写入中断时可能残留的不完整数据，保证文件长度与行数一致
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(self.rows * self.dim * 4)
+                f.write(vectors.tobytes())
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO keys VALUES (?, ?)",
+                [(h, self.rows + i) for i, h in enumerate(hashes)],
+            )
+            self.conn.commit()
+            self.rows += len(hashes)
+
+
+vector_caches = {}
+vector_caches_lock = threading.Lock()
+
+
+def get_vector_cache(key):
+    with vector_caches_lock:
+        cache = vector_caches.get(key)
+        if cache is None:
+            cache = VectorCache(os.path.join(vector_cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]))
+            vector_caches[key] = cache
+        return cache
+
+
+# sentence-transformers的多进程编码池，按模型和进程数复用
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(client, workers):
+    with pools_lock:
+        key = (id(client), workers)
+        if key not in pools:
+            pools[key] = (client, client.start_multi_process_pool(target_devices=["cpu"] * workers))
+        return pools[key][1]
+
+
+@atexit.register
+def stop_pools():
+    for client, pool in pools.values():
+        client.stop_multi_process_pool(pool)
+    pools.clear()
+
+
+class EmbeddingEngine(Embeddings):
+    """在BGE或OpenAI词嵌入模型外面包一层，负责批量编码和向量缓存。
+
+    - 相同文本只编码一次，结果按(模型, 文本)的哈希保存在磁盘缓存中，跨节点、跨运行复用；
+    - 本地sentence-transformers模型按batch_size批量编码，在CPU上workers大于1时使用多进程；
+    - OpenAI等远程模型按batch_size分批，最多concurrency个请求同时进行。
+    """
+
+    def __init__(self, base, batch_size=32, workers=1, concurrency=4, use_cache=True):
+        self.base = base
+        self.batch_size = batch_size
+        self.workers = workers
+        self.concurrency = concurrency
+        self.cache = get_vector_cache(model_key(base)) if use_cache else None
+
+    def embed_documents(self, texts):
+        key = model_key(self.base)
+        hashes = [hashlib.sha256((key + "\0" + text).encode("utf-8")).hexdigest() for text in texts]
+        vectors = self.cache.get_many(list(set(hashes))) if self.cache is not None else {}
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in vectors:
+                missing.setdefault(h, text)
+        if missing != {}:
+            new_vectors = self._embed(list(missing.values()))
+            vectors.update(zip(missing.keys(), new_vectors))
+            if self.cache is not None:
+                self.cache.put_many(list(missing.keys()), new_vectors)
+        return [np.asarray(vectors[h], dtype=np.float32).tolist() for h in hashes]
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
+
+    def _embed(self, texts):
+        client = getattr(self.base, "client", None)
+        if hasattr(client, "encode"):
+            # 本地sentence-transformers模型，和HuggingFaceBgeEmbeddings.embed_documents一样去掉换行
+            texts = [text.replace("\n", " ") for text in texts]
+            encode_kwargs = dict(getattr(self.base, "encode_kwargs", {}))
+            encode_kwargs["batch_size"] = self.batch_size
+            if self.workers > 1 and str(client.device) == "cpu" and len(texts) > self.batch_size:
+                pool = get_pool(client, self.workers)
+                normalize = encode_kwargs.get("normalize_embeddings", False)
+                return client.encode_multi_process(
+                    texts, pool, batch_size=self.batch_size, normalize_embeddings=normalize
+                )
+            return client.encode(texts, **encode_kwargs)
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self.base.embed_documents(texts)
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            results = list(executor.map(self.base.embed_documents, batches))
+        return [vector for result in results for vector in result]
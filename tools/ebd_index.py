@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+
+from langchain_community.vectorstores import FAISS
+
+from .ebd_engine import EmbeddingEngine
+
+current_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+index_dir = os.path.join(current_dir_path, "cache", "ebd_index")
+
+
+def chunk_hash(chunk):
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+def embeddings_name(embeddings):
+    # 词嵌入模型的名称，用来区分不同模型建立的索引
+    for attr in ["model_name", "model"]:
+        name = getattr(embeddings, attr, None)
+        if isinstance(name, str) and name != "":
+            return name
+    return type(embeddings).__name__
+
+
+class ChunkIndex:
+    """以文本块的内容哈希作为FAISS文档ID的增量索引。
+
+    update传入最新的全部文本块，只有新增的块会被向量化，已经不存在的块会从索引中删除，
+    没有变化的块保持原样。设置了path时，每次更新后把索引保存到该目录，下次从磁盘恢复。
+    新增的块通过EmbeddingEngine批量编码，其他索引已经编码过的相同文本直接从向量缓存中读取。
+    检索也要通过similarity_search在锁内进行，避免与另一个线程的update同时修改FAISS索引。
+    """
+
+    def __init__(self, embeddings, path=None, batch_size=32, workers=1):
+        self.embeddings = embeddings
+        self.engine = EmbeddingEngine(embeddings, batch_size=batch_size, workers=workers)
+        self.path = path
+        self.base = None
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(os.path.join(path, "index.faiss")):
+            self.base = FAISS.load_local(path, self.engine, allow_dangerous_deserialization=True)
+
+    def hashes(self):
+        if self.base is None:
+            return set()
+        return set(self.base.index_to_docstore_id.values())
+
+    def update(self, chunks):
+        with self.lock:
+            new_chunks = {}
+            for chunk in chunks:
+                new_chunks.setdefault(chunk_hash(chunk), chunk)
+            current = self.hashes()
+            removed = [h for h in current if h not in new_chunks]
+            added = [h for h in new_chunks if h not in current]
+            if removed == [] and added == []:
+                return self
+            print(f"知识库增量更新：新增{len(added)}个文本块，删除{len(removed)}个文本块，复用{len(current) - len(removed)}个文本块")
+            if removed != []:
+                self.base.delete(removed)
+            if added != []:
+                texts = [new_chunks[h] for h in added]
+                if self.base is None:
+                    self.base = FAISS.from_texts(texts, self.engine, ids=added)
+                else:
+                    self.base.add_texts(texts, ids=added)
+            if self.path is not None:
+                os.makedirs(self.path, exist_ok=True)
+                self.base.save_local(self.path)
+            return self
+
+    def similarity_search(self, query, k=4):
+        with self.lock:
+            if self.base is None:
+                return []
+            return self.base.similarity_search(query, k=k)
+
+
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def get_index(embeddings, name, chunk_size, chunk_overlap, path=None, batch_size=32, workers=1, node_id=None):
+    """获取一个增量索引。
+
+    path为空时索引保存在cache/ebd_index下，由模型名称、分块参数、name和node_id共同决定目录，
+    node_id是节点的unique_id，同类型的不同节点各自使用自己的索引，不会互相覆盖。
+    同一个目录在进程内只会加载一次。batch_size和workers是编码新增文本块时的批大小和CPU进程数。
+    """
+    if path is None or path == "":
+        key = "|".join([embeddings_name(embeddings), str(chunk_size), str(chunk_overlap), name])
+        if node_id is not None:
+            key += "|" + str(node_id)
+        path = os.path.join(index_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+    path = os.path.abspath(path)
+    with indexes_lock:
+        index = indexes.get(path)
+        if index is None or index.embeddings is not embeddings:
+            index = ChunkIndex(embeddings, path, batch_size, workers)
+            indexes[path] = index
+        index.engine.batch_size = batch_size
+        index.engine.workers = workers
+        return index
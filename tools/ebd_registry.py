@@ -0,0 +1,91 @@
+import collections
+import gc
+import threading
+
+import torch
+from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+
+# 没有节点引用的词嵌入模型总共最多占用的内存（字节），超出时按最久未使用的顺序卸载
+EMBEDDING_MEMORY_BUDGET = 4 * 1024**3
+
+
+def resolve_device(device):
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
+    return device
+
+
+def model_size(embeddings):
+    try:
+        return sum(p.numel() * p.element_size() for p in embeddings.client.parameters())
+    except Exception:
+        return 0
+
+
+class EmbeddingRegistry:
+    """进程内共享的词嵌入模型注册表。
+
+    同一个(path, device, normalize)只会加载一次，所有节点拿到的是同一个模型对象。
+    acquire会增加引用计数，节点换用其他模型或不再需要时调用release。引用计数为0的模型
+    仍然保留在内存中以便下次复用，直到所有模型的总大小超过memory_budget才会被卸载。
+    """
+
+    def __init__(self, memory_budget=EMBEDDING_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self.models = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, path, device="auto", normalize=True):
+        key = (path, resolve_device(device), normalize)
+        with self.lock:
+            entry = self.models.get(key)
+            if entry is None:
+                model_kwargs = {"device": key[1]}
+                encode_kwargs = {"normalize_embeddings": normalize}  # 设置为 True 以计算余弦相似度
+                embeddings = HuggingFaceBgeEmbeddings(
+                    model_name=path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
+                )
+                entry = {"embeddings": embeddings, "refs": 0, "size": model_size(embeddings)}
+                self.models[key] = entry
+            entry["refs"] += 1
+            self.models.move_to_end(key)
+            self._evict()
+            return entry["embeddings"]
+
+    def release(self, embeddings):
+        # 释放由acquire得到的模型，其他对象（例如空字符串或None）会被忽略
+        with self.lock:
+            for entry in self.models.values():
+                if entry["embeddings"] is embeddings:
+                    entry["refs"] = max(entry["refs"] - 1, 0)
+                    break
+            self._evict()
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self.models.values())
+        if total <= self.memory_budget:
+            return
+        removed = False
+        for key in list(self.models):
+            if total <= self.memory_budget:
+                break
+            entry = self.models[key]
+            if entry["refs"] == 0:
+                total -= entry["size"]
+                del self.models[key]
+                removed = True
+                print(f"卸载词嵌入模型：{key[0]}（{key[1]}）")
+        if removed:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def stats(self):
+        with self.lock:
+            return [
+                {"path": key[0], "device": key[1], "normalize": key[2], "refs": entry["refs"], "size": entry["size"]}
+                for key, entry in self.models.items()
+            ]
+
+
+embedding_registry = EmbeddingRegistry()
@@ -7,6 +7,9 @@ from comfy.cli_args import args
 from PIL import Image, ImageOps, ImageSequence
 from PIL.PngImagePlugin import PngInfo
 
+from .kg_graph import flush_graphs
+from .triple_store import flush_stores
+
 
 class end_workflow:
     def __init__(self):
@@ -71,6 +74,9 @@ class end_workflow:
             text_results.append({"content": text})
             # 给 all_results添加response元素
             all_results["response"] = text_results
+        # 工作流结束，把知识图谱的预写日志合并进JSON文件，把CSV三元组的删除写回磁盘
+        flush_graphs()
+        flush_stores()
         return {"ui": all_results}
 
 
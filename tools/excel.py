@@ -1,18 +1,15 @@
 import hashlib
 import json
 import os
-import random
 import time
 
 import numpy as np
-import pandas as pd
 import torch
 from PIL import Image, ImageFile, ImageOps, ImageSequence, UnidentifiedImageError
-import signal
-import sys
-def interrupt_handler(signum, frame):
-    print("Process interrupted")
-    sys.exit(0)
+
+from .iterator_source import dump_batch, excel_rows, image_files, json_items, next_batch
+
+
 def pillow(fn, arg):
     prev_value = None
     try:
@@ -27,6 +24,38 @@ def pillow(fn, arg):
         return x
 
 
+def load_image(image_path):
+    # 读取一张图片，多帧图片的所有帧拼成[F,H,W,C]
+    img = pillow(Image.open, image_path)
+
+    output_images = []
+    w, h = None, None
+
+    excluded_formats = ["MPO"]
+
+    for i in ImageSequence.Iterator(img):
+        i = pillow(ImageOps.exif_transpose, i)
+
+        if i.mode == "I":
+            i = i.point(lambda i: i * (1 / 255))
+        image = i.convert("RGB")
+
+        if len(output_images) == 0:
+            w = image.size[0]
+            h = image.size[1]
+
+        if image.size[0] != w or image.size[1] != h:
+            continue
+
+        image = np.array(image).astype(np.float32) / 255.0
+        image = torch.from_numpy(image)[None,]
+        output_images.append(image)
+
+    if len(output_images) > 1 and img.format not in excluded_formats:
+        return torch.cat(output_images, dim=0)
+    return output_images[0]
+
+
 class load_excel:
     def __init__(self):
         self.index = 0
@@ -43,11 +72,13 @@ class load_excel:
                 "load_all": ("BOOLEAN", {"default": False}),
                 "iterator_mode": (["sequential","random","Infinite"], {"default": "sequential"}),
             },
-            "optional": {},
+            "optional": {
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": 10000}),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("file_content",)
+    RETURN_TYPES = ("STRING", "BOOLEAN")
+    RETURN_NAMES = ("file_content", "is_done")
 
     FUNCTION = "file"
 
@@ -55,37 +86,26 @@ class load_excel:
 
     CATEGORY = "大模型派对（llm_party）/加载器（loader）"
 
-    def file(self, path,iterator_mode, is_enable=True, is_reload=False,load_all=False):
+    def file(self, path,iterator_mode, is_enable=True, is_reload=False,load_all=False, batch_size=1):
         if not is_enable:
-            return (None,)
+            return (None, False)
         if load_all:
             # 返回这个表格，以json字符串格式返回
-            df = pd.read_excel(path, header=0)
-            data_list = df.to_dict(orient='records')
+            data_list = excel_rows(path)
             data = json.dumps(data_list, ensure_ascii=False, indent=4)
-            return (data,)
+            return (data, True)
         if self.path != path or is_reload == True:
             self.index = 0  # 重置索引为0，因为我们要从第二行开始读取数据
             self.path = path
-        # 使用pandas读取Excel文件，header=0表示第一行作为列名
-        df = pd.read_excel(self.path, header=0)
-        # 检查是否有足够的行可以读取
-        if self.index >= len(df):
-            self.index = 0
-            if iterator_mode == "sequential":
-                signal.signal(signal.SIGINT, interrupt_handler)
-                signal.raise_signal(signal.SIGINT)  # 直接中断进程
-        # 读取第self.index行的数据
-        data_row = df.iloc[self.index]
-        # 将Series对象转换为字典
-        data_dict = data_row.to_dict()
-        # 返回JSON格式的数据
-        data = json.dumps(data_dict, ensure_ascii=False,indent=4)
-        if iterator_mode == "sequential" or iterator_mode =="Infinite":
-            self.index += 1
-        elif iterator_mode == "random":
-            self.index = random.randint(0, len(df) - 1)
-        return (data,)
+        # 表格只在文件变化时重新读取，header=0表示第一行作为列名
+        rows = excel_rows(self.path)
+        # 一次读取batch_size行，读完最后一行时is_done为True
+        indices, self.index, is_done = next_batch(self.index, len(rows), batch_size, iterator_mode)
+        if indices == []:
+            return (None, True)
+        # 返回JSON格式的数据，batch_size大于1时返回列表
+        data = dump_batch([rows[i] for i in indices], batch_size)
+        return (data, is_done)
 
     @classmethod
     def IS_CHANGED(self, s):
@@ -108,11 +128,13 @@ class image_iterator:
                 "is_reload": ("BOOLEAN", {"default": False}),
                 "iterator_mode": (["sequential","random","Infinite"], {"default": "sequential"}),
             },
-            "optional": {},
+            "optional": {
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": 10000}),
+            },
         }
 
-    RETURN_TYPES = ("IMAGE",)
-    RETURN_NAMES = ("image",)
+    RETURN_TYPES = ("IMAGE", "BOOLEAN")
+    RETURN_NAMES = ("image", "is_done")
 
     FUNCTION = "file"
 
@@ -120,65 +142,39 @@ class image_iterator:
 
     CATEGORY = "大模型派对（llm_party）/加载器（loader）"
 
-    def file(self, folder_path,iterator_mode, is_enable=True, is_reload=False):
+    def file(self, folder_path,iterator_mode, is_enable=True, is_reload=False, batch_size=1):
         if not is_enable:
-            return (None,)
+            return (None, False)
         if self.path != folder_path or is_reload == True:
             self.index = 0  # 重置索引为0，因为我们要从第二行开始读取数据
             self.path = folder_path
-        # 将文件夹里的所有图片按修改时间排序，
-        image_files = sorted(
-            [f for f in os.listdir(folder_path) if f.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".bmp"))],
-        )
-        # 读取第self.index个图片
-        # 如果没有更多的图片可以读取，返回None
-
-        if self.index >= len(image_files):
-            self.index = 0
-            if iterator_mode == "sequential":
-                signal.signal(signal.SIGINT, interrupt_handler)
-                signal.raise_signal(signal.SIGINT)  # 直接中断进程
-
-        image_path = os.path.join(folder_path, image_files[self.index])
-        img = pillow(Image.open, image_path)
-
+        # 将文件夹里的所有图片按文件名排序，文件夹没有变化时不重新列出
+        files = image_files(folder_path)
+        indices, next_index, is_done = next_batch(self.index, len(files), batch_size, iterator_mode)
+        if indices == []:
+            return (None, True)
+        # 尺寸相同的图片拼成[N,H,W,C]的一批，batch_size大于1时多帧图片只取第一帧，保证一张图片对应一项
         output_images = []
-        w, h = None, None
-
-        excluded_formats = ["MPO"]
-
-        for i in ImageSequence.Iterator(img):
-            i = pillow(ImageOps.exif_transpose, i)
-
-            if i.mode == "I":
-                i = i.point(lambda i: i * (1 / 255))
-            image = i.convert("RGB")
-
-            if len(output_images) == 0:
-                w = image.size[0]
-                h = image.size[1]
-
-            if image.size[0] != w or image.size[1] != h:
-                continue
-
-            image = np.array(image).astype(np.float32) / 255.0
-            image = torch.from_numpy(image)[None,]
-            if "A" in i.getbands():
-                mask = np.array(i.getchannel("A")).astype(np.float32) / 255.0
-                mask = 1.0 - torch.from_numpy(mask)
-            else:
-                mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
+        for i in indices:
+            image = load_image(os.path.join(folder_path, files[i]))
+            if batch_size > 1:
+                image = image[:1]
+            if output_images != [] and image.shape[1:] != output_images[0].shape[1:]:
+                if iterator_mode == "random":
+                    print(
+                        f"随机模式的这一批（batch_size={batch_size}）中，图片{files[i]}的尺寸"
+                        f"{image.shape[2]}x{image.shape[1]}与第一张图片的{output_images[0].shape[2]}x"
+                        f"{output_images[0].shape[1]}不同，已跳过"
+                    )
+                    continue
+                # 尺寸不同的图片留到下一次输出
+                next_index = i
+                is_done = False
+                break
             output_images.append(image)
+        self.index = next_index
+        return (torch.cat(output_images, dim=0), is_done)
 
-        if len(output_images) > 1 and img.format not in excluded_formats:
-            output_image = torch.cat(output_images, dim=0)
-        else:
-            output_image = output_images[0]
-        if iterator_mode == "sequential" or iterator_mode =="Infinite":
-            self.index += 1
-        elif iterator_mode == "random":
-            self.index = random.randint(0, len(image_files) - 1)
-        return (output_image,)
     @classmethod
     def IS_CHANGED(self, s):
         self.record = self.index
@@ -202,58 +198,37 @@ class json_iterator:
                 "load_all": ("BOOLEAN", {"default": False}),
                 "iterator_mode": (["sequential","random","Infinite"], {"default": "sequential"}),
             },
-            "optional": {},
+            "optional": {
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": 10000}),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("file_content",)
+    RETURN_TYPES = ("STRING", "BOOLEAN")
+    RETURN_NAMES = ("file_content", "is_done")
 
     FUNCTION = "file"
 
     CATEGORY = "大模型派对（llm_party）/加载器（loader）"
 
-    def file(self, json_str,iterator_mode, is_enable=True, is_reload=False, load_all=False):
+    def file(self, json_str,iterator_mode, is_enable=True, is_reload=False, load_all=False, batch_size=1):
         if not is_enable:
-            return (None,)
+            return (None, False)
         if self.json_str != json_str or is_reload:
             self.index = 0  # 重置索引为0
             self.json_str = json_str
-            self.data = json.loads(self.json_str)
-        
+        # 相同的json_str只解析一次，字典的值列表也只生成一次
+        self.data, items = json_items(self.json_str)
+
         if load_all:
             # 返回整个JSON数据作为字符串
-            return (json.dumps(self.data, ensure_ascii=False, indent=4),)
-        
-        if isinstance(self.data, list):
-            if self.index >= len(self.data):
-                self.index=0
-                if iterator_mode == "sequential":
-                    signal.signal(signal.SIGINT, interrupt_handler)
-                    signal.raise_signal(signal.SIGINT)  # 直接中断进程
-            data_item = self.data[self.index]
-            if iterator_mode == "sequential" or iterator_mode =="Infinite":
-                self.index += 1
-            elif iterator_mode == "random":
-                self.index = random.randint(0, len(self.data) - 1)
-            return (json.dumps(data_item, ensure_ascii=False, indent=4),)
-
-        
-        elif isinstance(self.data, dict):
-            keys = list(self.data.keys())
-            if self.index >= len(keys):
-                self.index=0
-                if iterator_mode == "sequential":
-                    signal.signal(signal.SIGINT, interrupt_handler)
-                    signal.raise_signal(signal.SIGINT)  # 直接中断进程
-            key = keys[self.index]
-            data_item = self.data[key]
-            if iterator_mode == "sequential" or iterator_mode =="Infinite":
-                self.index += 1
-            elif iterator_mode == "random":
-                self.index = random.randint(0, len(self.data) - 1)
-            return (json.dumps(data_item, ensure_ascii=False, indent=4),)
-        
-        return (None,)
+            return (json.dumps(self.data, ensure_ascii=False, indent=4), True)
+
+        if items is None:
+            return (None, True)
+        indices, self.index, is_done = next_batch(self.index, len(items), batch_size, iterator_mode)
+        if indices == []:
+            return (None, True)
+        return (dump_batch([items[i] for i in indices], batch_size), is_done)
 
     @classmethod
     def IS_CHANGED(self, s):
@@ -0,0 +1,121 @@
+import heapq
+import time
+
+# 关系链最多经过多少条边，None表示不限制
+PATH_MAX_DEPTH = 6
+# 最多返回多少条关系链
+PATH_K = 3
+# 单次路径查询最多花费的秒数，超时返回已经找到的结果
+PATH_TIME_BUDGET = 2.0
+
+
+def _expand(neighbors, frontier, parents, other, blocked_nodes, blocked_pairs, deadline):
+    # 把frontier整体向外扩展一层，返回新的frontier和最先遇到的相交节点
+    next_frontier = []
+    for node in frontier:
+        if deadline is not None and time.monotonic() > deadline:
+            return None, None
+        for neighbor, edge in neighbors(node):
+            if neighbor in parents or neighbor in blocked_nodes or (node, neighbor) in blocked_pairs:
+                continue
+            parents[neighbor] = (node, edge)
+            if neighbor in other:
+                return next_frontier, neighbor
+            next_frontier.append(neighbor)
+    return next_frontier, None
+
+
+def shortest_path(
+    neighbors, start, goal, max_depth=PATH_MAX_DEPTH, deadline=None, blocked_nodes=(), blocked_pairs=()
+):
+    """双向广度优先搜索start到goal的最短路径。
+
+    neighbors(node)返回(相邻节点, 边)的可迭代对象，图按无向图处理。两端各自记录父指针，
+    不在队列中复制路径。找到时返回(节点列表, 边列表)，不存在、超过max_depth或超过deadline
+    （time.monotonic()的时间点）时返回None。
+    """
+    if start in blocked_nodes or goal in blocked_nodes:
+        return None
+    if start == goal:
+        return [start], []
+    forward = {start: None}
+    backward = {goal: None}
+    forward_frontier = [start]
+    backward_frontier = [goal]
+    depth = 0
+    meet = None
+    while forward_frontier and backward_frontier:
+        if max_depth is not None and depth >= max_depth:
+            return None
+        # 每次扩展较小的一侧
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_frontier, meet = _expand(
+                neighbors, forward_frontier, forward, backward, blocked_nodes, blocked_pairs, deadline
+            )
+        else:
+            backward_frontier, meet = _expand(
+                neighbors, backward_frontier, backward, forward, blocked_nodes, blocked_pairs, deadline
+            )
+        depth += 1
+        if meet is not None:
+            break
+        if forward_frontier is None or backward_frontier is None:
+            return None
+    if meet is None:
+        return None
+    nodes = [meet]
+    edges = []
+    node = meet
+    while forward[node] is not None:
+        node, edge = forward[node]
+        nodes.insert(0, node)
+        edges.insert(0, edge)
+    node = meet
+    while backward[node] is not None:
+        node, edge = backward[node]
+        nodes.append(node)
+        edges.append(edge)
+    return nodes, edges
+
+
+def k_shortest_paths(neighbors, start, goal, k=PATH_K, max_depth=PATH_MAX_DEPTH, time_budget=PATH_TIME_BUDGET):
+    """按长度从短到长返回最多k条不含环的路径（Yen算法），每条路径为(节点列表, 边列表)。
+
+    超过time_budget秒时停止搜索，返回已经找到的路径。
+    """
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    first = shortest_path(neighbors, start, goal, max_depth, deadline)
+    if first is None:
+        return []
+    found = [first]
+    seen = {tuple(first[0])}
+    candidates = []
+    counter = 0
+    while len(found) < k:
+        nodes, edges = found[-1]
+        for i in range(len(nodes) - 1):
+            if deadline is not None and time.monotonic() > deadline:
+                return found
+            root_nodes = nodes[: i + 1]
+            # 与已找到的路径共用同一段前缀时，禁止走它们在分叉点之后的那条边
+            blocked_pairs = set()
+            for path_nodes, _ in found:
+                if path_nodes[: i + 1] == root_nodes and len(path_nodes) > i + 1:
+                    blocked_pairs.add((path_nodes[i], path_nodes[i + 1]))
+                    blocked_pairs.add((path_nodes[i + 1], path_nodes[i]))
+            remaining = max_depth - i if max_depth is not None else None
+            spur = shortest_path(
+                neighbors, nodes[i], goal, remaining, deadline, set(root_nodes[:-1]), blocked_pairs
+            )
+            if spur is None:
+                continue
+            path = (root_nodes[:-1] + spur[0], edges[:i] + spur[1])
+            key = tuple(path[0])
+            if key not in seen:
+                seen.add(key)
+                counter += 1
+                heapq.heappush(candidates, (len(path[1]), counter, path))
+        if not candidates:
+            break
+        found.append(heapq.heappop(candidates)[2])
+    return found
@@ -0,0 +1,227 @@
+import json
+import os
+
+import numpy as np
+
+from ..config import current_dir_path
+from .ebd_index import get_index
+from .ebd_registry import embedding_registry
+from .kg_graph import get_graph
+from .text_stream import split_chunks
+from .triple_store import get_store
+
+file_path = os.path.join(current_dir_path, "KG")
+
+# 问题中实体名的最短和最长长度
+ENTITY_MIN_LENGTH = 2
+ENTITY_MAX_LENGTH = 32
+# 邻域中最多返回多少条关系
+MAX_FACTS = 60
+
+rag_settings = {}
+rag_embeddings = None
+# 从注册表中acquire得到的模型，外部传入的ebd_model不由这个节点释放
+rag_acquired = None
+
+
+class JsonGraphSource:
+    # JSON知识图谱的实体名索引和邻边
+    def __init__(self, path):
+        self.graph = get_graph(path)
+
+    def has_entity(self, name):
+        return name in self.graph.entities or name in self.graph.adjacency
+
+    def edges(self, name):
+        return [
+            (neighbor, f"{rel['source']} -[{rel['type']}]-> {rel['target']}")
+            for neighbor, rel in self.graph.neighbors(name)
+        ]
+
+
+class CsvGraphSource:
+    # CSV三元组存储的实体名索引和邻边
+    def __init__(self, path):
+        self.store = get_store(path)
+
+    def has_entity(self, name):
+        if name not in self.store.term_ids:
+            return False
+        return bool(self.store.match(s=name) or self.store.match(o=name))
+
+    def edges(self, name):
+        out = [(o, f"{s} -[{p}]-> {o}") for s, p, o in self.store.match(s=name)]
+        out.extend((s, f"{s} -[{p}]-> {o}") for s, p, o in self.store.match(o=name))
+        return out
+
+
+def find_entities(source, question):
+    # 从长到短在问题的子串中查找实体名，已经匹配的部分不再参与更短的匹配
+    covered = [False] * len(question)
+    found = []
+    for length in range(min(ENTITY_MAX_LENGTH, len(question)), ENTITY_MIN_LENGTH - 1, -1):
+        for i in range(len(question) - length + 1):
+            if any(covered[i : i + length]):
+                continue
+            name = question[i : i + length]
+            if source.has_entity(name):
+                found.append(name)
+                for j in range(i, i + length):
+                    covered[j] = True
+    return found
+
+
+def expand_neighborhood(source, seeds, hops):
+    # 从seeds出发按层扩展hops跳，返回邻域内的实体和关系
+    entities = list(seeds)
+    visited = set(seeds)
+    facts = []
+    seen_facts = set()
+    frontier = list(seeds)
+    for _ in range(hops):
+        next_frontier = []
+        for name in frontier:
+            for neighbor, fact in source.edges(name):
+                if fact not in seen_facts and len(facts) < MAX_FACTS:
+                    seen_facts.add(fact)
+                    facts.append(fact)
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    entities.append(neighbor)
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+        if len(facts) >= MAX_FACTS:
+            break
+    return entities, facts
+
+
+def rank_chunks(question, entities, k):
+    # 只在提到邻域实体的文本块中按与问题的相似度排序，没有这样的文本块时退回全文检索
+    index = rag_settings.get("index")
+    chunks = rag_settings.get("chunks", [])
+    if index is None or chunks == []:
+        return []
+    candidates = [chunk for chunk in chunks if any(name in chunk for name in entities)]
+    if candidates == []:
+        return [doc.page_content for doc in index.similarity_search(question, k=k)]
+    # 文本块的向量在建立索引时已经写入向量缓存，这里不会重新编码
+    vectors = np.array(index.engine.embed_documents(candidates), dtype=np.float32)
+    query = np.array(index.engine.embed_query(question), dtype=np.float32)
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-8)
+    order = np.argsort(-scores)[:k]
+    return [candidates[i] for i in order]
+
+
+def graph_rag(question):
+    # 每次查询重新获取图谱，文件在外部被修改时会自动重新加载
+    source = rag_settings["source_type"](rag_settings["path"])
+    entities = find_entities(source, question)
+    neighborhood, facts = expand_neighborhood(source, entities, rag_settings["hops"])
+    chunks = rank_chunks(question, neighborhood, rag_settings["k"])
+    out = ""
+    if entities:
+        out += "问题中提到的实体：" + "、".join(entities) + "\n"
+    if facts:
+        out += "知识图谱中的相关关系：\n" + "\n".join(facts) + "\n"
+    if chunks:
+        out += "文件中的相关信息如下：\n" + "".join(chunk + "\n" for chunk in chunks)
+    if out == "":
+        return "没有找到与问题相关的信息"
+    return out
+
+
+class graph_rag_tool:
+    @classmethod
+    def INPUT_TYPES(s):
+        # 获取file_path文件夹下的所有json和csv文件的文件名
+        paths = [f for f in os.listdir(file_path) if f.endswith(".json") or f.endswith(".csv")]
+        return {
+            "required": {
+                "absolute_path": ("STRING", {"default": ""}),
+                "relative_path": (paths, {"default": "test.json"}),
+                "is_enable": ("BOOLEAN", {"default": True}),
+                "hops": ("INT", {"default": 2, "min": 1, "max": 5}),
+                "k": ("INT", {"default": 5}),
+                "device": (
+                    ["auto", "cuda", "mps", "cpu"],
+                    {"default": ("auto")},
+                ),
+                "chunk_size": ("INT", {"default": 200}),
+                "chunk_overlap": ("INT", {"default": 50}),
+            },
+            "optional": {
+                "file_content": ("STRING", {"forceInput": True}),
+                "embedding_path": ("STRING", {"default": ""}),
+                "ebd_model": ("EBD_MODEL", {"default": None}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("tool",)
+
+    FUNCTION = "file"
+
+    # OUTPUT_NODE = False
+
+    CATEGORY = "大模型派对（llm_party）/工具（tools）"
+
+    def file(
+        self,
+        relative_path,
+        hops,
+        k,
+        device,
+        chunk_size,
+        chunk_overlap,
+        absolute_path="",
+        is_enable=True,
+        file_content="",
+        embedding_path="",
+        ebd_model=None,
+        unique_id=None,
+    ):
+        if is_enable == False:
+            return (None,)
+        global rag_embeddings, rag_acquired
+        path = absolute_path if absolute_path != "" else os.path.join(file_path, relative_path)
+        rag_settings["path"] = path
+        rag_settings["source_type"] = CsvGraphSource if path.endswith(".csv") else JsonGraphSource
+        rag_settings["hops"] = hops
+        rag_settings["k"] = k
+        rag_settings["index"] = None
+        rag_settings["chunks"] = []
+        if ebd_model is not None:
+            embedding_registry.release(rag_acquired)
+            rag_acquired = None
+            rag_embeddings = ebd_model
+        elif embedding_path is not None and embedding_path != "":
+            embeddings = embedding_registry.acquire(embedding_path, device)
+            embedding_registry.release(rag_acquired)
+            rag_acquired = rag_embeddings = embeddings
+        if rag_embeddings is not None and file_content is not None and file_content != "":
+            chunks = split_chunks(file_content, chunk_size, chunk_overlap)
+            index = get_index(rag_embeddings, "graph_rag", chunk_size, chunk_overlap, node_id=unique_id)
+            index.update(chunks)
+            rag_settings["index"] = index
+            rag_settings["chunks"] = chunks
+        output = [
+            {
+                "type": "function",
+                "function": {
+                    "name": "graph_rag",
+                    "description": "一次性检索与问题相关的知识图谱关系和文件内容：识别问题中提到的实体，展开它们在知识图谱中的邻域关系，并返回与问题最相关的文件片段。",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "question": {"type": "string", "description": "用户的问题"},
+                        },
+                        "required": ["question"],
+                    },
+                },
+            }
+        ]
+        out = json.dumps(output, ensure_ascii=False)
+        return (out,)
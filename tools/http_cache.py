@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from email.message import Message
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+from charset_normalizer import from_bytes
+
+from .async_http import get_client, run
+
+current_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+http_cache_path = os.path.join(current_dir_path, "cache", "http", "responses.db")
+
+# 各个来源的缓存有效期（秒），过期后带着ETag/Last-Modified重新验证
+CACHE_TTL = {
+    "google": 24 * 3600,
+    "bing": 24 * 3600,
+    "duckduckgo": 24 * 3600,
+    "jina": 6 * 3600,
+    "web": 3600,
+    "wikipedia": 7 * 24 * 3600,
+}
+DEFAULT_TTL = 3600
+
+
+class FetchError(Exception):
+    pass
+
+
+class CachedResponse:
+    # 与httpx.Response用法相近的响应，正文来自网络或者缓存
+    def __init__(self, status_code, content, headers, from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        # 优先使用Content-Type中的编码，没有时自动检测，与requests的apparent_encoding一致
+        message = Message()
+        message["content-type"] = self.headers.get("content-type", "")
+        charset = message.get_param("charset")
+        if charset is None:
+            best = from_bytes(self.content).best()
+            charset = best.encoding if best is not None else "utf-8"
+        try:
+            return self.content.decode(charset, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HttpCache:
+    """搜索结果和网页正文的磁盘缓存。
+
+    请求按(方法, 规范化的URL和参数)的哈希作为键，正文用zlib压缩后保存在SQLite中。
+    每个来源有自己的有效期，过期的条目带着ETag/Last-Modified发起条件请求，服务器返回304时
+    直接续期；网络出错时退回过期的缓存。
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, source TEXT, url TEXT, headers TEXT,"
+            " body BLOB, etag TEXT, last_modified TEXT, fetched_at REAL)"
+        )
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale": 0, "stored": 0}
+
+    def get(self, key):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT headers, body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+    def put(self, key, source, url, headers, body):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    source,
+                    url,
+                    json.dumps(headers),
+                    zlib.compress(body),
+                    headers.get("etag"),
+                    headers.get("last-modified"),
+                    time.time(),
+                ),
+            )
+            self.conn.commit()
+            self.stats["stored"] += 1
+
+    def touch(self, key):
+        with self.lock:
+            self.conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def summary(self):
+        with self.lock:
+            out = dict(self.stats)
+            rows = self.conn.execute(
+                "SELECT source, COUNT(*), SUM(LENGTH(body)) FROM responses GROUP BY source"
+            ).fetchall()
+        out["sources"] = {source: {"entries": n, "bytes": size} for source, n, size in rows}
+        lookups = out["hits"] + out["revalidated"] + out["misses"]
+        out["hit_rate"] = (out["hits"] + out["revalidated"]) / lookups if lookups else 0.0
+        return out
+
+    def clear(self, source=None):
+        with self.lock:
+            if source is None:
+                self.conn.execute("DELETE FROM responses")
+            else:
+                self.conn.execute("DELETE FROM responses WHERE source = ?", (source,))
+            self.conn.commit()
+
+
+http_cache = None
+http_cache_lock = threading.Lock()
+
+
+def get_http_cache():
+    global http_cache
+    with http_cache_lock:
+        if http_cache is None:
+            http_cache = HttpCache(http_cache_path)
+        return http_cache
+
+
+def request_key(method, url, params=None):
+    # 参数排序、主机名小写、去掉锚点，同一个请求的不同写法得到同一个键
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items())
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(sorted(query)), ""))
+    return hashlib.sha256((method + " " + normalized).encode("utf-8")).hexdigest()
+
+
+async def cached_get(source, url, params=None, headers=None):
+    """带缓存的GET请求，只缓存200的响应。"""
+    cache = get_http_cache()
+    key = request_key("GET", url, params)
+    entry = cache.get(key)
+    request_headers = dict(headers or {})
+    if entry is not None:
+        cached_headers, body, etag, last_modified, fetched_at = entry
+        cached = CachedResponse(200, zlib.decompress(body), json.loads(cached_headers), from_cache=True)
+        if time.time() - fetched_at < CACHE_TTL.get(source, DEFAULT_TTL):
+            cache.count("hits")
+            return cached
+        if etag:
+            request_headers["If-None-Match"] = etag
+        if last_modified:
+            request_headers["If-Modified-Since"] = last_modified
+    try:
+        response = await get_client().get(url, params=params, headers=request_headers)
+    except httpx.HTTPError:
+        if entry is None:
+            raise
+        cache.count("stale")
+        return cached
+    if response.status_code == 304 and entry is not None:
+        cache.touch(key)
+        cache.count("revalidated")
+        return cached
+    if response.status_code != 200 and entry is not None:
+        # 重新验证时服务器出错，保留缓存并返回过期的正文
+        cache.count("stale")
+        return cached
+    cache.count("misses")
+    response_headers = {k.lower(): v for k, v in response.headers.items()}
+    if response.status_code == 200:
+        cache.put(key, source, url, response_headers, response.content)
+    return CachedResponse(response.status_code, response.content, response_headers)
+
+
+def fetch(source, url, params=None, headers=None):
+    # 同步版本，非200的响应抛出FetchError
+    response = run(cached_get(source, url, params, headers))
+    log_http_cache_stats()
+    if response.status_code != 200:
+        raise FetchError(f"{response.status_code} Error for url: {url}")
+    return response
+
+
+def cached_value(source, key, compute):
+    """缓存不是HTTP请求得到的文本（例如wikipedia库的查询结果），过期后重新计算。"""
+    cache = get_http_cache()
+    name = source + ":" + key
+    key = request_key("CALL", name)
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry[4] < CACHE_TTL.get(source, DEFAULT_TTL):
+        cache.count("hits")
+        return zlib.decompress(entry[1]).decode("utf-8")
+    cache.count("misses")
+    value = compute()
+    cache.put(key, source, name, {}, value.encode("utf-8"))
+    log_http_cache_stats()
+    return value
+
+
+def http_cache_stats():
+    # 命中、重新验证、未命中的次数，以及每个来源的条目数和压缩后的字节数
+    return get_http_cache().summary()
+
+
+def log_http_cache_stats():
+    # 每次联网工具调用后打印一行缓存统计
+    stats = http_cache_stats()
+    print(
+        f"网页缓存：命中{stats['hits']}次，重新验证{stats['revalidated']}次，未命中{stats['misses']}次，"
+        f"出错时使用过期缓存{stats['stale']}次，命中率{stats['hit_rate']:.0%}"
+    )
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .load_file import iter_one
+from .text_stream import split_chunks
+
+# 最多同时缓存多少个数据源
+ITERATOR_SOURCE_CACHE = 8
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
+
+
+class SourceCache:
+    """迭代器节点的数据源缓存，表格、文本块和JSON只解析一次，之后节点每一步只移动下标。
+
+    键包含文件的mtime和大小或者内容的哈希，数据变化后自动重新解析；超过max_size个数据源时
+    淘汰最久没有使用的。
+    """
+
+    def __init__(self, max_size=ITERATOR_SOURCE_CACHE):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        value = load()
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+        return value
+
+
+source_cache = SourceCache()
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def excel_rows(path):
+    # 第一行作为列名，每一行转换为字典
+    return source_cache.get(
+        ("excel",) + file_stamp(path),
+        lambda: pd.read_excel(path, header=0).to_dict(orient="records"),
+    )
+
+
+def text_chunks(file_content, chunk_size, chunk_overlap, file_path=""):
+    if file_path != "":
+        key = ("text_file",) + file_stamp(file_path) + (chunk_size, chunk_overlap)
+        return source_cache.get(key, lambda: split_chunks(iter_one(file_path), chunk_size, chunk_overlap))
+    key = ("text", content_hash(file_content), chunk_size, chunk_overlap)
+    return source_cache.get(key, lambda: split_chunks(file_content, chunk_size, chunk_overlap))
+
+
+def json_items(json_str):
+    """返回(解析后的数据, 可迭代的元素列表)，列表按元素迭代，字典按值迭代。"""
+
+    def load():
+        data = json.loads(json_str)
+        if isinstance(data, list):
+            return data, data
+        if isinstance(data, dict):
+            return data, list(data.values())
+        return data, None
+
+    return source_cache.get(("json", content_hash(json_str)), load)
+
+
+def image_files(folder_path):
+    # 文件夹中的图片按文件名排序，文件夹内容变化时mtime改变，重新列出
+    stat = os.stat(folder_path)
+    key = ("images", os.path.abspath(folder_path), stat.st_mtime_ns)
+    return source_cache.get(
+        key,
+        lambda: sorted(f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)),
+    )
+
+
+def next_batch(index, length, batch_size, iterator_mode):
+    """从index开始按iterator_mode取一批下标，返回(下标列表, 下一次的index, is_done)。
+
+    sequential模式取到最后一批时is_done为True，再执行一次时从头开始；Infinite模式首尾相接
+    循环取，random模式随机取，这两种模式的is_done始终为False。
+    """
+    if length == 0:
+        return [], 0, True
+    if iterator_mode == "random":
+        return [random.randrange(length) for _ in range(batch_size)], index, False
+    if iterator_mode == "Infinite":
+        indices = [(index + i) % length for i in range(batch_size)]
+        return indices, (index + batch_size) % length, False
+    if index >= length:
+        index = 0
+    end = min(index + batch_size, length)
+    return list(range(index, end)), end, end >= length
+
+
+def dump_batch(items, batch_size):
+    # batch_size为1时与原来一样输出单个元素，否则输出JSON列表
+    if batch_size == 1:
+        return json.dumps(items[0], ensure_ascii=False, indent=4)
+    return json.dumps(items, ensure_ascii=False, indent=4)
@@ -0,0 +1,260 @@
+import atexit
+import json
+import os
+import threading
+
+# 预写日志的后缀，与图谱文件放在同一个文件夹中
+WAL_SUFFIX = ".wal"
+# 日志累计到这么多条时合并进JSON快照
+WAL_COMPACT_THRESHOLD = 500
+# 有未合并的日志时，最多等待这么多秒就合并一次
+WAL_FLUSH_INTERVAL = 30
+
+
+def fsync_dir(path):
+    # 把文件所在目录的改动（os.replace后的目录项）落盘，Windows上不能打开目录，跳过
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class GraphStore:
+    """加载一次、常驻内存的JSON知识图谱。
+
+    entities按name建立哈希索引，relationships按(source, target, type)建立边索引，
+    adjacency是与增删改保持同步的无向邻接表。文件被外部修改（mtime或大小变化）时自动重新加载。
+
+    修改立即作用于内存，同时以JSONL追加到 ``<path>.wal``，而不是每次重写整个JSON文件。
+    日志达到compact_threshold条、距第一条未合并的日志超过flush_interval秒或者工作流结束时，
+    才把内存中的图谱写回JSON快照并清空日志。每条日志写入后都会fsync，
+    快照先写入临时文件并fsync再原子替换，加载时重放残留的日志，进程崩溃或断电都不会丢失已经返回的修改。
+    """
+
+    def __init__(self, path, compact_threshold=WAL_COMPACT_THRESHOLD, flush_interval=WAL_FLUSH_INTERVAL):
+        self.path = path
+        self.wal_path = path + WAL_SUFFIX
+        self.compact_threshold = compact_threshold
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.stamp = None
+        self.wal_records = 0
+        self.timer = None
+        self.load()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        with self.lock:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # 除entities和relationships以外的字段原样保留
+            self.extra = {k: v for k, v in data.items() if k not in ["entities", "relationships"]}
+            self.entities = {}
+            self.edges = {}
+            self.pairs = {}
+            self.adjacency = {}
+            for entity in data.get("entities", []):
+                self.entities.setdefault(entity["name"], []).append(entity)
+            for rel in data.get("relationships", []):
+                self._index_relationship(rel)
+            self.stamp = self._file_stamp()
+            self.wal_records = self._replay()
+            if self.wal_records >= self.compact_threshold:
+                self.save()
+            elif self.wal_records > 0:
+                self._schedule_flush()
+
+    def _replay(self):
+        if not os.path.exists(self.wal_path):
+            return 0
+        records = 0
+        with open(self.wal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line == "":
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程在写日志时中断，丢弃不完整的最后一行
+                    break
+                self._apply(record)
+                records += 1
+        return records
+
+    def refresh(self):
+        # 文件在外部被修改过时重新加载
+        with self.lock:
+            if self._file_stamp() != self.stamp:
+                self.load()
+
+    def snapshot(self):
+        data = dict(self.extra)
+        data["entities"] = [entity for entities in self.entities.values() for entity in entities]
+        data["relationships"] = [rel for rels in self.edges.values() for rel in rels]
+        return data
+
+    def save(self):
+        # 把内存中的图谱写成JSON快照，并清空已经合并的日志
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            # 快照落盘并替换成功后才删除日志，任何时刻崩溃都能从快照加日志恢复
+            os.replace(temp_path, self.path)
+            fsync_dir(self.path)
+            if os.path.exists(self.wal_path):
+                os.remove(self.wal_path)
+            self.wal_records = 0
+            self.stamp = self._file_stamp()
+
+    def flush(self):
+        with self.lock:
+            if self.wal_records > 0:
+                self.save()
+
+    def _schedule_flush(self):
+        if self.timer is None:
+            self.timer = threading.Timer(self.flush_interval, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _commit(self, record):
+        # 先写日志再修改内存，日志写入失败时内存中的图谱保持不变
+        with self.lock:
+            with open(self.wal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(record)
+            self.wal_records += 1
+            if self.wal_records >= self.compact_threshold:
+                self.save()
+            else:
+                self._schedule_flush()
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "add_entity":
+            self.entities.setdefault(record["entity"]["name"], []).append(record["entity"])
+        elif op == "set_entity":
+            for entity in self.entities.get(record["name"], []):
+                entity["attributes"] = record["attributes"]
+        elif op == "remove_entity":
+            self.entities.pop(record["name"], None)
+        elif op == "add_relationship":
+            self._index_relationship(record["relationship"])
+        elif op == "set_relationship":
+            for rel in self.edges.get((record["source"], record["target"], record["type"]), []):
+                rel["attributes"] = record["attributes"]
+        elif op == "remove_relationship":
+            # 与原来的行为一致，只删除第一条匹配的关系边
+            key = (record["source"], record["target"], record["type"])
+            rels = self.edges.get(key)
+            if rels:
+                rels.pop(0)
+                if rels == []:
+                    self._unindex_relationship(key)
+
+    def _index_relationship(self, rel):
+        key = (rel["source"], rel["target"], rel["type"])
+        rels = self.edges.setdefault(key, [])
+        rels.append(rel)
+        if len(rels) == 1:
+            self.pairs.setdefault(key[:2], []).append(key)
+            self.adjacency.setdefault(key[0], {})[key] = key[1]
+            self.adjacency.setdefault(key[1], {})[key] = key[0]
+
+    def _unindex_relationship(self, key):
+        del self.edges[key]
+        keys = self.pairs[key[:2]]
+        keys.remove(key)
+        if keys == []:
+            del self.pairs[key[:2]]
+        for name in key[:2]:
+            neighbors = self.adjacency.get(name)
+            if neighbors is not None:
+                neighbors.pop(key, None)
+                if neighbors == {}:
+                    del self.adjacency[name]
+
+    def get_entities(self, name):
+        return self.entities.get(name, [])
+
+    def entity_names(self):
+        return list(self.entities)
+
+    def add_entity(self, entity):
+        self._commit({"op": "add_entity", "entity": entity})
+
+    def set_entity_attributes(self, name, attributes):
+        self._commit({"op": "set_entity", "name": name, "attributes": attributes})
+
+    def remove_entity(self, name):
+        self._commit({"op": "remove_entity", "name": name})
+
+    def get_relationships(self, source, target, type=None):
+        if type is not None:
+            return list(self.edges.get((source, target, type), []))
+        return [rel for key in self.pairs.get((source, target), []) for rel in self.edges[key]]
+
+    def add_relationship(self, rel):
+        self._commit({"op": "add_relationship", "relationship": rel})
+
+    def set_relationship_attributes(self, source, target, type, attributes):
+        self._commit({"op": "set_relationship", "source": source, "target": target, "type": type, "attributes": attributes})
+
+    def remove_relationship(self, source, target, type):
+        self._commit({"op": "remove_relationship", "source": source, "target": target, "type": type})
+
+    def entity_relationships(self, name):
+        return [rel for key in self.adjacency.get(name, {}) for rel in self.edges[key]]
+
+    def neighbors(self, name):
+        # 依次给出(相邻实体, 关系边)，关系视为双向
+        for key, neighbor in self.adjacency.get(name, {}).items():
+            for rel in self.edges[key]:
+                yield neighbor, rel
+
+
+graphs = {}
+graphs_lock = threading.Lock()
+
+
+def get_graph(path):
+    """获取path对应的图谱，同一个文件在进程内只加载一次。"""
+    path = os.path.abspath(path)
+    with graphs_lock:
+        graph = graphs.get(path)
+        if graph is None:
+            graph = GraphStore(path)
+            graphs[path] = graph
+            return graph
+    graph.refresh()
+    return graph
+
+
+@atexit.register
+def flush_graphs():
+    # 把所有图谱未合并的日志写回JSON快照，在工作流结束和进程退出时调用
+    with graphs_lock:
+        stores = list(graphs.values())
+    for graph in stores:
+        graph.flush()
@@ -0,0 +1,53 @@
+import collections
+import threading
+
+# 最多为多少个对话保留KV缓存，超出时淘汰最久未使用的
+KV_CACHE_MAX_SESSIONS = 4
+
+
+class KVCacheStore:
+    """按对话保存本地模型上一轮生成结束时的past_key_values。
+
+    每个条目记录模型、缓存对应的token序列和缓存本身。下一轮只要新的输入与缓存的token序列
+    有公共前缀，就把缓存裁剪到公共前缀长度后交给generate，只需要对新增的token做prefill。
+    """
+
+    def __init__(self, max_sessions=KV_CACHE_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.sessions = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id, model, input_ids):
+        # 返回可以复用的past_key_values，没有可复用的缓存时返回None
+        with self.lock:
+            entry = self.sessions.pop(session_id, None)
+        if entry is None:
+            return None
+        model_id, cached_ids, past_key_values = entry
+        if model_id != id(model) or not hasattr(past_key_values, "crop"):
+            return None
+        common = 0
+        for cached_id, input_id in zip(cached_ids, input_ids):
+            if cached_id != input_id:
+                break
+            common += 1
+        # 至少留一个token给模型做前向计算
+        common = min(common, len(input_ids) - 1, past_key_values.get_seq_length())
+        if common <= 0:
+            return None
+        past_key_values.crop(common)
+        return past_key_values
+
+    def put(self, session_id, model, token_ids, past_key_values):
+        with self.lock:
+            self.sessions[session_id] = (id(model), token_ids, past_key_values)
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.sessions.clear()
+
+
+kv_cache_store = KVCacheStore()
@@ -1,11 +1,15 @@
 import json
 
 import torch
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .ebd_index import get_index
+from .ebd_registry import embedding_registry
+from .text_stream import split_chunks
 
 bge_embeddings = ""
+# ebd_tool从注册表中acquire得到的模型，外部传入的ebd_model不由这个节点释放
+acquired_embeddings = None
 files_load = ""
 c_size = 200
 c_overlap = 50
@@ -39,6 +43,11 @@ class ebd_tool:
                 "file_content": ("STRING", {"forceInput": True}),
                 "base_path": ("STRING", {"default": ""}),
                 "ebd_model": ("EBD_MODEL", {"default": None}),
+                "batch_size": ("INT", {"default": 32, "min": 1}),
+                "workers": ("INT", {"default": 1, "min": 1}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             },
         }
 
@@ -51,34 +60,33 @@ class ebd_tool:
 
     CATEGORY = "大模型派对（llm_party）/工具（tools）"
 
-    def file(self, path, k, chunk_size, chunk_overlap, device, file_content="", is_enable="enable", base_path="",ebd_model=None):
+    def file(self, path, k, chunk_size, chunk_overlap, device, file_content="", is_enable="enable", base_path="",ebd_model=None, batch_size=32, workers=1, unique_id=None):
         if is_enable == "disable":
             return (None,)
-        global files_load, bge_embeddings, c_size, c_overlap, knowledge_base, k_setting
+        global files_load, bge_embeddings, acquired_embeddings, c_size, c_overlap, knowledge_base, k_setting
         k_setting = k
         if device == "auto":
             device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
         c_size = chunk_size
         c_overlap = chunk_overlap
         files_load = file_content
-        if bge_embeddings == "":
-            if ebd_model is None:
-                model_kwargs = {"device": device}
-                encode_kwargs = {"normalize_embeddings": True}  # 设置为 True 以计算余弦相似度
-                bge_embeddings = HuggingFaceBgeEmbeddings(
-                    model_name=path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
-                )
-            else:
-                bge_embeddings = ebd_model
+        if ebd_model is None:
+            # 从共享的注册表中获取模型，相同路径和设备的模型在进程内只加载一次
+            embeddings = embedding_registry.acquire(path, device)
+            embedding_registry.release(acquired_embeddings)
+            acquired_embeddings = bge_embeddings = embeddings
+        else:
+            embedding_registry.release(acquired_embeddings)
+            acquired_embeddings = None
+            bge_embeddings = ebd_model
         if base_path != "":
             knowledge_base = FAISS.load_local(base_path, bge_embeddings, allow_dangerous_deserialization=True)
-        elif knowledge_base == "":
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=c_size,
-                chunk_overlap=c_overlap,
-            )
-            chunks = text_splitter.split_text(files_load)
-            knowledge_base = FAISS.from_texts(chunks, bge_embeddings)
+        elif files_load is not None and files_load != "":
+            chunks = split_chunks(files_load, c_size, c_overlap)
+            # 只向量化变化的文本块，文件内容更新后知识库也随之更新
+            knowledge_base = get_index(
+                bge_embeddings, "ebd_tool", c_size, c_overlap, batch_size=batch_size, workers=workers, node_id=unique_id
+            ).update(chunks)
         output = [
             {
                 "type": "function",
@@ -98,6 +106,9 @@ class ebd_tool:
         out = json.dumps(output, ensure_ascii=False)
         return (out,)
 class load_ebd:
+    def __init__(self):
+        self.bge_embeddings = None
+
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -123,20 +134,15 @@ class load_ebd:
     def file(self, path, device, is_enable=True):
         if is_enable == False:
             return (None,)
-        if device == "auto":
-            device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
-
-        model_kwargs = {"device": device}
-        encode_kwargs = {"normalize_embeddings": True}  # 设置为 True 以计算余弦相似度
-        bge_embeddings = HuggingFaceBgeEmbeddings(
-            model_name=path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
-        )
+        bge_embeddings = embedding_registry.acquire(path, device)
+        embedding_registry.release(self.bge_embeddings)
+        self.bge_embeddings = bge_embeddings
         return (bge_embeddings,)
 
 class embeddings_function:
     def __init__(self):
-        self.embeddings = ""
-        self.embeddings_path = ""
+        self.bge_embeddings = None
+        self.acquired = None
 
     @classmethod
     def INPUT_TYPES(s):
@@ -157,6 +163,11 @@ class embeddings_function:
                 "file_content": ("STRING", {"forceInput": True}),
                 "base_path": ("STRING", {"default": ""}),
                 "ebd_model": ("EBD_MODEL", {"default": None}),
+                "batch_size": ("INT", {"default": 32, "min": 1}),
+                "workers": ("INT", {"default": 1, "min": 1}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             },
         }
 
@@ -169,31 +180,31 @@ class embeddings_function:
 
     CATEGORY = "大模型派对（llm_party）/函数（function）"
 
-    def file(self, path, question, k, chunk_size, chunk_overlap, device, file_content="", is_enable=True, base_path="",ebd_model=None):
+    def file(self, path, question, k, chunk_size, chunk_overlap, device, file_content="", is_enable=True, base_path="",ebd_model=None, batch_size=32, workers=1, unique_id=None):
         if is_enable == False:
             return (None,)
         if ebd_model is None:
-            if device == "auto":
-                device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
-
-            if self.embeddings_path != path:
-                model_kwargs = {"device": device}
-                encode_kwargs = {"normalize_embeddings": True}  # 设置为 True 以计算余弦相似度
-                self.bge_embeddings = HuggingFaceBgeEmbeddings(
-                    model_name=path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
-                )
-                self.embeddings_path = path
+            bge_embeddings = embedding_registry.acquire(path, device)
+            embedding_registry.release(self.acquired)
+            self.acquired = self.bge_embeddings = bge_embeddings
         else:
+            # 只释放自己acquire的模型，ebd_model由加载它的节点管理
+            embedding_registry.release(self.acquired)
+            self.acquired = None
             self.bge_embeddings = ebd_model
         if base_path != "":
             base = FAISS.load_local(base_path, self.bge_embeddings, allow_dangerous_deserialization=True)
         else:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-            )
-            chunks = text_splitter.split_text(file_content)
-            base = FAISS.from_texts(chunks, self.bge_embeddings)
+            chunks = split_chunks(file_content, chunk_size, chunk_overlap)
+            base = get_index(
+                self.bge_embeddings,
+                "embeddings_function",
+                chunk_size,
+                chunk_overlap,
+                batch_size=batch_size,
+                workers=workers,
+                node_id=unique_id,
+            ).update(chunks)
         docs = base.similarity_search(question, k=k)
         combined_content = "".join(doc.page_content + "\n\n" for doc in docs)
         output = "文件中的相关信息如下：\n" + combined_content
@@ -202,8 +213,7 @@ class embeddings_function:
 
 class save_ebd_database:
     def __init__(self):
-        self.embeddings = ""
-        self.embeddings_path = ""
+        self.bge_embeddings = None
 
     @classmethod
     def INPUT_TYPES(s):
@@ -220,7 +230,10 @@ class save_ebd_database:
                 "chunk_size": ("INT", {"default": 200}),
                 "chunk_overlap": ("INT", {"default": 50}),
             },
-            "optional": {},
+            "optional": {
+                "batch_size": ("INT", {"default": 32, "min": 1}),
+                "workers": ("INT", {"default": 1, "min": 1}),
+            },
         }
 
     RETURN_TYPES = ()
@@ -232,25 +245,15 @@ class save_ebd_database:
 
     CATEGORY = "大模型派对（llm_party）/函数（function）"
 
-    def file(self, model_path, save_path, file_content, chunk_size, chunk_overlap, device, is_enable=True):
+    def file(self, model_path, save_path, file_content, chunk_size, chunk_overlap, device, is_enable=True, batch_size=32, workers=1):
         if is_enable == False:
             return (None,)
-        if device == "auto":
-            device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
-
-        if self.embeddings_path != model_path:
-            model_kwargs = {"device": device}
-            encode_kwargs = {"normalize_embeddings": True}  # 设置为 True 以计算余弦相似度
-            self.bge_embeddings = HuggingFaceBgeEmbeddings(
-                model_name=model_path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
-            )
-            self.embeddings_path = model_path
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-        )
-        chunks = text_splitter.split_text(file_content)
-        base = FAISS.from_texts(chunks, self.bge_embeddings)
-        # 保存 FAISS 数据库到本地 save_path
-        base.save_local(save_path)
+        bge_embeddings = embedding_registry.acquire(model_path, device)
+        embedding_registry.release(self.bge_embeddings)
+        self.bge_embeddings = bge_embeddings
+        chunks = split_chunks(file_content, chunk_size, chunk_overlap)
+        # save_path中已有的数据库会被增量更新，只向量化新增的文本块，更新后保存到save_path
+        get_index(
+            self.bge_embeddings, "save_ebd_database", chunk_size, chunk_overlap, save_path, batch_size, workers
+        ).update(chunks)
         return ()
@@ -1,93 +1,70 @@
-import json
 import os
 
-import pandas as pd
-from charamel import Detector
-import docx2txt
 import numpy as np
-import openpyxl
-import pandas as pd
-import pdfplumber
-import requests
+import httpx
 import torch
-import xlrd
 from PIL import Image, ImageOps, ImageSequence
 
 from ..config import current_dir_path
+from .doc_cache import cached_parse, cached_text, store_text
+from .http_cache import FetchError, fetch
+from .worker_pool import POOL_WORKERS, ordered_map, tasks
+
+# 解析函数定义在子进程使用的任务模块中，这里的名字保持不变
+iter_one = tasks.iter_one
+parse_file = tasks.parse_file
 
 file_path = os.path.join(current_dir_path, "file")
-programming_languages_extensions = [".py", ".js", ".java", ".c", ".cpp", ".html", ".css", ".sql", ".r", ".swift"]
+# 解析逻辑变化导致输出不同时加一，让旧的缓存失效
+PARSER_VERSION = 1
 
 
 def read_one(path):
-    text = ""
-    if path.endswith(".docx"):
-        text += docx2txt.process(path)
-    elif path.endswith(".md"):
-        with open(path, "r", encoding="utf-8") as f:
-            text += f.read()
-    elif path.endswith(".pdf"):
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text()
-    elif path.endswith(".xlsx"):
-        workbook = openpyxl.load_workbook(path)
-        for sheet in workbook.worksheets:
-            # 检查工作表是否至少有一行数据
-            if sheet.max_row > 1:  # 至少有一行数据（不包括表头）
-                # 获取工作表名称
-                text += f"## {sheet.title} 的内容\n"
-
-                # 获取表头
-                headers = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), None)
-                if headers:
-                    text += "|" + " | ".join([" " if cell is None else str(cell) for cell in headers]) + "|\n"
-                    text += "|" + " | ".join(["---"] * len(headers)) + "|\n"
-                else:
-                    text += "没有找到表头。\n"
-                    continue
-
-                # 获取数据行
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    if any(cell is not None for cell in row):
-                        text += "|" + " | ".join([" " if cell is None else str(cell) for cell in row]) + "|\n"
-                    else:
-                        # 如果整行都是空的，则停止读取当前工作表
-                        break
-    elif path.endswith(".xls"):
-        workbook = xlrd.open_workbook(path)
-        for sheet_index in range(workbook.nsheets):
-            sheet = workbook.sheet_by_index(sheet_index)
-            # 检查工作表是否为空
-            if sheet.nrows > 0:
-                text += f"## {sheet.name} 的内容\n"
-                text += "| " + " | ".join(sheet.row_values(0)) + " |\n"  # 添加表头
-                text += "| " + " | ".join(["---"] * sheet.ncols) + " |\n"  # 添加分隔符
-                for row_num in range(1, sheet.nrows):
-                    text += "| " + " | ".join([str(cell) for cell in sheet.row_values(row_num)]) + " |\n"
-    elif path.endswith(".csv"):
-        # 检测文件编码
-        detector = Detector()
-        with open(path, "rb") as file:
-            content = file.read()
-        encoding = detector.detect(content)
-        df = pd.read_csv(path, encoding=encoding)
-        text += df.to_markdown(index=True)
-    elif path.endswith(".txt"):
-        with open(path, "r", encoding="utf-8") as f:
-            text += f.read()
-    elif path.endswith(".json"):
-        with open(path, "r", encoding="utf-8") as f:
-            text += json.dumps(json.load(f), ensure_ascii=False, indent=4)
-    elif any(path.endswith(extension) for extension in programming_languages_extensions):
-        try:
-            with open(path, "r", encoding="utf-8") as file:
-                text += file.read()
-        except UnicodeDecodeError:
-            with open(path, "r", encoding="latin-1") as file:
-                text += file.read()
+    # 文件没有变化时直接返回上次的解析结果
+    return cached_parse(path, PARSER_VERSION, parse_file)
+
+
+# 单个文件的最长解析时间（秒），0表示不限制
+READ_TIMEOUT = 300
+
+
+def list_files(folder):
+    # 按路径排序，保证每次读取的顺序一致
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        paths.extend(os.path.join(root, file) for file in sorted(files))
+    return paths
+
+
+def iter_files(paths, workers=POOL_WORKERS, timeout=READ_TIMEOUT):
+    """在进程池中并行解析文件，按paths的顺序依次产出(路径, 文本)。
 
-    return text
+    已经缓存的文件在当前进程中直接读取，只有需要解析的文件交给子进程，解析结果由当前进程写入缓存。
+    解析失败或超过timeout秒的文件会打印原因并跳过，不影响其他文件。
+    """
+    paths = list(paths)
+    if len(paths) <= 1:
+        workers = 1
+    hits = set()
+
+    def lookup(path):
+        text = cached_text(path, PARSER_VERSION)
+        if text is not None:
+            hits.add(path)
+        return text
+
+    for path, text, error in ordered_map(parse_file, paths, workers, timeout or None, lookup):
+        if error is not None:
+            print(f"读取文件{path}失败：{type(error).__name__} {error}")
+            continue
+        if path not in hits:
+            store_text(path, PARSER_VERSION, text)
+        yield path, text
+
+
+def read_many(paths, workers=POOL_WORKERS, timeout=READ_TIMEOUT, separator=""):
+    return separator.join(text for _, text in iter_files(paths, workers, timeout))
 
 
 file_path = os.path.join(current_dir_path, "file")
@@ -134,7 +111,10 @@ class load_file_folder:
                 "folder_path": ("STRING", {"default": "C://Users/"}),
                 "is_enable": ("BOOLEAN", {"default": True}),
             },
-            "optional": {},
+            "optional": {
+                "workers": ("INT", {"default": POOL_WORKERS, "min": 1, "max": 64}),
+                "timeout": ("FLOAT", {"default": READ_TIMEOUT, "min": 0, "max": 3600}),
+            },
         }
 
     RETURN_TYPES = ("STRING",)
@@ -146,15 +126,11 @@ class load_file_folder:
 
     CATEGORY = "大模型派对（llm_party）/加载器（loader）"
 
-    def file(self, folder_path, is_enable=True):
+    def file(self, folder_path, is_enable=True, workers=POOL_WORKERS, timeout=READ_TIMEOUT):
         if is_enable == False:
             return (None,)
-        # 获取文件夹中的所有文件，并读取到字符串中
-        out = ""
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                out += read_one(file_path)
+        # 并行读取文件夹中的所有文件，按路径顺序拼接
+        out = read_many(list_files(folder_path), workers, timeout)
         return (out,)
 
 
@@ -189,12 +165,9 @@ class load_url:
             if with_jina:
                 url = jina + url
 
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # 确保请求成功
-
-            # 设置响应内容的编码，确保文本不会出现编码问题
-            response.encoding = response.apparent_encoding
-        except requests.exceptions.RequestException as e:
+            # 带缓存的请求，非200时抛出异常，编码自动检测
+            response = fetch("jina" if with_jina else "web", url)
+        except (FetchError, httpx.HTTPError) as e:
             print(f"请求发生错误: {e}")
             return (None,)
         out = response.text
@@ -282,12 +255,11 @@ class start_workflow:
             file_out += file_content
         if file_path is not None and file_path != "":
             if os.path.isdir(file_path):
-                for path in os.listdir(file_path):
-                    path = os.path.join(file_path, path)
-                    file_out += read_one(path) + "/n/n"
+                paths = [os.path.join(file_path, path) for path in sorted(os.listdir(file_path))]
+                paths = [path for path in paths if os.path.isfile(path)]
+                file_out += "".join(text + "\n\n" for _, text in iter_files(paths))
             else:
-                path = os.path.join(file_path, path)
-                file_out = read_one(path)
+                file_out += read_one(file_path)
         img_out = []
         if image_input1 is not None:
             img_out=image_input1
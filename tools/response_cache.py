@@ -0,0 +1,152 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+current_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cache_path = os.path.join(current_dir_path, "cache", "response_cache.db")
+
+
+class ResponseCache:
+    """LLM回复缓存。
+
+    以请求内容的哈希为键，内存中保留最近使用的memory_size条，其余存放在SQLite中。
+    超过ttl秒的条目视为过期，磁盘上的条目超过disk_size条时删除最久未使用的部分。
+    """
+
+    def __init__(self, path=cache_path, memory_size=1024, disk_size=100000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self.memory = collections.OrderedDict()
+        self.conn = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        return self.conn
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            if key in self.memory:
+                created, value = self.memory[key]
+                if now - created <= self.ttl:
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                del self.memory[key]
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self._remember(key, row[1], row[0])
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        try:
+            value = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            # 含有无法序列化的内容（例如Gemini的protobuf消息），不缓存
+            return
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, value)
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, now, now))
+            self.writes += 1
+            if self.writes % 100 == 0:
+                conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_size,),
+                )
+            conn.commit()
+
+    def _remember(self, key, created, value):
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+response_cache = ResponseCache()
+
+
+def key_value(value):
+    # 图片等对象按内容哈希，str()会带上内存地址，每次都不一样，其他未知类型不能用作缓存键
+    if isinstance(value, (bytes, bytearray)):
+        return hashlib.sha256(value).hexdigest()
+    if hasattr(value, "cpu") and hasattr(value, "numpy"):
+        return image_digest(value)
+    if hasattr(value, "tobytes") and hasattr(value, "mode") and hasattr(value, "size"):
+        # PIL图片
+        return [value.mode, list(value.size), hashlib.sha256(value.tobytes()).hexdigest()]
+    raise TypeError(f"无法用作缓存键的类型：{type(value).__name__}")
+
+
+def make_key(**parts):
+    text = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=key_value)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def image_digest(images):
+    # 图片张量的内容哈希，用作缓存键的一部分
+    if images is None:
+        return None
+    return hashlib.sha256(images.cpu().numpy().tobytes()).hexdigest()
+
+
+def cached_call(mode, temperature, key_parts, history, call):
+    """在call前面加一层回复缓存。
+
+    mode为"enable"时只缓存temperature为0的确定性请求，为"force"时总是缓存，为"disable"时直接调用。
+    call()返回(response, history)，并且只会在传入的history末尾追加消息；命中时把缓存的消息追加到history上。
+    """
+    if mode == "disable" or (mode == "enable" and temperature > 0):
+        return call()
+    try:
+        key = make_key(**key_parts)
+    except (TypeError, ValueError) as e:
+        print(f"请求中含有无法缓存的内容，不使用响应缓存：{e}")
+        return call()
+    cached = response_cache.get(key)
+    if cached is not None:
+        history.extend(cached["messages"])
+        print("响应缓存命中：" + json.dumps(response_cache.stats()))
+        return cached["response"], history
+    print("响应缓存未命中：" + json.dumps(response_cache.stats()))
+    start = len(history)
+    response, history = call()
+    # 只缓存成功的回复，出错时history末尾不会是模型的回复
+    if len(history) > start and history[-1].get("role") in ["assistant", "model"]:
+        response_cache.set(key, {"response": response, "messages": history[start:]})
+    return response, history
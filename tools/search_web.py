@@ -1,9 +1,11 @@
+import asyncio
 import json
 from datetime import date
-
-import requests
+from urllib.parse import urlsplit, urlunsplit
 
 from ..config import config_path, load_api_keys
+from .async_http import run
+from .http_cache import cached_get, log_http_cache_stats
 
 api_keys = load_api_keys(config_path)
 g_api_key = api_keys.get("google_api_key")
@@ -11,64 +13,68 @@ g_CSE_ID = api_keys.get("CSE_ID")
 g_searchType = "web"
 
 
-def search_web(keywords, paper_num=1):
-    if paper_num == "":
-        paper_num = 1
-    today = str(date.today())
-    global g_api_key, g_CSE_ID, g_searchType
-    num_results = 10
-    start = num_results * (int(paper_num) - 1) + 1
-    try:
-        base_url = "https://www.googleapis.com/customsearch/v1"
-        if g_searchType == "image":
-            params = {
-                "key": g_api_key,
-                "cx": g_CSE_ID,  # 替换为你自己的Custom Search Engine ID
-                "num": num_results,
-                "q": keywords if isinstance(keywords, str) else " ".join(keywords),
-                "start": start,
-                "searchType": g_searchType,
-            }
-        else:
-            params = {
-                "key": g_api_key,
-                "cx": g_CSE_ID,  # 替换为你自己的Custom Search Engine ID
-                "num": num_results,
-                "q": keywords if isinstance(keywords, str) else " ".join(keywords),
-                "start": start,
-            }
+class SearchError(Exception):
+    pass
 
-        response = requests.get(base_url, params=params, timeout=10)
-        # 打印HTTP状态码和响应内容以供调试
-        print("Status code:", response.status_code)
-        print("Response body:", response.text)
-
-        data = response.json()
-        all_content = ""
-        if response.status_code == 200:
-            data = response.json()
-            if "items" in data:
-                for item in data["items"]:
-                    keyword = item["snippet"]
-                    url = item["link"]
-                    all_content += "/n/n" + json.dumps({"snippet": keyword, "link": url}, ensure_ascii=False, indent=4)
 
-        else:
-            return f"Error: {response.status_code} - {response.text}"
+def query_text(keywords):
+    return keywords if isinstance(keywords, str) else " ".join(keywords)
 
-    except Exception as e:
-        return f"Exception occurred: {e}"
 
-    print(all_content)
+def format_results(items):
+    return "".join("\n\n" + json.dumps(item, ensure_ascii=False, indent=4) for item in items)
+
+
+def search_result(items):
+    today = str(date.today())
     return (
         "今天的日期是"
         + today
         + "，当前网络的信息和信息来源的网址为：“"
-        + str(all_content)
-        + "”。/n如果以上信息中没有相关信息，你可以改变paper_num，查看下一页的信息。"
+        + format_results(items)
+        + "”。\n如果以上信息中没有相关信息，你可以改变paper_num，查看下一页的信息。"
     )
 
 
+def run_search(coro):
+    # 在共享的连接池上执行一次搜索，返回给模型的文本
+    try:
+        return search_result(run(coro))
+    except SearchError as e:
+        return str(e)
+    except Exception as e:
+        return f"Exception occurred: {e}"
+    finally:
+        log_http_cache_stats()
+
+
+async def google_search(keywords, paper_num, api_key, cse_id, search_type="web"):
+    if paper_num == "":
+        paper_num = 1
+    num_results = 10
+    start = num_results * (int(paper_num) - 1) + 1
+    params = {
+        "key": api_key,
+        "cx": cse_id,  # 替换为你自己的Custom Search Engine ID
+        "num": num_results,
+        "q": query_text(keywords),
+        "start": start,
+    }
+    if search_type == "image":
+        params["searchType"] = search_type
+    response = await cached_get("google", "https://www.googleapis.com/customsearch/v1", params=params)
+    print("Google status code:", response.status_code)
+    if response.status_code != 200:
+        raise SearchError(f"Error: {response.status_code} - {response.text}")
+    data = response.json()
+    return [{"snippet": item["snippet"], "link": item["link"]} for item in data.get("items", [])]
+
+
+def search_web(keywords, paper_num=1):
+    global g_api_key, g_CSE_ID, g_searchType
+    return run_search(google_search(keywords, paper_num, g_api_key, g_CSE_ID, g_searchType))
+
+
 class google_tool:
     @classmethod
     def INPUT_TYPES(s):
@@ -177,56 +183,39 @@ b_api_key = api_keys.get("bing_api_key")
 b_searchType = "web"
 
 
-def search_web_bing(keywords, paper_num):
-    today = str(date.today())
-    global b_api_key, b_searchType
+async def bing_search(keywords, paper_num, api_key, search_type="web"):
+    if paper_num == "":
+        paper_num = 1
     num_results = 10
     start = num_results * (int(paper_num) - 1) + 1
-    try:
-        # 使用必应搜索API的基础URL
-        if b_searchType == "web":
-            base_url = "https://api.bing.microsoft.com/v7.0/search"
-        elif b_searchType == "image":
-            base_url = "https://api.bing.microsoft.com/v7.0/images/search"
-        elif b_searchType == "video":
-            base_url = "https://api.bing.microsoft.com/v7.0/videos/search"
-        elif b_searchType == "news":
-            base_url = "https://api.bing.microsoft.com/v7.0/news/search"
-        headers = {"Ocp-Apim-Subscription-Key": b_api_key}
-        params = {
-            "q": keywords if isinstance(keywords, str) else " ".join(keywords),
-            "count": num_results,
-            "offset": start,
-        }
-
-        response = requests.get(base_url, headers=headers, params=params, timeout=10)
-        # 打印HTTP状态码和响应内容以供调试
-        print("Status code:", response.status_code)
-        print("Response body:", response.text)
-
-        all_content = ""
-        if response.status_code == 200:
-            data = response.json()
-            if "webPages" in data:
-                for item in data["webPages"]["value"]:
-                    snippet = item["snippet"]
-                    url = item["url"]
-                    all_content += "/n/n" + json.dumps({"snippet": snippet, "link": url}, ensure_ascii=False, indent=4)
-
-        else:
-            return f"Error: {response.status_code} - {response.text}"
+    # 使用必应搜索API的基础URL
+    if search_type == "image":
+        base_url = "https://api.bing.microsoft.com/v7.0/images/search"
+    elif search_type == "video":
+        base_url = "https://api.bing.microsoft.com/v7.0/videos/search"
+    elif search_type == "news":
+        base_url = "https://api.bing.microsoft.com/v7.0/news/search"
+    else:
+        base_url = "https://api.bing.microsoft.com/v7.0/search"
+    headers = {"Ocp-Apim-Subscription-Key": api_key}
+    params = {
+        "q": query_text(keywords),
+        "count": num_results,
+        "offset": start,
+    }
+    response = await cached_get("bing", base_url, params=params, headers=headers)
+    print("Bing status code:", response.status_code)
+    if response.status_code != 200:
+        raise SearchError(f"Error: {response.status_code} - {response.text}")
+    data = response.json()
+    if "webPages" not in data:
+        return []
+    return [{"snippet": item["snippet"], "link": item["url"]} for item in data["webPages"]["value"]]
 
-    except Exception as e:
-        return f"Exception occurred: {e}"
 
-    print(all_content)
-    return (
-        "今天的日期是"
-        + today
-        + "，当前网络的信息和信息来源的网址为：“"
-        + str(all_content)
-        + "”。\n如果以上信息中没有相关信息，你可以改变paper_num，查看下一页的信息。"
-    )
+def search_web_bing(keywords, paper_num):
+    global b_api_key, b_searchType
+    return run_search(bing_search(keywords, paper_num, b_api_key, b_searchType))
 
 
 # 类定义和方法保持不变，只需将google_tool更名为bing_tool，并更新相关注释
@@ -327,62 +316,36 @@ class bing_loader:
 
 ddg_searchType = "web"
 
-def search_duckduckgo(keywords, paper_num=1):
-    if paper_num == "":
-        paper_num = 1
-    today = str(date.today())
-    global ddg_searchType
-    num_results = 10
-    start = num_results * (int(paper_num) - 1) + 1
-    try:
-        base_url = "https://api.duckduckgo.com/"
-        params = {
-            "q": keywords if isinstance(keywords, str) else " ".join(keywords),
-            "format": "json",
-            "no_redirect": 1,
-            "no_html": 1,
-            "skip_disambig": 1,
-        }
-        if ddg_searchType == "image":
-            params["ia"] = "images"
-        else:
-            params["ia"] = "web"
-
-        response = requests.get(base_url, params=params, timeout=10)
-        print("Status code:", response.status_code)
-        print("Response body:", response.text)
-
-        data = response.json()
-        all_content = ""
-        if response.status_code == 200:
-            if "RelatedTopics" in data:
-                for item in data["RelatedTopics"]:
-                    if "Text" in item and "FirstURL" in item:
-                        keyword = item["Text"]
-                        url = item["FirstURL"]
-                        all_content += "\n\n" + json.dumps({"snippet": keyword, "link": url}, ensure_ascii=False, indent=4)
-            elif "ImageResults" in data:
-                for item in data["ImageResults"]:
-                    if "Title" in item and "Image" in item:
-                        keyword = item["Title"]
-                        url = item["Image"]
-                        all_content += "\n\n" + json.dumps({"snippet": keyword, "link": url}, ensure_ascii=False, indent=4)
-            else:
-                print("No relevant data found in the response.")
-        else:
-            return f"Error: {response.status_code} - {response.text}"
+async def duckduckgo_search(keywords, search_type="web"):
+    params = {
+        "q": query_text(keywords),
+        "format": "json",
+        "no_redirect": 1,
+        "no_html": 1,
+        "skip_disambig": 1,
+        "ia": "images" if search_type == "image" else "web",
+    }
+    response = await cached_get("duckduckgo", "https://api.duckduckgo.com/", params=params)
+    print("DuckDuckGo status code:", response.status_code)
+    if response.status_code != 200:
+        raise SearchError(f"Error: {response.status_code} - {response.text}")
+    data = response.json()
+    items = []
+    if "RelatedTopics" in data:
+        for item in data["RelatedTopics"]:
+            if "Text" in item and "FirstURL" in item:
+                items.append({"snippet": item["Text"], "link": item["FirstURL"]})
+    elif "ImageResults" in data:
+        for item in data["ImageResults"]:
+            if "Title" in item and "Image" in item:
+                items.append({"snippet": item["Title"], "link": item["Image"]})
+    return items
 
-    except Exception as e:
-        return f"Exception occurred: {e}"
 
-    print(all_content)
-    return (
-        "今天的日期是"
-        + today
-        + "，当前网络的信息和信息来源的网址为：“"
-        + str(all_content)
-        + "”。\n如果以上信息中没有相关信息，你可以改变paper_num，查看下一页的信息。"
-    )
+def search_duckduckgo(keywords, paper_num=1):
+    # DuckDuckGo的即时回答接口没有分页，paper_num只是为了与其他搜索工具保持一致
+    global ddg_searchType
+    return run_search(duckduckgo_search(keywords, ddg_searchType))
 
 class duckduckgo_tool:
     @classmethod
@@ -455,4 +418,110 @@ class duckduckgo_loader:
         global ddg_searchType
         ddg_searchType = searchType
         out = search_duckduckgo(keywords, paper_num)
-        return (out,)
\ No newline at end of file
+        return (out,)
+
+# 聚合搜索中每个搜索引擎的最长等待时间（秒）
+meta_deadline = 5.0
+
+
+def normalize_url(url):
+    # 用于跨搜索引擎去重的URL形式
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return urlunsplit(("", host, parts.path.rstrip("/"), parts.query, ""))
+
+
+async def meta_search(keywords, paper_num, deadline):
+    """并发查询所有已配置的搜索引擎，超过deadline的引擎被放弃，返回已经到达的结果。"""
+    engines = {}
+    if g_api_key and g_CSE_ID:
+        engines["google"] = google_search(keywords, paper_num, g_api_key, g_CSE_ID)
+    if b_api_key:
+        engines["bing"] = bing_search(keywords, paper_num, b_api_key)
+    engines["duckduckgo"] = duckduckgo_search(keywords)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(coro, deadline) for coro in engines.values()), return_exceptions=True
+    )
+    lists = []
+    for name, result in zip(engines, results):
+        if isinstance(result, BaseException):
+            print(f"{name}搜索失败：{type(result).__name__} {result}")
+            continue
+        lists.append([dict(item, source=name) for item in result])
+    # 轮流从各个引擎的结果中取，按URL去重
+    merged = []
+    seen = set()
+    for i in range(max([len(items) for items in lists], default=0)):
+        for items in lists:
+            if i < len(items):
+                key = normalize_url(items[i]["link"])
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(items[i])
+    return merged
+
+
+def search_web_all(keywords, paper_num=1):
+    return run_search(meta_search(keywords, paper_num, meta_deadline))
+
+
+class meta_search_tool:
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "is_enable": ("BOOLEAN", {"default": True}),
+                "deadline": ("FLOAT", {"default": 5.0, "min": 0.5, "max": 60.0, "step": 0.5}),
+            },
+            "optional": {
+                "google_api_key": ("STRING", {}),
+                "google_CSE_ID": ("STRING", {}),
+                "bing_api_key": ("STRING", {}),
+            },
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("tool",)
+
+    FUNCTION = "web"
+
+    # OUTPUT_NODE = False
+
+    CATEGORY = "大模型派对（llm_party）/工具（tools）"
+
+    def web(self, deadline=5.0, google_api_key=None, google_CSE_ID=None, bing_api_key=None, is_enable=True):
+        if is_enable == False:
+            return (None,)
+        global g_api_key, g_CSE_ID, b_api_key, meta_deadline
+        meta_deadline = deadline
+        if google_api_key is not None and google_api_key != "":
+            g_api_key = google_api_key
+        if google_CSE_ID is not None and google_CSE_ID != "":
+            g_CSE_ID = google_CSE_ID
+        if bing_api_key is not None and bing_api_key != "":
+            b_api_key = bing_api_key
+        output = [
+            {
+                "type": "function",
+                "function": {
+                    "name": "search_web_all",
+                    "description": "同时通过谷歌、必应和DuckDuckGo搜索关键词，返回合并去重后的搜索结果。",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "keywords": {
+                                "type": "string",
+                                "description": "需要搜索的关键词，可以是多个词语，多个词语之间用空格隔开",
+                            },
+                            "paper_num": {"type": "string", "description": "搜索结果的页码，可以改变paper_num用于翻页"},
+                        },
+                        "required": ["keywords"],
+                    },
+                },
+            }
+        ]
+
+        out = json.dumps(output, ensure_ascii=False)
+        return (out,)
@@ -1,10 +1,7 @@
-import random
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-import signal
-import sys
-def interrupt_handler(signum, frame):
-    print("Process interrupted")
-    sys.exit(0)
+import json
+
+from .iterator_source import next_batch, text_chunks
+
 
 class text_iterator:
     def __init__(self):
@@ -13,6 +10,7 @@ class text_iterator:
         self.file_content = ""
         self.chunk_size = 1024
         self.chunk_overlap = 0
+        self.file_path = ""
 
     @classmethod
     def INPUT_TYPES(s):
@@ -23,11 +21,16 @@ class text_iterator:
                 "is_reload": ("BOOLEAN", {"default": False}),
                 "iterator_mode": (["sequential","random","Infinite"], {"default": "sequential"}),
             },
-            "optional": {"chunk_size": ("INT", {"default": 1024}), "chunk_overlap": ("INT", {"default": 0})},
+            "optional": {
+                "chunk_size": ("INT", {"default": 1024}),
+                "chunk_overlap": ("INT", {"default": 0}),
+                "file_path": ("STRING", {"default": ""}),
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": 10000}),
+            },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("file_content",)
+    RETURN_TYPES = ("STRING", "BOOLEAN")
+    RETURN_NAMES = ("file_content", "is_done")
 
     FUNCTION = "file"
 
@@ -35,38 +38,35 @@ class text_iterator:
 
     CATEGORY = "大模型派对（llm_party）/加载器（loader）"
 
-    def file(self, file_content,iterator_mode, chunk_size=1024, chunk_overlap=0, is_enable=True, is_reload=False):
+    def file(self, file_content,iterator_mode, chunk_size=1024, chunk_overlap=0, is_enable=True, is_reload=False, file_path="", batch_size=1):
         if not is_enable:
-            return (None,)
+            return (None, False)
         if (
             self.file_content != file_content
             or is_reload == True
             or self.chunk_size != chunk_size
             or self.chunk_overlap != chunk_overlap
+            or self.file_path != file_path
         ):
             self.index = 0  # 重置索引为0，因为我们要从第二行开始读取数据
             self.file_content = file_content
             self.chunk_size = chunk_size
             self.chunk_overlap = chunk_overlap
-        # 将file_content用RecursiveCharacterTextSplitter分割
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
-        )
-        text_len=len(self.text_splitter.split_text(self.file_content))
-        # 分段输出
-        if self.index >= text_len:
-            self.index = 0
-            if iterator_mode == "sequential":
-                signal.signal(signal.SIGINT, interrupt_handler)
-                signal.raise_signal(signal.SIGINT)  # 直接中断进程
-        out = self.text_splitter.split_text(self.file_content)[self.index]
-        print("当前索引：", self.index)
+            self.file_path = file_path
+        # 设置了file_path时直接按页、按行流式读取文件并分块，否则分割file_content；
+        # 相同的内容和分块参数只分割一次，之后每一步只移动下标
+        chunks = text_chunks(self.file_content, self.chunk_size, self.chunk_overlap, self.file_path)
+        # 分段输出，一次输出batch_size段，输出最后一段时is_done为True
+        indices, self.index, is_done = next_batch(self.index, len(chunks), batch_size, iterator_mode)
+        if indices == []:
+            return (None, True)
+        print("当前索引：", indices)
+        if batch_size == 1:
+            out = chunks[indices[0]]
+        else:
+            out = json.dumps([chunks[i] for i in indices], ensure_ascii=False)
         print("当前输出：", out)
-        if iterator_mode == "sequential" or iterator_mode =="Infinite":
-            self.index += 1
-        elif iterator_mode == "random":
-            self.index = random.randint(0, text_len - 1)
-        return (out,)
+        return (out, is_done)
 
     @classmethod
     def IS_CHANGED(self, s):
@@ -0,0 +1,40 @@
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# 流式分块时每次攒够多少个chunk_size的文本再切分
+STREAM_BUFFER_CHUNKS = 64
+
+
+def iter_chunks(source, chunk_size, chunk_overlap):
+    """把文本切分成文本块，依次产出。
+
+    source可以是字符串，也可以是iter_one产出的页、行等文本片段。片段攒够
+    STREAM_BUFFER_CHUNKS个chunk_size后切分一次，最后一个文本块可能被缓冲区截断，
+    连同后面的原文一起留到下一轮，所以整篇文档不需要同时放在内存里。
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if isinstance(source, str):
+        yield from text_splitter.split_text(source)
+        return
+    buffer = []
+    length = 0
+    for piece in source:
+        buffer.append(piece)
+        length += len(piece)
+        if length < chunk_size * STREAM_BUFFER_CHUNKS:
+            continue
+        text = "".join(buffer)
+        chunks = text_splitter.split_text(text)
+        yield from chunks[:-1]
+        # 保留最后一个文本块开始之后的原文，包括被切分器去掉的空白
+        start = text.rfind(chunks[-1]) if chunks else len(text)
+        if start < 0:
+            yield chunks[-1]
+            start = len(text)
+        buffer = [text[start:]]
+        length = len(buffer[0])
+    if buffer:
+        yield from text_splitter.split_text("".join(buffer))
+
+
+def split_chunks(source, chunk_size, chunk_overlap):
+    return list(iter_chunks(source, chunk_size, chunk_overlap))
@@ -0,0 +1,261 @@
+import atexit
+import csv
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+current_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+store_dir = os.path.join(current_dir_path, "cache", "triple_store")
+
+# 新增的三元组累计到这么多条时合并进有序数组
+MERGE_THRESHOLD = 10000
+# 删除三元组后最多等待这么多秒就把CSV快照写回磁盘
+EXPORT_INTERVAL = 30
+
+# 三种排列顺序，任意一组已知的列都是其中某个顺序的前缀
+ORDERS = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+
+
+class TripleStore:
+    """CSV知识图谱的列式三元组存储。
+
+    实体和关系字符串统一映射为整数id，三元组保存为(n, 3)的int32数组，并按SPO、POS、OSP
+    三种顺序各排一次序，任意查询模式都能用二分查找在O(log n)内定位。删除只打墓碑标记，
+    新增的三元组先放在一个小的增量列表中，累计到MERGE_THRESHOLD条时再重建有序数组。
+
+    CSV只在第一次使用时导入一次，之后直接从cache/triple_store下的二进制快照加载；新增的三元组
+    仍然追加到CSV末尾，删除后由定时器、工作流结束或进程退出时把CSV整体导出一次。
+    第三列之后的附加列按行保存在extras中，不足三列的行原样保存在short_rows中，导出时一起写回，
+    不会因为删除了某个三元组而丢失。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        key = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:32]
+        self.cache_path = os.path.join(store_dir, key)
+        self.lock = threading.RLock()
+        self.timer = None
+        self.load()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def load(self):
+        with self.lock:
+            self.stamp = self._file_stamp()
+            self.dirty = False
+            self.unsaved = False
+            self.added = []
+            meta_path = os.path.join(self.cache_path, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta["stamp"] == self.stamp and "extras" in meta:
+                    self.terms = meta["terms"]
+                    self.term_ids = {term: i for i, term in enumerate(self.terms)}
+                    self._build(np.load(os.path.join(self.cache_path, "triples.npy")))
+                    self.extras = {row: extra for row, extra in meta["extras"]}
+                    self.short_rows = meta["short_rows"]
+                    return
+            self._ingest()
+
+    def _ingest(self):
+        # 一次性导入CSV
+        self.terms = []
+        self.term_ids = {}
+        self.extras = {}
+        self.short_rows = []
+        ids = []
+        with open(self.path, "r", encoding="utf8") as fin:
+            for row in csv.reader(fin):
+                if len(row) < 3:
+                    if row != []:
+                        self.short_rows.append(row)
+                    continue
+                if len(row) > 3:
+                    self.extras[len(ids) // 3] = row[3:]
+                ids.extend(self._intern(term) for term in row[:3])
+        if self.short_rows:
+            print(f"{self.path}中有{len(self.short_rows)}行不足三列，不会作为三元组使用，导出时保留在文件开头")
+        self._build(np.array(ids, dtype=np.int32).reshape(-1, 3))
+        self._save()
+
+    def _save(self):
+        os.makedirs(self.cache_path, exist_ok=True)
+        np.save(os.path.join(self.cache_path, "triples.npy"), self.triples)
+        temp_path = os.path.join(self.cache_path, "meta.json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "stamp": self.stamp,
+                    "terms": self.terms,
+                    "extras": [[row, extra] for row, extra in self.extras.items()],
+                    "short_rows": self.short_rows,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(temp_path, os.path.join(self.cache_path, "meta.json"))
+
+    def _build(self, triples):
+        self.triples = np.ascontiguousarray(triples, dtype=np.int32)
+        self.alive = np.ones(len(self.triples), dtype=bool)
+        self.indexes = {}
+        for name, cols in ORDERS.items():
+            perm = np.lexsort([self.triples[:, c] for c in reversed(cols)])
+            columns = [np.ascontiguousarray(self.triples[perm, c]) for c in cols]
+            self.indexes[name] = (perm, columns)
+
+    def _intern(self, term):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.terms.append(term)
+            self.term_ids[term] = term_id
+        return term_id
+
+    def _find(self, pattern):
+        # 返回基础数组中与pattern匹配的行号，pattern是(s, p, o)的id，未知的位置为None
+        bound = [c for c in range(3) if pattern[c] is not None]
+        if bound == []:
+            return np.arange(len(self.triples))
+        for name, cols in ORDERS.items():
+            if set(cols[: len(bound)]) == set(bound):
+                break
+        perm, columns = self.indexes[name]
+        lo, hi = 0, len(perm)
+        for column, c in zip(columns, cols[: len(bound)]):
+            part = column[lo:hi]
+            lo, hi = lo + int(np.searchsorted(part, pattern[c], "left")), lo + int(np.searchsorted(part, pattern[c], "right"))
+            if lo == hi:
+                break
+        return perm[lo:hi]
+
+    def match(self, s=None, p=None, o=None):
+        """返回所有与模式匹配的(s, p, o)字符串三元组，None表示任意。"""
+        with self.lock:
+            pattern = []
+            for term in (s, p, o):
+                if term is None:
+                    pattern.append(None)
+                elif term in self.term_ids:
+                    pattern.append(self.term_ids[term])
+                else:
+                    return []
+            rows = self._find(pattern)
+            rows = rows[self.alive[rows]]
+            out = [tuple(self.terms[i] for i in triple) for triple in self.triples[rows].tolist()]
+            for triple in self.added:
+                if all(pattern[c] is None or pattern[c] == triple[c] for c in range(3)):
+                    out.append(tuple(self.terms[i] for i in triple))
+            return out
+
+    def neighbors(self, name):
+        # 依次给出(相邻实体, 关系)，关系视为双向
+        return [(o, p) for _, p, o in self.match(s=name)] + [(s, p) for s, p, _ in self.match(o=name)]
+
+    def add(self, s, p, o):
+        with self.lock:
+            self.added.append(tuple(self._intern(term) for term in (s, p, o)))
+            if len(self.added) >= MERGE_THRESHOLD:
+                self._merge()
+
+    def remove(self, s, p, o):
+        # 删除所有与(s, p, o)相同的三元组
+        with self.lock:
+            if s not in self.term_ids or p not in self.term_ids or o not in self.term_ids:
+                return
+            pattern = (self.term_ids[s], self.term_ids[p], self.term_ids[o])
+            self.alive[self._find(pattern)] = False
+            self.added = [triple for triple in self.added if triple != pattern]
+            self.dirty = True
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self.timer is None:
+            self.timer = threading.Timer(EXPORT_INTERVAL, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _merge(self):
+        # 丢弃墓碑，把增量列表并入有序数组，附加列跟着三元组移动到新的行号
+        if self.extras:
+            new_rows = np.cumsum(self.alive) - 1
+            self.extras = {int(new_rows[row]): extra for row, extra in self.extras.items() if self.alive[row]}
+        triples = self.triples[self.alive]
+        if self.added:
+            triples = np.concatenate([triples, np.array(self.added, dtype=np.int32).reshape(-1, 3)])
+        self.added = []
+        self._build(triples)
+
+    def append_csv(self, s, p, o):
+        with self.lock:
+            with open(self.path, "a", encoding="utf8") as fin:
+                csv.writer(fin).writerow([s, p, o])
+            self.add(s, p, o)
+            if not self.dirty:
+                self.stamp = self._file_stamp()
+            # 二进制快照稍后更新，否则下次启动会因为CSV变化而重新导入
+            self.unsaved = True
+            self._schedule_flush()
+
+    def flush(self):
+        """有删除未写回时把当前的三元组导出为CSV快照，有任何修改时更新二进制快照。"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty and not self.unsaved:
+                return
+            self._merge()
+            if self.dirty:
+                temp_path = self.path + ".tmp"
+                with open(temp_path, "w", encoding="utf8", newline="") as fout:
+                    writer = csv.writer(fout)
+                    writer.writerows(self.short_rows)
+                    for row, triple in enumerate(self.triples.tolist()):
+                        writer.writerow([self.terms[i] for i in triple] + self.extras.get(row, []))
+                os.replace(temp_path, self.path)
+                self.stamp = self._file_stamp()
+            self.dirty = False
+            self.unsaved = False
+            self._save()
+
+    def refresh(self):
+        # CSV在外部被修改过时重新导入
+        with self.lock:
+            if not self.dirty and self._file_stamp() != self.stamp:
+                self.load()
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """获取path对应的三元组存储，同一个CSV在进程内只导入一次。"""
+    path = os.path.abspath(path)
+    with stores_lock:
+        store = stores.get(path)
+        if store is None:
+            store = TripleStore(path)
+            stores[path] = store
+            return store
+    store.refresh()
+    return store
+
+
+@atexit.register
+def flush_stores():
+    # 把所有未写回的删除导出为CSV，在工作流结束和进程退出时调用
+    with stores_lock:
+        pending = list(stores.values())
+    for store in pending:
+        store.flush()
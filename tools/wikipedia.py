@@ -2,33 +2,37 @@ import json
 
 import torch
 import wikipedia
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-ebd_model = ""
+from .ebd_engine import EmbeddingEngine
+from .ebd_registry import embedding_registry
+from .http_cache import cached_value
+
 bge_embeddings = ""
+# 从注册表中acquire得到的模型，外部传入的ebd_model不由这个节点释放
+acquired_embeddings = None
 files_load = ""
 c_size = 200
 c_overlap = 50
 knowledge_base = ""
 
 
+def page_content(query):
+    # 设置语言
+    wikipedia.set_lang("zh")
+    # 获取特定页面的内容
+    return wikipedia.page(query).content
+
+
 def get_wikipedia(query):
     global bge_embeddings, c_size, c_overlap
+    # 同一个词条的页面内容在缓存有效期内只请求一次
+    res = cached_value("wikipedia", "zh:" + query, lambda: page_content(query))
     if bge_embeddings == "":
-        # 设置语言
-        wikipedia.set_lang("zh")
-        # 获取特定页面的内容
-        py_page = wikipedia.page(query)
-        res = py_page.content[:1000]
+        res = res[:1000]
         return "维基百科上的相关信息为：\n" + res
     else:
-        # 设置语言
-        wikipedia.set_lang("zh")
-        # 获取特定页面的内容
-        py_page = wikipedia.page(query)
-        res = py_page.content
         # 创建一个文本分割器，将文本分割成多个段落
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=c_size,
@@ -37,11 +41,9 @@ def get_wikipedia(query):
         # 将文本分割成多个段落
         documents = text_splitter.split_text(res)
         # 创建一个向量存储
-        vectorstore = FAISS.from_documents(documents, bge_embeddings)
+        vectorstore = FAISS.from_texts(documents, EmbeddingEngine(bge_embeddings))
         # 搜索与查询最相关的段落
-        query_text = query
-        query_embedding = bge_embeddings.embed_query(query_text)
-        similar_documents = vectorstore.similarity_search(query_embedding, k=5)
+        similar_documents = vectorstore.similarity_search(query, k=5)
         # 合并段落
         merged_text = "\n".join([document.page_content for document in similar_documents])
         # 返回合并后的文本
@@ -64,6 +66,7 @@ class wikipedia_tool:
             },
             "optional": {
                 "embedding_path": ("STRING", {"default": ""}),
+                "ebd_model": ("EBD_MODEL", {"default": None}),
             },
         }
 
@@ -76,21 +79,23 @@ class wikipedia_tool:
 
     CATEGORY = "大模型派对（llm_party）/工具（tools）"
 
-    def wikipedia(self, query, embedding_path, chunk_size, chunk_overlap, device, is_enable="enable"):
+    def wikipedia(self, query, embedding_path, chunk_size, chunk_overlap, device, is_enable="enable", ebd_model=None):
         if is_enable == "disable":
             return (None,)
-        global ebd_model, files_load, bge_embeddings, c_size, c_overlap, knowledge_base
+        global files_load, bge_embeddings, acquired_embeddings, c_size, c_overlap, knowledge_base
         c_size = chunk_size
         c_overlap = chunk_overlap
         if device == "auto":
             device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
-        if ebd_model == "":
-            model_kwargs = {"device": device}
-            encode_kwargs = {"normalize_embeddings": True}  # 设置为 True 以计算余弦相似度
-        if bge_embeddings == "" and embedding_path is not None and embedding_path != "":
-            bge_embeddings = HuggingFaceBgeEmbeddings(
-                model_name=embedding_path, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs
-            )
+        if ebd_model is not None:
+            embedding_registry.release(acquired_embeddings)
+            acquired_embeddings = None
+            bge_embeddings = ebd_model
+        elif embedding_path is not None and embedding_path != "":
+            # 与其他词嵌入节点共享同一个模型
+            embeddings = embedding_registry.acquire(embedding_path, device)
+            embedding_registry.release(acquired_embeddings)
+            acquired_embeddings = bge_embeddings = embeddings
 
         output = [
             {
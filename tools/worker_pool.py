@@ -0,0 +1,171 @@
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# 子进程执行的任务函数都在workers/llm_party_workers.py中，以顶层模块导入，子进程不会加载插件包
+workers_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workers")
+if workers_dir not in sys.path:
+    sys.path.append(workers_dir)
+import llm_party_workers as tasks  # noqa: E402
+
+# 默认的进程数，留一个核给ComfyUI
+POOL_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# 等待结果时检查任务是否超时的间隔（秒）
+POLL_INTERVAL = 0.2
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class TaskTimeout(Exception):
+    # 与任务自己抛出的TimeoutError区分开
+    pass
+
+
+def pool_context():
+    # forkserver的子进程从一个只预先导入了任务模块的干净进程fork出来，不继承ComfyUI的线程和CUDA，
+    # 比spawn启动更快；Windows上只有spawn
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([tasks.__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def get_process_pool(workers):
+    """按进程数复用的进程池。"""
+    with pools_lock:
+        pool = pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+            pools[workers] = pool
+        return pool
+
+
+def discard_pool(workers):
+    # 结束整个进程池，包括卡在某个任务上的子进程，下次get_process_pool时重新创建
+    with pools_lock:
+        pool = pools.pop(workers, None)
+    if pool is None:
+        return
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.kill()
+
+
+@atexit.register
+def shutdown_pools():
+    with pools_lock:
+        workers = list(pools)
+    for n in workers:
+        discard_pool(n)
+
+
+main_lock = threading.Lock()
+
+
+@contextmanager
+def hidden_main():
+    # 子进程按需在submit中启动，启动时会记录__main__的路径并在子进程中重新执行一遍，
+    # 也就是ComfyUI的main.py；启动期间换成一个空模块，子进程只导入任务模块
+    with main_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+def submit(pool, func, item, lookup):
+    # lookup(item)有结果或者没有进程池时，在当前进程中得到一个已经完成的Future
+    value = lookup(item) if lookup is not None else None
+    if value is None and pool is not None:
+        with hidden_main():
+            return pool.submit(func, item)
+    future = Future()
+    if value is not None:
+        future.set_result(value)
+        return future
+    try:
+        future.set_result(func(item))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def finished(future):
+    # 进程池被结束之前已经完成的任务，结果仍然有效
+    return future.done() and not future.cancelled() and not isinstance(future.exception(), BrokenProcessPool)
+
+
+def wait_result(future, window, started, timeout):
+    # timeout从任务开始执行时算起（进入子进程的调用队列时开始计时），在窗口中排队的时间不算
+    if timeout is not None:
+        while not wait([future], timeout=POLL_INTERVAL).done:
+            now = time.monotonic()
+            for f in [future] + [f for _, f in window]:
+                if f not in started and f.running():
+                    started[f] = now
+            if future in started and now - started[future] > timeout:
+                raise TaskTimeout()
+    return future.result()
+
+
+def ordered_map(func, items, workers=POOL_WORKERS, timeout=None, lookup=None):
+    """在进程池中并行执行func(item)，按输入的顺序依次产出(item, 结果, 异常)。
+
+    func必须定义在llm_party_workers模块中。同时提交的任务不超过workers的两倍，items可以是生成器；
+    lookup(item)返回值不为None时直接使用，不提交到进程池，例如已经缓存的文件。
+    某个任务开始执行后超过timeout秒没有完成时产出TimeoutError，结束整个进程池中的子进程并重建，
+    其他还没有完成的任务重新提交；进程池无法使用时退回在当前进程中依次执行。
+    """
+    items = iter(items)
+    pool = get_process_pool(workers) if workers > 1 else None
+    window = deque()
+    started = {}
+    while True:
+        for item in items:
+            window.append((item, submit(pool, func, item, lookup)))
+            if len(window) >= workers * 2:
+                break
+        if not window:
+            return
+        item, future = window.popleft()
+        try:
+            result = wait_result(future, window, started, timeout)
+        except TaskTimeout:
+            # 已经完成的结果保留，其余的任务随子进程一起结束，在新的进程池中重新执行
+            keep = [finished(f) for _, f in window]
+            discard_pool(workers)
+            pool = get_process_pool(workers)
+            started.clear()
+            window = deque((i, f) if k else (i, submit(pool, func, i, None)) for (i, f), k in zip(window, keep))
+            yield item, None, TimeoutError(f"超过{timeout}秒没有完成")
+            continue
+        except BrokenProcessPool as e:
+            print(f"进程池不可用，改为在当前进程中执行：{e}")
+            discard_pool(workers)
+            pool = None
+            started.clear()
+            window = deque(
+                [(item, submit(None, func, item, lookup))]
+                + [(i, f if finished(f) else submit(None, func, i, lookup)) for i, f in window]
+            )
+            continue
+        except Exception as e:
+            started.pop(future, None)
+            yield item, None, e
+            continue
+        started.pop(future, None)
+        yield item, result, None
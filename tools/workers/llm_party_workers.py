@@ -0,0 +1,101 @@
+"""在进程池的子进程中执行的解析函数。
+
+这个模块不属于插件包，只依赖第三方库：子进程按模块名导入任务函数，如果函数定义在插件包里，
+每个子进程都要导入整个插件（llm.py、torch、ComfyUI的server等）。worker_pool把这个文件夹加入
+sys.path，以顶层模块的名字导入。
+"""
+import json
+
+import docx2txt
+import openpyxl
+import pandas as pd
+import pdfplumber
+import xlrd
+from bs4 import BeautifulSoup
+from charamel import Detector
+
+programming_languages_extensions = [".py", ".js", ".java", ".c", ".cpp", ".html", ".css", ".sql", ".r", ".swift"]
+
+
+def iter_one(path):
+    """按页、按行依次产出文件的文本，拼接起来与parse_file的结果相同。"""
+    if path.endswith(".docx"):
+        yield docx2txt.process(path)
+    elif path.endswith(".md"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield f.read()
+    elif path.endswith(".pdf"):
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                yield page.extract_text() or ""
+    elif path.endswith(".xlsx"):
+        # 只读模式按行流式读取，不把整个工作簿载入内存
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        for sheet in workbook.worksheets:
+            # 检查工作表是否至少有一行数据，只读模式下没有尺寸信息时max_row为None
+            if sheet.max_row is None or sheet.max_row > 1:  # 至少有一行数据（不包括表头）
+                # 获取工作表名称
+                yield f"## {sheet.title} 的内容\n"
+
+                # 获取表头
+                headers = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), None)
+                if headers:
+                    yield "|" + " | ".join([" " if cell is None else str(cell) for cell in headers]) + "|\n"
+                    yield "|" + " | ".join(["---"] * len(headers)) + "|\n"
+                else:
+                    yield "没有找到表头。\n"
+                    continue
+
+                # 获取数据行
+                for row in sheet.iter_rows(min_row=2, values_only=True):
+                    if any(cell is not None for cell in row):
+                        yield "|" + " | ".join([" " if cell is None else str(cell) for cell in row]) + "|\n"
+                    else:
+                        # 如果整行都是空的，则停止读取当前工作表
+                        break
+        workbook.close()
+    elif path.endswith(".xls"):
+        workbook = xlrd.open_workbook(path)
+        for sheet_index in range(workbook.nsheets):
+            sheet = workbook.sheet_by_index(sheet_index)
+            # 检查工作表是否为空
+            if sheet.nrows > 0:
+                yield f"## {sheet.name} 的内容\n"
+                yield "| " + " | ".join(sheet.row_values(0)) + " |\n"  # 添加表头
+                yield "| " + " | ".join(["---"] * sheet.ncols) + " |\n"  # 添加分隔符
+                for row_num in range(1, sheet.nrows):
+                    yield "| " + " | ".join([str(cell) for cell in sheet.row_values(row_num)]) + " |\n"
+    elif path.endswith(".csv"):
+        # 检测文件编码
+        detector = Detector()
+        with open(path, "rb") as file:
+            content = file.read()
+        encoding = detector.detect(content)
+        df = pd.read_csv(path, encoding=encoding)
+        yield df.to_markdown(index=True)
+    elif path.endswith(".txt"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield f.read()
+    elif path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield json.dumps(json.load(f), ensure_ascii=False, indent=4)
+    elif any(path.endswith(extension) for extension in programming_languages_extensions):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                yield file.read()
+        except UnicodeDecodeError:
+            with open(path, "r", encoding="latin-1") as file:
+                yield file.read()
+
+
+def parse_file(path):
+    # 一次性拼接，避免逐页、逐行的字符串相加
+    return "".join(iter_one(path))
+
+
+def html_to_text(html):
+    # 去掉script和style后提取纯文本
+    soup = BeautifulSoup(html, "html.parser")
+    for script in soup(["script", "style"]):
+        script.extract()
+    return soup.get_text()
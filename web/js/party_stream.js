@@ -0,0 +1,34 @@
+import { app } from "../../../scripts/app.js";
+import { api } from "../../../scripts/api.js";
+import { ComfyWidgets } from "../../../scripts/widgets.js";
+
+// Shows the partial text streamed by LLM nodes while they are still generating
+app.registerExtension({
+	name: "party.Stream",
+	async setup() {
+		api.addEventListener("execution_start", () => {
+			for (const node of app.graph._nodes) {
+				if (node.partyStreamWidget) {
+					node.partyStreamWidget.value = "";
+				}
+			}
+		});
+
+		api.addEventListener("party_stream", ({ detail }) => {
+			const node = app.graph.getNodeById(Number(detail.node));
+			if (!node) {
+				return;
+			}
+			if (!node.partyStreamWidget) {
+				const w = ComfyWidgets["STRING"](node, "stream_output", ["STRING", { multiline: true }], app).widget;
+				w.inputEl.readOnly = true;
+				w.inputEl.style.opacity = 0.6;
+				w.serialize = false;
+				node.partyStreamWidget = w;
+			}
+			node.partyStreamWidget.value += detail.delta;
+			node.partyStreamWidget.inputEl.scrollTop = node.partyStreamWidget.inputEl.scrollHeight;
+			app.graph.setDirtyCanvas(true, false);
+		});
+	},
+});